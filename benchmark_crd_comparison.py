@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+OADP CRD Comparison Benchmark
+
+Generates synthetic OADP bundles (CRDs plus a ClusterServiceVersion) of a configurable size and
+change rate, runs them through CRDComparator one phase at a time and reports the time, throughput
+and peak memory of each phase. Results can be saved as JSON to track where the tool stops scaling.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+from typing import Dict, List, Tuple, Any, Optional
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+from oadp_crd_comparison import Colors, CRDComparator, NoColors, PhaseProfiler, YAMLDumper
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Phases reported for every run, in pipeline order, and the PhaseProfiler phase each one is read from
+PHASES = ["load", "parse", "fingerprint", "flatten", "diff", "render"]
+PROFILER_PHASES = {"load": "read", "parse": "parse", "fingerprint": "fingerprint",
+                   "flatten": "flatten", "diff": "diff", "render": "render"}
+# Line and column marks are recorded while the YAML is composed, so there is no separate mapping pass
+PHASE_LABELS = {"parse": "parse (with line marks)"}
+
+@dataclass
+class BenchmarkConfig:
+    """Shape of the synthetic bundles and how much they change between versions."""
+    parameters: int = 10000
+    versions: int = 3
+    crd_files: int = 8
+    depth: int = 4
+    breadth: int = 4
+    list_length: int = 8
+    removal_rate: float = 0.01
+    addition_rate: float = 0.02
+    reorder_rate: float = 0.1
+    seed: int = 42
+    formats: Tuple[str, ...] = ("markdown", "json")
+    show_additions: bool = False
+    trace_memory: bool = False
+
+def count_parameters(data: Any) -> int:
+    """Count mapping keys the way CRDComparator flattens them, including keys inside list items."""
+    if isinstance(data, dict):
+        return len(data) + sum(count_parameters(value) for value in data.values())
+    if isinstance(data, list):
+        return sum(count_parameters(item) for item in data)
+    return 0
+
+class BundleGenerator:
+    """Builds synthetic bundle versions with a target parameter count."""
+
+    def __init__(self, config: BenchmarkConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.field_counter = 0
+
+    def _field_name(self) -> str:
+        self.field_counter += 1
+        return f"field{self.field_counter}"
+
+    def _capacity(self, depth: int) -> int:
+        """Parameters used by a property subtree of the given depth."""
+        if depth <= 1:
+            return 3
+        return 4 + self.config.breadth * self._capacity(depth - 1)
+
+    def _build_property(self, depth: int) -> Dict:
+        """Build one schema property: a typed leaf, or an object with `breadth` nested properties."""
+        if depth <= 1:
+            return {"description": f"Leaf setting {self.field_counter}", "type": "string"}
+        
+        properties = {}
+        for _ in range(self.config.breadth):
+            properties[self._field_name()] = self._build_property(depth - 1)
+        return {"description": f"Group of settings {self.field_counter}", "properties": properties, "type": "object"}
+
+    def _build_properties(self, budget: int) -> Dict:
+        """Add top-level properties until the parameter budget is used up."""
+        properties = {}
+        used = 0
+        while used < budget:
+            depth = self.config.depth
+            while depth > 1 and self._capacity(depth) > budget - used:
+                depth -= 1
+            properties[self._field_name()] = self._build_property(depth)
+            used += self._capacity(depth)
+        return properties
+
+    def build_crd(self, index: int, budget: int) -> Dict:
+        """Build a CustomResourceDefinition whose schema holds about `budget` parameters."""
+        plural = f"widgets{index}"
+        return {
+            "apiVersion": "apiextensions.k8s.io/v1",
+            "kind": "CustomResourceDefinition",
+            "metadata": {"name": f"{plural}.bench.example.com"},
+            "spec": {
+                "group": "bench.example.com",
+                "names": {"kind": f"Widget{index}", "plural": plural},
+                "scope": "Namespaced",
+                "versions": [{
+                    "name": "v1alpha1",
+                    "schema": {"openAPIV3Schema": {"properties": self._build_properties(budget), "type": "object"}},
+                    "served": True,
+                    "storage": True,
+                }],
+            },
+        }
+
+    def build_csv(self) -> Dict:
+        """Build a ClusterServiceVersion with deployments, containers and env lists of `list_length` items."""
+        length = self.config.list_length
+        containers = []
+        for c in range(length):
+            env = [{"name": f"RELATED_IMAGE_{c}_{e}", "value": f"quay.io/bench/image-{c}-{e}:latest"}
+                   for e in range(length)]
+            containers.append({"env": env, "image": f"quay.io/bench/container-{c}:latest", "name": f"container-{c}"})
+        return {
+            "apiVersion": "operators.coreos.com/v1alpha1",
+            "kind": "ClusterServiceVersion",
+            "metadata": {"name": "bench-operator.v1.0.0"},
+            "spec": {
+                "install": {"spec": {"deployments": [{
+                    "name": "bench-controller-manager",
+                    "spec": {"template": {"spec": {"containers": containers}}},
+                }]}},
+                "relatedImages": [{"image": f"quay.io/bench/image-{i}:latest", "name": f"image-{i}"}
+                                  for i in range(length)],
+            },
+        }
+
+    def build_first_version(self) -> Dict[str, Dict]:
+        """Build every file of the first version, splitting the parameter budget across the CRDs."""
+        files = {"bench-operator.clusterserviceversion.yaml": self.build_csv()}
+        remaining = max(self.config.parameters - count_parameters(files), self.config.crd_files)
+        for index in range(self.config.crd_files):
+            budget = remaining // (self.config.crd_files - index)
+            crd = self.build_crd(index, budget)
+            remaining -= count_parameters(crd)
+            files[f"bench.example.com_widgets{index}.yaml"] = crd
+        return files
+
+    def _mutate(self, data: Any) -> None:
+        """Remove and add schema properties and reorder list items in place, at the configured rates."""
+        if isinstance(data, list):
+            for item in data:
+                self._mutate(item)
+            if len(data) > 1 and self.rng.random() < self.config.reorder_rate:
+                self.rng.shuffle(data)
+            return
+        
+        if not isinstance(data, dict):
+            return
+        
+        properties = data.get("properties")
+        if isinstance(properties, dict):
+            for name in list(properties):
+                roll = self.rng.random()
+                if roll < self.config.removal_rate:
+                    del properties[name]
+                elif roll < self.config.removal_rate + self.config.addition_rate:
+                    properties[self._field_name()] = self._build_property(1)
+        
+        for value in data.values():
+            self._mutate(value)
+
+    def next_version(self, files: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Derive the following version from a copy of the previous one."""
+        files = json.loads(json.dumps(files))
+        for data in files.values():
+            self._mutate(data)
+        return files
+
+    def write(self, base_dir: Path) -> Dict[str, Any]:
+        """Write every version under base_dir/1.<n> and return the size of the generated bundles."""
+        files = self.build_first_version()
+        stats = {"parameters_per_version": [], "bytes": 0, "files": len(files)}
+        for n in range(self.config.versions):
+            if n > 0:
+                files = self.next_version(files)
+            version_dir = base_dir / f"1.{n}"
+            version_dir.mkdir(parents=True, exist_ok=True)
+            for filename, data in files.items():
+                text = yaml.dump(data, Dumper=YAMLDumper, default_flow_style=False, sort_keys=False)
+                (version_dir / filename).write_text(text)
+                stats["bytes"] += len(text)
+            stats["parameters_per_version"].append(count_parameters(files))
+        return stats
+
+class CountingSink:
+    """Text sink that discards output and only counts characters."""
+
+    def __init__(self):
+        self.chars = 0
+
+    def write(self, text: str) -> int:
+        self.chars += len(text)
+        return len(text)
+
+    def writelines(self, lines) -> None:
+        for line in lines:
+            self.write(line)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, where the platform reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_benchmark(config: BenchmarkConfig, work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Generate bundles for one configuration and time every phase of a comparison over them."""
+    with tempfile.TemporaryDirectory(prefix="oadp-bench-") as temp_dir:
+        base_dir = Path(work_dir) / f"params-{config.parameters}" if work_dir else Path(temp_dir)
+        
+        start = time.perf_counter()
+        bundle = BundleGenerator(config).write(base_dir)
+        generate_seconds = time.perf_counter() - start
+        
+        # The comparator's own phase instrumentation times the real pipeline, serially and uncached
+        comparator = CRDComparator(str(base_dir), show_additions=config.show_additions, use_cache=False, jobs=1)
+        profiler = PhaseProfiler(trace_memory=config.trace_memory)
+        comparator.profiler = profiler
+        profiler.start()
+        
+        result = comparator.result
+        output_chars = {}
+        for report_format in config.formats:
+            sink = CountingSink()
+            with profiler.phase("render"):
+                comparator.write_report(sink, report_format, False)
+            output_chars[report_format] = sink.chars
+        
+        profiler.stop()
+    
+    seconds = defaultdict(float)
+    peak_bytes = defaultdict(int)
+    for event in profiler.events:
+        seconds[event["phase"]] += event["wall"]
+        peak_bytes[event["phase"]] = max(peak_bytes[event["phase"]], event["peak_bytes"])
+    
+    parameters = sum(bundle["parameters_per_version"])
+    changes = result.added_count + result.removed_count
+    # The unit each phase processes, for throughput
+    units = {"load": parameters, "parse": parameters, "fingerprint": parameters, "flatten": parameters,
+             "diff": parameters, "render": changes}
+    phases = {}
+    for phase in PHASES:
+        phase_seconds = seconds[PROFILER_PHASES[phase]]
+        phases[phase] = {
+            "seconds": round(phase_seconds, 4),
+            "units_per_second": round(units[phase] / phase_seconds) if phase_seconds else None,
+            "unit": "changes" if phase == "render" else "parameters",
+        }
+        if phase in ("load", "parse"):
+            phases[phase]["mb_per_second"] = (round(bundle["bytes"] / (1024 * 1024) / phase_seconds, 1)
+                                              if phase_seconds else None)
+        if config.trace_memory:
+            phases[phase]["peak_traced_mb"] = round(peak_bytes[PROFILER_PHASES[phase]] / (1024 * 1024), 1)
+    
+    return {
+        "config": asdict(config),
+        "bundle": {**bundle, "parameters": parameters, "generate_seconds": round(generate_seconds, 2)},
+        "changes": {"added": result.added_count, "removed": result.removed_count},
+        "output_chars": output_chars,
+        "phases": phases,
+        "total_seconds": round(sum(seconds[PROFILER_PHASES[phase]] for phase in PHASES), 4),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def run_isolated(config: BenchmarkConfig, work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Run one benchmark in a fresh process so peak memory is not inherited from earlier sizes."""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(run_benchmark, config, work_dir).result()
+
+def print_result(run: Dict[str, Any], colors: type = Colors) -> None:
+    """Print the phase table of one benchmark run."""
+    c = colors
+    bundle = run["bundle"]
+    print(f"\n{c.BOLD}{c.BLUE}📏 {bundle['parameters']:,} parameters "
+          f"({bundle['files']} files × {len(bundle['parameters_per_version'])} versions, "
+          f"{bundle['bytes'] / (1024 * 1024):.1f} MB){c.END}")
+    print(f"   Changes: {run['changes']['removed']:,} removed, {run['changes']['added']:,} added")
+    
+    for phase in PHASES:
+        stats = run["phases"][phase]
+        share = stats["seconds"] / run["total_seconds"] * 100 if run["total_seconds"] else 0
+        rate = f"{stats['units_per_second']:,} {stats['unit']}/s" if stats["units_per_second"] else "-"
+        line = f"   {PHASE_LABELS.get(phase, phase):<24} {stats['seconds']:>9.3f}s {share:>5.1f}%  {rate}"
+        if "peak_traced_mb" in stats:
+            line += f"  (peak {stats['peak_traced_mb']} MB traced)"
+        print(line)
+    
+    print(f"   {'total':<24} {run['total_seconds']:>9.3f}s")
+    if run["peak_rss_mb"] is not None:
+        print(f"   Peak RSS: {run['peak_rss_mb']} MB")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the OADP CRD comparison on synthetic bundles",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python3 benchmark_crd_comparison.py                                  # 10k parameters
+  python3 benchmark_crd_comparison.py --parameters 10000 100000 1000000 --output bench.json
+  python3 benchmark_crd_comparison.py --parameters 50000 --removal-rate 0.1 --trace-memory
+        """
+    )
+    
+    defaults = BenchmarkConfig()
+    parser.add_argument("--parameters", type=int, nargs="+", default=[defaults.parameters], metavar="N",
+                        help="Parameters per version to generate; one run per size (default: 10000)")
+    parser.add_argument("--versions", type=int, default=defaults.versions,
+                        help=f"Number of versions to generate (default: {defaults.versions})")
+    parser.add_argument("--crd-files", type=int, default=defaults.crd_files,
+                        help=f"CRD files per version, besides the CSV (default: {defaults.crd_files})")
+    parser.add_argument("--depth", type=int, default=defaults.depth,
+                        help=f"Nesting depth of schema properties (default: {defaults.depth})")
+    parser.add_argument("--breadth", type=int, default=defaults.breadth,
+                        help=f"Properties per nested object (default: {defaults.breadth})")
+    parser.add_argument("--list-length", type=int, default=defaults.list_length,
+                        help=f"Containers, env vars and related images in the CSV (default: {defaults.list_length})")
+    parser.add_argument("--removal-rate", type=float, default=defaults.removal_rate,
+                        help=f"Fraction of properties removed per version (default: {defaults.removal_rate})")
+    parser.add_argument("--addition-rate", type=float, default=defaults.addition_rate,
+                        help=f"Fraction of properties gaining a sibling per version (default: {defaults.addition_rate})")
+    parser.add_argument("--reorder-rate", type=float, default=defaults.reorder_rate,
+                        help=f"Chance that a list is shuffled per version (default: {defaults.reorder_rate})")
+    parser.add_argument("--seed", type=int, default=defaults.seed,
+                        help=f"Random seed for the generator (default: {defaults.seed})")
+    parser.add_argument("--format", dest="formats", nargs="+", default=list(defaults.formats),
+                        choices=["console", "markdown", "json", "ndjson"],
+                        help="Report formats rendered in the render phase (default: markdown json)")
+    parser.add_argument("--show-additions", action="store_true",
+                        help="Render additions as well as removals")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record per-phase peak memory with tracemalloc (slows every phase down)")
+    parser.add_argument("--work-dir",
+                        help="Keep the generated bundles in this directory instead of a temporary one")
+    parser.add_argument("--output", "-o",
+                        help="Save the results as JSON to this file")
+    
+    args = parser.parse_args()
+    # Colour only on a terminal, like the comparison reports
+    c = Colors if sys.stdout.isatty() else NoColors
+    
+    print(f"{c.BOLD}{c.MAGENTA}⏱️  OADP CRD Comparison Benchmark{c.END}")
+    print("=" * 40)
+    
+    runs = []
+    for parameters in args.parameters:
+        config = BenchmarkConfig(
+            parameters=parameters, versions=args.versions, crd_files=args.crd_files,
+            depth=args.depth, breadth=args.breadth, list_length=args.list_length,
+            removal_rate=args.removal_rate, addition_rate=args.addition_rate, reorder_rate=args.reorder_rate,
+            seed=args.seed, formats=tuple(args.formats), show_additions=args.show_additions,
+            trace_memory=args.trace_memory
+        )
+        print(f"\n🏗️  Generating and comparing {parameters:,} parameters per version...")
+        run = run_isolated(config, args.work_dir)
+        print_result(run, c)
+        runs.append(run)
+    
+    if args.output:
+        results = {
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "pyyaml": yaml.__version__,
+                "libyaml": getattr(yaml, "__with_libyaml__", False),
+                "cpu_count": os.cpu_count(),
+            },
+            "runs": runs,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\n💾 Results saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+OADP CRD Query Server
+
+Keeps the parsed parameter trees of every version in memory and answers diff, path lookup
+and per-file summary queries over a local HTTP/JSON endpoint. Version sources are polled in
+the background and changed files are re-parsed and re-diffed in place.
+
+    GET /versions                                   Versions, requested pairs and load statistics
+    GET /summary                                    Run counters and file events for the requested pairs
+    GET /files                                      Per-file counters
+    GET /files/<name>[?changes=1]                   Counters per pair for one file, optionally with its changes
+    GET /diff?from=1.3&to=1.4[&file=..][&path=..][&type=removed]
+                                                    Changes between any two loaded versions
+    GET /lookup?path=spec.configuration.restic[&file=..][&version=..]
+                                                    Where a parameter (or glob) exists in each version
+"""
+
+import sys
+import json
+import time
+import threading
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from oadp_crd_comparison import CRDComparator, ParameterTrie, PathFilter, format_path
+
+class QueryError(Exception):
+    """A query that cannot be answered, with the HTTP status to report."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+class CRDQueryService:
+    """Answers queries from a comparator whose trees stay resident, independent of HTTP."""
+
+    # Compiled path patterns kept between queries, least recently used first
+    MAX_FILTERS = 256
+
+    def __init__(self, comparator: CRDComparator):
+        self.comparator = comparator
+        self._filters: Dict[str, PathFilter] = {}
+        self.comparator.keep_trees = True
+        # Queries and reloads share the comparator's memoized trees and cached result
+        self.lock = threading.RLock()
+        self.loaded_at = None
+        self.load_seconds = 0.0
+        self.reloads = 0
+        self._snapshots = {}
+        self._routes: Dict[str, Callable[[Dict[str, str]], Dict[str, Any]]] = {
+            "/versions": self.versions,
+            "/summary": self.summary,
+            "/files": self.files,
+            "/diff": self.diff,
+            "/lookup": self.lookup,
+        }
+
+    def load(self) -> None:
+        """Parse every file of every version once and diff the requested pairs."""
+        start = time.perf_counter()
+        with self.lock:
+            self._snapshots = {version: self.comparator.sources[version].snapshot()
+                               for version in self.comparator.active_versions}
+            for version in self.comparator.active_versions:
+                for filename in self.comparator.version_files[version]:
+                    self.comparator._load_parameters(version, filename)
+            self.comparator.result
+        self.load_seconds = time.perf_counter() - start
+        self.loaded_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+    def reload_changed(self) -> List[Tuple[str, str]]:
+        """Re-parse and re-diff the files whose sources changed; returns (filename, status) updates."""
+        with self.lock:
+            changed = self.comparator.poll_changes(self._snapshots)
+            if not changed:
+                return []
+            updates = self.comparator.refresh(changed)
+            self.reloads += 1
+            return updates
+
+    def handle(self, path: str, params: Dict[str, str]) -> Dict[str, Any]:
+        """Dispatch a request path to its query."""
+        if path.startswith("/files/"):
+            return self.file_summary(unquote(path[len("/files/"):]), params)
+        route = self._routes.get(path.rstrip("/") or "/")
+        if route is None:
+            raise QueryError(f"Unknown query {path} (try /versions, /summary, /files, /diff or /lookup)", 404)
+        return route(params)
+
+    def _version(self, params: Dict[str, str], name: str) -> str:
+        version = params.get(name)
+        if version is None:
+            raise QueryError(f"Missing '{name}' parameter")
+        if version not in self.comparator.active_versions:
+            raise QueryError(f"Version {version} not loaded (available: "
+                             f"{', '.join(self.comparator.active_versions)})", 404)
+        return version
+
+    def _path_filter(self, params: Dict[str, str]) -> Optional[PathFilter]:
+        pattern = params.get("path")
+        if not pattern:
+            return None
+        # Compiled filters keep their memoized transitions, so repeated patterns are cheap
+        with self.lock:
+            path_filter = self._filters.pop(pattern, None) or PathFilter([pattern])
+            self._filters[pattern] = path_filter
+            while len(self._filters) > self.MAX_FILTERS:
+                del self._filters[next(iter(self._filters))]
+            return path_filter
+
+    def _file_tree(self, version: str, filename: str) -> ParameterTrie:
+        tree = self.comparator._load_parameters(version, filename)
+        # Single-document files are addressed without a document prefix, as in reports
+        if len(tree.children) <= 1:
+            return next(iter(tree.children.values()), ParameterTrie().seal())
+        return tree
+
+    def versions(self, params: Dict[str, str]) -> Dict[str, Any]:
+        with self.lock:
+            comparator = self.comparator
+            return {
+                "versions": list(comparator.active_versions),
+                "pairs": [list(pair) for pair in comparator.version_pairs],
+                "files": {version: len(comparator.version_files[version]) for version in comparator.active_versions},
+                "common_files": len(comparator.common_files),
+                "loaded_at": self.loaded_at,
+                "load_seconds": round(self.load_seconds, 3),
+                "reloads": self.reloads,
+                "errors": list(comparator.errors),
+            }
+
+    def summary(self, params: Dict[str, str]) -> Dict[str, Any]:
+        with self.lock:
+            result = self.comparator.result
+            return {**result.summary(show_additions=True),
+                    "file_event_list": [asdict(event) for event in result.file_events]}
+
+    def files(self, params: Dict[str, str]) -> Dict[str, Any]:
+        with self.lock:
+            return {"files": [file_result.counts() for file_result in self.comparator.result.files]}
+
+    def file_summary(self, filename: str, params: Dict[str, str]) -> Dict[str, Any]:
+        with self.lock:
+            comparator = self.comparator
+            present = [v for v in comparator.active_versions if filename in comparator.version_files[v]]
+            if not present:
+                raise QueryError(f"File {filename} not found in any version", 404)
+
+            response = {"filename": filename, "versions": present,
+                        "file_events": [asdict(e) for e in comparator.result.file_events
+                                        if filename in (e.filename, e.renamed_from)]}
+            file_result = next((f for f in comparator.result.files if f.filename == filename), None)
+            if file_result is not None:
+                response.update(file_result.counts())
+                pairs = {}
+                for version_pair, changes in file_result.group_by_pair(file_result.changes).items():
+                    pairs[version_pair] = {
+                        "added": sum(c.parameters for c in changes if c.change_type == "added"),
+                        "removed": sum(c.parameters for c in changes if c.change_type == "removed"),
+                    }
+                response["pairs"] = pairs
+                if params.get("changes") in ("1", "true", "yes"):
+                    response["changes"] = [asdict(change) for change in file_result.changes]
+            return response
+
+    def diff(self, params: Dict[str, str]) -> Dict[str, Any]:
+        old_version = self._version(params, "from")
+        new_version = self._version(params, "to")
+        change_type = params.get("type")
+        if change_type not in (None, "added", "removed"):
+            raise QueryError("'type' must be 'added' or 'removed'")
+
+        with self.lock:
+            changes = self.comparator.diff_pair(old_version, new_version,
+                                                [params["file"]] if params.get("file") else None,
+                                                self._path_filter(params))
+        if change_type is not None:
+            changes = [change for change in changes if change.change_type == change_type]
+        return {
+            "from": old_version,
+            "to": new_version,
+            "added": sum(c.parameters for c in changes if c.change_type == "added"),
+            "removed": sum(c.parameters for c in changes if c.change_type == "removed"),
+            "changes": [asdict(change) for change in changes],
+        }
+
+    def lookup(self, params: Dict[str, str]) -> Dict[str, Any]:
+        path_filter = self._path_filter(params)
+        if path_filter is None:
+            raise QueryError("Missing 'path' parameter")
+        versions = [self._version(params, "version")] if params.get("version") else None
+
+        found = {}
+        with self.lock:
+            comparator = self.comparator
+            for version in versions or comparator.active_versions:
+                names = comparator.version_files[version]
+                if params.get("file"):
+                    names = names & {params["file"]}
+                matches = []
+                for filename in sorted(names):
+                    for segments, node in path_filter.matches(self._file_tree(version, filename)):
+                        matches.append({"file": filename, "path": format_path(segments), "line": node.line,
+                                        "column": node.column, "parameters": sum(1 for _ in node.iter_params())})
+                found[version] = matches
+        return {"path": params["path"], "present": {v: bool(m) for v, m in found.items()}, "matches": found}
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """GET-only JSON front end for a CRDQueryService."""
+
+    service: CRDQueryService = None
+    server_version = "OADPCRDQuery/1.0"
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            body, status = self.service.handle(url.path, params), 200
+        except QueryError as e:
+            body, status = {"error": str(e)}, e.status
+        except Exception as e:
+            body, status = {"error": f"{type(e).__name__}: {e}"}, 500
+        body["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Requests are frequent and cheap; keep stderr for load and reload messages
+        pass
+
+def serve(comparator: CRDComparator, host: str = "127.0.0.1", port: int = 8765, interval: float = 1.0) -> None:
+    """Load every version, then answer queries until interrupted, reloading changed files every interval."""
+    service = CRDQueryService(comparator)
+    service.load()
+    print(f"📦 Loaded {len(comparator.active_versions)} versions in {service.load_seconds:.2f}s", file=sys.stderr)
+
+    def reload_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                updates = service.reload_changed()
+            except Exception as e:
+                print(f"Reload failed: {e}", file=sys.stderr)
+                continue
+            for filename, status in updates:
+                print(f"🔄 {filename}: {status}", file=sys.stderr)
+
+    threading.Thread(target=reload_loop, name="crd-reload", daemon=True).start()
+
+    handler = type("BoundQueryRequestHandler", (QueryRequestHandler,), {"service": service})
+    with ThreadingHTTPServer((host, port), handler) as server:
+        print(f"🌐 Serving queries on http://{host}:{server.server_address[1]}/ (Ctrl+C to stop)", file=sys.stderr)
+        server.serve_forever()
@@ -0,0 +1,576 @@
+#!/usr/bin/env python3
+"""
+OADP Manifest Sources
+
+Version sources for the CRD comparison tool. Each source lists the manifest files of one
+OADP version and returns their raw bytes, whether they live in a version directory on disk,
+in the objects of a git repository, in a tarball or zip, or in the layers of an OCI image layout.
+"""
+
+import os
+import json
+import yaml
+import tarfile
+import zipfile
+import posixpath
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Dict, Iterable, List, Optional, Tuple, Union
+
+# LibYAML's event parser when available; the header reader only ever needs events
+YAMLLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Archive suffixes stripped from a file name to get its version label, longest first
+ARCHIVE_SUFFIXES = (".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".tar", ".zip")
+
+MANIFEST_SUFFIXES = (".yaml", ".yml")
+
+# Kinds copied by setup and compared by default
+COMPARED_KINDS = frozenset({
+    "CustomResourceDefinition", "ClusterServiceVersion", "ClusterRole", "ClusterRoleBinding",
+    "Service", "ServiceAccount", "ServiceMonitor", "ConfigMap",
+})
+
+# Written into each version directory by setup; {file name: header} so kinds can be chosen without reading files
+KIND_INDEX_NAME = ".oadp-kinds.json"
+
+@dataclass(frozen=True)
+class ManifestHeader:
+    """The identifying fields of a manifest's first document."""
+    api_version: Optional[str] = None
+    kind: Optional[str] = None
+    name: Optional[str] = None
+
+def read_manifest_header(stream: Union[bytes, str, IO]) -> Optional[ManifestHeader]:
+    """Read apiVersion, kind and metadata.name from the first document of a manifest.
+
+    Walks the YAML event stream and stops as soon as all three are known, so the rest of
+    the file is never parsed (or, for a file object, read). Returns None for files that are
+    not YAML mappings or carry none of the three fields.
+    """
+    fields = {}
+    # One frame per open collection: [is_mapping, expecting_key, current_key]
+    stack = []
+    try:
+        for event in yaml.parse(stream, Loader=YAMLLoader):
+            if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+                if not stack and isinstance(event, yaml.SequenceStartEvent):
+                    return None
+                stack.append([isinstance(event, yaml.MappingStartEvent), True, None])
+                continue
+            if isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+                stack.pop()
+                if not stack:
+                    break  # End of the first document's root
+            elif isinstance(event, yaml.ScalarEvent) and stack and stack[-1][0] and stack[-1][1]:
+                stack[-1][1:] = [False, event.value]
+                continue
+            elif isinstance(event, yaml.ScalarEvent):
+                if not stack:
+                    return None
+                keys = [frame[2] for frame in stack]
+                if keys in (["apiVersion"], ["kind"], ["metadata", "name"]):
+                    fields[keys[-1]] = event.value
+                    if len(fields) == 3:
+                        break
+            elif not isinstance(event, yaml.AliasEvent):
+                continue
+            # A value (scalar, alias or whole collection) is complete; its mapping expects a key again
+            if stack and stack[-1][0]:
+                stack[-1][1:] = [True, None]
+    except yaml.YAMLError:
+        return None
+    if not fields:
+        return None
+    return ManifestHeader(fields.get("apiVersion"), fields.get("kind"), fields.get("name"))
+
+def read_file_header(path: Path) -> Optional[ManifestHeader]:
+    """Read the header of a manifest file, or None if it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            return read_manifest_header(f)
+    except OSError:
+        return None
+
+def load_kind_index(directory: Path) -> Dict[str, ManifestHeader]:
+    """Load the kind index written by setup, skipping entries whose file changed since."""
+    try:
+        with open(Path(directory) / KIND_INDEX_NAME, "r") as f:
+            entries = json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+    index = {}
+    for name, entry in entries.items():
+        try:
+            stat = (Path(directory) / name).stat()
+        except OSError:
+            continue
+        if [stat.st_mtime_ns, stat.st_size] == entry.get("stamp"):
+            index[name] = ManifestHeader(entry.get("apiVersion"), entry.get("kind"), entry.get("name"))
+    return index
+
+def write_kind_index(directory: Path, headers: Dict[str, Optional[ManifestHeader]]):
+    """Record the header and stat stamp of every manifest in a version directory."""
+    files = {}
+    for name, header in sorted(headers.items()):
+        if header is None:
+            continue
+        stat = (Path(directory) / name).stat()
+        files[name] = {"apiVersion": header.api_version, "kind": header.kind, "name": header.name,
+                       "stamp": [stat.st_mtime_ns, stat.st_size]}
+    with open(Path(directory) / KIND_INDEX_NAME, "w") as f:
+        json.dump({"files": files}, f, indent=2)
+        f.write("\n")
+
+class ManifestSource:
+    """The manifest files of one version."""
+
+    def list_files(self) -> List[str]:
+        """Return the sorted names of the manifest files in this source."""
+        raise NotImplementedError
+
+    def read_bytes(self, name: str) -> bytes:
+        """Return the raw contents of a manifest file."""
+        raise NotImplementedError
+
+    def describe(self, name: str) -> str:
+        """Human readable location of a manifest file, used in messages."""
+        return name
+
+    def snapshot(self) -> Dict[str, object]:
+        """Return {file name: stamp}, where the stamp changes whenever the file's contents may have."""
+        raise NotImplementedError
+
+    def kind_index(self) -> Dict[str, Optional[ManifestHeader]]:
+        """Return {file name: header} for every manifest, reading only each file's header."""
+        return {name: read_manifest_header(self.read_bytes(name)) for name in self.list_files()}
+
+class DirectorySource(ManifestSource):
+    """Manifest files copied into a version directory, e.g. /var/tmp/OADP/1.4."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def list_files(self) -> List[str]:
+        # Hidden files (e.g. the setup manifest) are bookkeeping, not manifests
+        return sorted(f.name for f in self.path.iterdir() if f.is_file() and not f.name.startswith('.'))
+
+    def read_bytes(self, name: str) -> bytes:
+        return (self.path / name).read_bytes()
+
+    def describe(self, name: str) -> str:
+        return str(self.path / name)
+
+    def kind_index(self) -> Dict[str, Optional[ManifestHeader]]:
+        # Setup's index covers files it copied; anything else only has its header read
+        index = load_kind_index(self.path)
+        return {name: index[name] if name in index else read_file_header(self.path / name)
+                for name in self.list_files()}
+
+    def snapshot(self) -> Dict[str, object]:
+        # A stat per file is enough to notice edits and re-copies without reading anything
+        stamps = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    stamps[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+class GitCatFile:
+    """A long-lived `git cat-file --batch` process for reading objects without a checkout."""
+
+    # Prefixes tried in order when resolving a branch or tag name
+    REF_PREFIXES = ("", "origin/", "refs/tags/")
+
+    def __init__(self, repo_path: Path):
+        self.repo_path = Path(repo_path)
+        self.process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=self.repo_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+
+    def read_object(self, name: str) -> Optional[Tuple[str, str, bytes]]:
+        """Return (object id, type, contents) for an object name, or None if it does not exist."""
+        self.process.stdin.write(name.encode() + b"\n")
+        self.process.stdin.flush()
+
+        header = self.process.stdout.readline()
+        if not header:
+            raise RuntimeError(f"git cat-file exited unexpectedly in {self.repo_path}")
+
+        fields = header.split()
+        if len(fields) != 3:
+            # "<name> missing" or "<name> ambiguous"
+            return None
+
+        object_id, object_type, size = fields
+        data = self.process.stdout.read(int(size))
+        self.process.stdout.read(1)  # Trailing newline after the contents
+        return object_id.decode(), object_type.decode(), data
+
+    def resolve_commit(self, ref: str) -> Optional[str]:
+        """Resolve a branch, tag or commit name to a commit id without touching HEAD."""
+        for prefix in self.REF_PREFIXES:
+            obj = self.read_object(f"{prefix}{ref}^{{commit}}")
+            if obj is not None:
+                return obj[0]
+        return None
+
+    def list_tree(self, treeish: str) -> Dict[str, str]:
+        """Return {file name: blob id} for the regular files directly inside a tree."""
+        obj = self.read_object(treeish)
+        if obj is None or obj[1] != "tree":
+            return {}
+
+        tree_id, _, data = obj
+        id_length = len(tree_id) // 2
+        entries = {}
+        pos = 0
+        # Tree entries are "<mode> <name>\0<raw object id>"
+        while pos < len(data):
+            space = data.index(b" ", pos)
+            nul = data.index(b"\0", space)
+            mode = data[pos:space]
+            name = data[space + 1:nul].decode()
+            object_id = data[nul + 1:nul + 1 + id_length].hex()
+            pos = nul + 1 + id_length
+            if mode.startswith(b"100"):
+                entries[name] = object_id
+        return entries
+
+    def read_blob(self, blob_id: str) -> bytes:
+        """Return the contents of a blob."""
+        obj = self.read_object(blob_id)
+        if obj is None:
+            raise ValueError(f"Blob {blob_id} not found in {self.repo_path}")
+        return obj[2]
+
+    def close(self) -> None:
+        """Stop the cat-file process."""
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+        self.process.stdout.close()
+
+class GitRefSource(ManifestSource):
+    """Manifest files read straight from the bundle/manifests tree of a git ref.
+
+    Blobs are streamed through one `git cat-file --batch` process per interpreter, so the
+    working tree, index and HEAD of the repository are never touched.
+    """
+
+    def __init__(self, repo_path: Path, ref: str, manifests_path: str = "bundle/manifests"):
+        self.repo_path = Path(repo_path)
+        self.ref = ref
+        self.manifests_path = manifests_path.strip("/")
+        self.commit = None
+        self._entries = None
+        self._reader = None
+        self._reader_pid = None
+
+    def __getstate__(self):
+        # The cat-file pipe cannot cross process boundaries; each worker opens its own
+        state = self.__dict__.copy()
+        state["_reader"] = None
+        state["_reader_pid"] = None
+        return state
+
+    def _get_reader(self) -> GitCatFile:
+        # A forked worker inherits the parent's pipe, which must not be shared
+        if self._reader is None or self._reader_pid != os.getpid():
+            self._reader = GitCatFile(self.repo_path)
+            self._reader_pid = os.getpid()
+        return self._reader
+
+    def _get_entries(self) -> Dict[str, str]:
+        if self._entries is None:
+            reader = self._get_reader()
+            self.commit = reader.resolve_commit(self.ref)
+            if self.commit is None:
+                raise ValueError(f"Ref '{self.ref}' not found in {self.repo_path}")
+            self._entries = {
+                name: blob_id
+                for name, blob_id in reader.list_tree(f"{self.commit}:{self.manifests_path}").items()
+                if name.endswith((".yaml", ".yml"))
+            }
+        return self._entries
+
+    def list_files(self) -> List[str]:
+        return sorted(self._get_entries())
+
+    def read_bytes(self, name: str) -> bytes:
+        return self._get_reader().read_blob(self._get_entries()[name])
+
+    def describe(self, name: str) -> str:
+        return f"{self.ref}:{self.manifests_path}/{name}"
+
+    def snapshot(self) -> Dict[str, object]:
+        # Re-resolve the ref so a branch that moved is noticed; blob ids change with contents
+        self._entries = None
+        return dict(self._get_entries())
+
+def find_manifests_dir(paths: Iterable[str]) -> str:
+    """Pick the directory holding the manifests among archive member paths.
+
+    The shallowest directory named `manifests` wins (operator bundles keep their manifests
+    there); otherwise the shallowest directory containing YAML files is used.
+    """
+    dirs = {posixpath.dirname(p) for p in paths if p.endswith(MANIFEST_SUFFIXES)}
+    if not dirs:
+        return ""
+    named = [d for d in dirs if posixpath.basename(d) == "manifests"]
+    return min(named or dirs, key=lambda d: (d.count("/") if d else -1, d))
+
+def _member_path(name: str) -> str:
+    """Normalize an archive member name, e.g. './manifests/a.yaml' -> 'manifests/a.yaml'."""
+    path = posixpath.normpath(name.lstrip("/"))
+    return "" if path == "." else path
+
+def _in_manifests_dir(path: str, manifests_dir: str) -> bool:
+    return posixpath.dirname(path) == manifests_dir and path.endswith(MANIFEST_SUFFIXES)
+
+def _is_under(path: str, directory: str) -> bool:
+    return not directory or path.startswith(directory + "/")
+
+def _file_stamp(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+class TarSource(ManifestSource):
+    """Manifest files read straight out of a (optionally compressed) tarball, without extracting it.
+
+    Uncompressed tarballs are indexed once and members are read by seeking to their offset.
+    Compressed tarballs cannot be seeked cheaply, so they are streamed and only the members
+    of the manifests directory, which are small, are read and kept in memory. Finding that
+    directory takes one extra pass over the member names unless manifests_path is given.
+    """
+
+    def __init__(self, path: Path, manifests_path: Optional[str] = None):
+        self.path = Path(path)
+        self.manifests_path = manifests_path.strip("/") if manifests_path else None
+        self._entries = None
+        self._stamp = None
+
+    def _get_entries(self) -> Dict[str, object]:
+        # {file name: (offset, size)} for a plain tar, {file name: bytes} for a compressed one
+        if self._entries is None:
+            self._stamp = _file_stamp(self.path)
+            try:
+                with tarfile.open(self.path, "r:") as tar:
+                    members = {_member_path(member.name): (member.offset_data, member.size)
+                               for member in tar if member.isfile()}
+            except tarfile.ReadError:
+                members = None
+
+            if members is not None:
+                manifests_dir = self.manifests_path if self.manifests_path is not None else find_manifests_dir(members)
+                self._entries = {posixpath.basename(p): value for p, value in members.items()
+                                 if _in_manifests_dir(p, manifests_dir)}
+            else:
+                manifests_dir = self.manifests_path
+                if manifests_dir is None:
+                    # Member headers are enough to pick the directory; their data is skipped
+                    with tarfile.open(self.path, "r|*") as tar:
+                        manifests_dir = find_manifests_dir(_member_path(m.name) for m in tar if m.isfile())
+                self._entries = {}
+                with tarfile.open(self.path, "r|*") as tar:
+                    for member in tar:
+                        path = _member_path(member.name)
+                        if member.isfile() and _in_manifests_dir(path, manifests_dir):
+                            self._entries[posixpath.basename(path)] = tar.extractfile(member).read()
+        return self._entries
+
+    def list_files(self) -> List[str]:
+        return sorted(self._get_entries())
+
+    def read_bytes(self, name: str) -> bytes:
+        entry = self._get_entries()[name]
+        if isinstance(entry, bytes):
+            return entry
+        offset, size = entry
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def describe(self, name: str) -> str:
+        return f"{self.path}!{name}"
+
+    def snapshot(self) -> Dict[str, object]:
+        # Any change to the tarball may have touched any member, so every file gets its stamp
+        if self._stamp != _file_stamp(self.path):
+            self._entries = None
+        return {name: self._stamp for name in self._get_entries()}
+
+class ZipSource(ManifestSource):
+    """Manifest files read straight out of a zip archive through its central directory."""
+
+    def __init__(self, path: Path, manifests_path: Optional[str] = None):
+        self.path = Path(path)
+        self.manifests_path = manifests_path.strip("/") if manifests_path else None
+        self._entries = None
+        self._stamp = None
+
+    def _get_entries(self) -> Dict[str, str]:
+        # {file name: member name}
+        if self._entries is None:
+            self._stamp = _file_stamp(self.path)
+            with zipfile.ZipFile(self.path) as archive:
+                members = {_member_path(info.filename): info.filename
+                           for info in archive.infolist() if not info.is_dir()}
+            manifests_dir = self.manifests_path if self.manifests_path is not None else find_manifests_dir(members)
+            self._entries = {
+                posixpath.basename(p): member for p, member in members.items()
+                if posixpath.dirname(p) == manifests_dir and p.endswith(MANIFEST_SUFFIXES)
+            }
+        return self._entries
+
+    def list_files(self) -> List[str]:
+        return sorted(self._get_entries())
+
+    def read_bytes(self, name: str) -> bytes:
+        with zipfile.ZipFile(self.path) as archive:
+            return archive.read(self._get_entries()[name])
+
+    def describe(self, name: str) -> str:
+        return f"{self.path}!{name}"
+
+    def snapshot(self) -> Dict[str, object]:
+        if self._stamp != _file_stamp(self.path):
+            self._entries = None
+        return {name: self._stamp for name in self._get_entries()}
+
+class OCILayoutSource(ManifestSource):
+    """Manifest files read from the layers of an image in a local OCI image layout directory.
+
+    The image is found through index.json (the first image, or the one whose
+    org.opencontainers.image.ref.name annotation matches tag). Its layers are streamed in
+    order with later layers and whiteouts applied the way a container runtime would, and
+    only members of the manifests directory are read. Finding that directory takes one
+    extra pass over the layer member names unless manifests_path is given.
+    """
+
+    MANIFEST_MEDIA_TYPES = ("application/vnd.oci.image.manifest.v1+json",
+                            "application/vnd.docker.distribution.manifest.v2+json")
+    INDEX_MEDIA_TYPES = ("application/vnd.oci.image.index.v1+json",
+                         "application/vnd.docker.distribution.manifest.list.v2+json")
+
+    def __init__(self, path: Path, manifests_path: Optional[str] = None, tag: Optional[str] = None):
+        self.path = Path(path)
+        self.manifests_path = manifests_path.strip("/") if manifests_path else None
+        self.tag = tag
+        self._entries = None
+        self._stamp = None
+
+    def _blob_path(self, digest: str) -> Path:
+        algorithm, _, value = digest.partition(":")
+        return self.path / "blobs" / algorithm / value
+
+    def _read_json(self, digest: str) -> dict:
+        return json.loads(self._blob_path(digest).read_bytes())
+
+    def _image_manifest(self) -> dict:
+        """Resolve index.json down to a single image manifest."""
+        index = json.loads((self.path / "index.json").read_text())
+        descriptors = index.get("manifests", [])
+        if self.tag is not None:
+            descriptors = [d for d in descriptors
+                           if d.get("annotations", {}).get("org.opencontainers.image.ref.name") == self.tag]
+        while descriptors:
+            descriptor = descriptors[0]
+            if descriptor.get("mediaType") in self.INDEX_MEDIA_TYPES:
+                # A multi-platform index; bundle images hold the same manifests on every platform
+                descriptors = self._read_json(descriptor["digest"]).get("manifests", [])
+                continue
+            return self._read_json(descriptor["digest"])
+        raise ValueError(f"No image {'tagged ' + repr(self.tag) + ' ' if self.tag else ''}found in OCI layout {self.path}")
+
+    def _apply_layers(self, layers: List[dict], manifests_dir: Optional[str]) -> Dict[str, Optional[bytes]]:
+        """Stream the layers in order into {member path: data}.
+
+        Data is read only for members of manifests_dir; with None, nothing is read and
+        only the surviving paths are returned.
+        """
+        members = {}
+        for layer in layers:
+            media_type = layer.get("mediaType", "")
+            if "zstd" in media_type:
+                raise ValueError(f"Unsupported layer compression {media_type} in OCI layout {self.path}")
+            # Whiteouts hide what lower layers put there, never what this layer adds
+            added = set()
+            with tarfile.open(self._blob_path(layer["digest"]), "r|*") as tar:
+                for member in tar:
+                    path = _member_path(member.name)
+                    directory, base = posixpath.split(path)
+                    if base == ".wh..wh..opq":
+                        members = {p: d for p, d in members.items() if p in added or not _is_under(p, directory)}
+                    elif base.startswith(".wh."):
+                        hidden = posixpath.join(directory, base[4:])
+                        members = {p: d for p, d in members.items()
+                                   if p in added or (p != hidden and not _is_under(p, hidden))}
+                    elif member.isfile():
+                        read = manifests_dir is not None and _in_manifests_dir(path, manifests_dir)
+                        members[path] = tar.extractfile(member).read() if read else None
+                        added.add(path)
+        return members
+
+    def _get_entries(self) -> Dict[str, bytes]:
+        if self._entries is None:
+            self._stamp = _file_stamp(self.path / "index.json")
+            layers = self._image_manifest().get("layers", [])
+            manifests_dir = self.manifests_path
+            if manifests_dir is None:
+                manifests_dir = find_manifests_dir(self._apply_layers(layers, None))
+            members = self._apply_layers(layers, manifests_dir)
+            self._entries = {posixpath.basename(p): data for p, data in members.items()
+                             if _in_manifests_dir(p, manifests_dir)}
+        return self._entries
+
+    def list_files(self) -> List[str]:
+        return sorted(self._get_entries())
+
+    def read_bytes(self, name: str) -> bytes:
+        return self._get_entries()[name]
+
+    def describe(self, name: str) -> str:
+        return f"{self.path}@{self.tag or 'image'}:{name}"
+
+    def snapshot(self) -> Dict[str, object]:
+        # Blobs are content addressed, so a new image always rewrites index.json
+        if self._stamp != _file_stamp(self.path / "index.json"):
+            self._entries = None
+        return {name: self._stamp for name in self._get_entries()}
+
+def source_label(path: Path) -> str:
+    """Version label of a version directory or archive, e.g. '1.4.tar.gz' -> '1.4'."""
+    name = Path(path).name
+    if Path(path).is_file():
+        for suffix in ARCHIVE_SUFFIXES:
+            if name.endswith(suffix):
+                return name[:-len(suffix)]
+    return name
+
+def open_source(path: Path, manifests_path: Optional[str] = None) -> ManifestSource:
+    """Open a version directory, OCI image layout, tarball or zip as a manifest source.
+
+    An OCI layout may be given as PATH:TAG to pick an image by its ref name annotation.
+    """
+    path = Path(path).expanduser()
+    tag = None
+    if not path.exists() and ":" in path.name:
+        # layout-dir:tag
+        path, tag = path.parent / path.name.rsplit(":", 1)[0], path.name.rsplit(":", 1)[1]
+    if path.is_dir():
+        if (path / "oci-layout").is_file():
+            return OCILayoutSource(path, manifests_path, tag)
+        return DirectorySource(path)
+    if path.is_file():
+        if zipfile.is_zipfile(path):
+            return ZipSource(path, manifests_path)
+        if tarfile.is_tarfile(path):
+            return TarSource(path, manifests_path)
+    raise ValueError(f"Not a version directory, OCI layout, tarball or zip: {path}")
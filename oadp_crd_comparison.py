@@ -2,20 +2,40 @@
 """
 OADP CRD Version Comparison Tool
 
-This tool compares OADP Custom Resource Definition files across versions 1.3, 1.4, and 1.5
-and identifies parameter additions (green check) and removals (red X) between versions.
+This tool compares OADP Custom Resource Definition files across every version directory it
+finds (e.g. 1.3, 1.4, 1.5) and identifies parameter additions (green check) and removals (red X)
+between versions.
 """
 
 import os
+import re
 import sys
+import fnmatch
 import yaml
 import json
+import time
+import hashlib
+import tempfile
 import argparse
-from typing import Dict, List, Set, Tuple, Any
+import heapq
+import contextlib
+import tracemalloc
+from typing import Dict, List, Set, Tuple, Any, Optional, Iterator, Iterable, TextIO, Union
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ProcessPoolExecutor
 from collections import defaultdict
 
+from manifest_sources import ManifestSource, GitRefSource, ARCHIVE_SUFFIXES, open_source, read_manifest_header, source_label
+
+# Use the LibYAML bindings when PyYAML was built with them
+try:
+    YAMLLoader = yaml.CSafeLoader
+    YAMLDumper = yaml.CSafeDumper
+except AttributeError:
+    YAMLLoader = yaml.SafeLoader
+    YAMLDumper = yaml.SafeDumper
+
 # ANSI color codes for output formatting
 class Colors:
     RED = '\033[91m'
@@ -29,6 +49,11 @@ class Colors:
     UNDERLINE = '\033[4m'
     END = '\033[0m'
 
+class NoColors(Colors):
+    """Palette used when the output is not a terminal."""
+    RED = GREEN = YELLOW = BLUE = MAGENTA = CYAN = WHITE = ''
+    BOLD = UNDERLINE = END = ''
+
 @dataclass
 class ParameterChange:
     path: str
@@ -38,439 +63,2241 @@ class ParameterChange:
     version_to: str
     parameter_name: str
     full_path: str
+    column_number: int = 0
+    # More than 1 when a wholly added or removed subtree is reported as its root alone
+    parameters: int = 1
+
+    def subtree_note(self) -> str:
+        """Suffix describing a collapsed subtree, or '' for a single parameter."""
+        return f" (entire subtree: {self.parameters} parameters)" if self.parameters > 1 else ""
+
+@dataclass
+class FileComparison:
+    """All parameter changes found for one file, with counters collected while diffing."""
+    filename: str
+    changes: List[ParameterChange] = field(default_factory=list)
+    added: int = 0
+    removed: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.added + self.removed
+
+    def counts(self) -> Dict[str, Any]:
+        """Per-file counters as a plain dict."""
+        return {"filename": self.filename, "added": self.added, "removed": self.removed, "total": self.total}
+
+    def visible_changes(self, show_additions: bool) -> List[ParameterChange]:
+        """Changes to list in a report, honouring the --show-additions flag."""
+        if show_additions:
+            return self.changes
+        return [c for c in self.changes if c.change_type == "removed"]
+
+    @staticmethod
+    def group_by_pair(changes: List[ParameterChange]) -> Dict[str, List[ParameterChange]]:
+        """Group changes by version pair, removals first then additions, sorted by path."""
+        grouped_changes = defaultdict(list)
+        for change in changes:
+            key = f"{change.version_from}→{change.version_to}"
+            grouped_changes[key].append(change)
+        for version_changes in grouped_changes.values():
+            version_changes.sort(key=lambda x: (x.change_type == "added", x.full_path))
+        return grouped_changes
+
+@dataclass
+class FileEvent:
+    """A file added, removed or renamed between two versions."""
+    event_type: str  # 'added', 'removed' or 'renamed'
+    version_from: str
+    version_to: str
+    filename: str
+    renamed_from: Optional[str] = None
+    similarity: Optional[float] = None
+    parameters: int = 0
+    parameters_added: int = 0
+    parameters_removed: int = 0
+
+@dataclass
+class ComparisonResult:
+    """Result of one comparison run, built once and read by every report renderer."""
+    versions: List[str]
+    pairs: List[Tuple[str, str]] = field(default_factory=list)
+    files: List[FileComparison] = field(default_factory=list)
+    added_count: int = 0
+    removed_count: int = 0
+    file_events: List[FileEvent] = field(default_factory=list)
+
+    def add_file(self, filename: str, changes: List[ParameterChange]) -> FileComparison:
+        """Record the changes for a file and update the run counters."""
+        file_result = FileComparison(filename=filename, changes=changes)
+        for change in changes:
+            if change.change_type == "added":
+                file_result.added += change.parameters
+            else:
+                file_result.removed += change.parameters
+        self.files.append(file_result)
+        self.added_count += file_result.added
+        self.removed_count += file_result.removed
+        return file_result
+
+    def remove_file(self, filename: str) -> None:
+        """Drop a file's changes and counters, if it is part of the result."""
+        for file_result in self.files:
+            if file_result.filename == filename:
+                self.files.remove(file_result)
+                self.added_count -= file_result.added
+                self.removed_count -= file_result.removed
+                return
+
+    def replace_file(self, filename: str, changes: List[ParameterChange]) -> FileComparison:
+        """Record fresh changes for a file, replacing any earlier ones and keeping files in name order."""
+        self.remove_file(filename)
+        file_result = self.add_file(filename, changes)
+        self.files.sort(key=lambda f: f.filename)
+        return file_result
+
+    def shown_count(self, show_additions: bool) -> int:
+        """Number of changes listed in the per-file section of a report."""
+        return self.added_count + self.removed_count if show_additions else self.removed_count
+
+    def files_with_changes(self, show_additions: bool) -> int:
+        """Number of files that have at least one listed change."""
+        if show_additions:
+            return sum(1 for f in self.files if f.total > 0)
+        return sum(1 for f in self.files if f.removed > 0)
+
+    def files_by_total(self) -> List[FileComparison]:
+        """Files sorted by total changes (descending), then by name."""
+        return sorted(self.files, key=lambda f: (-f.total, f.filename))
+
+    def summary(self, show_additions: bool) -> Dict[str, Any]:
+        """Run-level counters as a plain dict, as emitted by the JSON outputs."""
+        return {
+            "versions": self.versions,
+            "pairs": [list(pair) for pair in self.pairs],
+            "files_analyzed": len(self.files),
+            "files_with_changes": self.files_with_changes(show_additions),
+            "changes_shown": self.shown_count(show_additions),
+            "added": self.added_count,
+            "removed": self.removed_count,
+            "distribution": self.change_distribution(),
+            "file_events": self.file_event_counts(),
+        }
+
+    def file_event_counts(self) -> Dict[str, int]:
+        """Count distinct files added, removed and renamed over all reported transitions.
+        
+        A file removed in 1.5 shows up in every pair that spans 1.4 to 1.5 or later, but is
+        counted once.
+        """
+        files = {"added": set(), "removed": set(), "renamed": set()}
+        for event in self.file_events:
+            files[event.event_type].add((event.renamed_from, event.filename))
+        return {event_type: len(names) for event_type, names in files.items()}
+
+    def visible_file_events(self, show_additions: bool) -> List[FileEvent]:
+        """File events to list in a report; added files are hidden like added parameters."""
+        return [e for e in self.file_events if show_additions or e.event_type != "added"]
+
+    def change_distribution(self) -> Dict[str, int]:
+        """Count files with only additions, only removals, both, or no changes."""
+        return {
+            'only_additions': sum(1 for f in self.files if f.added > 0 and f.removed == 0),
+            'only_removals': sum(1 for f in self.files if f.removed > 0 and f.added == 0),
+            'both': sum(1 for f in self.files if f.added > 0 and f.removed > 0),
+            'unchanged': sum(1 for f in self.files if f.total == 0),
+        }
+
+# A path segment is a mapping key (str), a list index (int), the identity of a list
+# item as a tuple of alternating field names and values, e.g. ("name", "manager"), or the
+# DocumentKey of one document in a multi-document file
+Segment = Any
+PathSegments = Tuple[Segment, ...]
+
+# Fields that identify the items of a list, by the name of the key holding the list.
+# "*" applies to every other list. An empty tuple keeps positional [i] matching.
+DEFAULT_LIST_KEYS = {
+    "*": ("name",),
+    "owned": ("name", "version"),
+    "required": ("name", "version"),
+    "specDescriptors": ("path",),
+    "statusDescriptors": ("path",),
+    "rules": ("apiGroups", "resources", "nonResourceURLs", "resourceNames"),
+    "permissions": ("serviceAccountName",),
+    "clusterPermissions": ("serviceAccountName",),
+    "installModes": ("type",),
+}
+
+class DocumentKey(str):
+    """Segment naming one document of a YAML stream, as kind/name (e.g. ConfigMap/settings)."""
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return f"DocumentKey({str.__repr__(self)})"
+
+def format_path(segments: PathSegments) -> str:
+    """Render path segments as a dotted parameter path, e.g. spec.containers[name=manager].image."""
+    parts = []
+    for segment in segments:
+        if isinstance(segment, int):
+            parts.append(f"[{segment}]")
+        elif isinstance(segment, tuple):
+            fields = ",".join(f"{segment[i]}={segment[i + 1]}" for i in range(0, len(segment), 2))
+            parts.append(f"[{fields}]")
+        elif isinstance(segment, DocumentKey):
+            parts.append(f"{segment}:")
+        elif parts and not parts[-1].endswith(":"):
+            parts.append(f".{segment}")
+        else:
+            parts.append(segment)
+    return "".join(parts)
+
+class PathFilter:
+    """Include and exclude glob patterns over parameter paths, matched one segment at a time.
+    
+    Patterns use the report's path syntax: `*` matches within one key, `[*]` matches any list
+    item (by position or identity), and `**` matches any number of segments, e.g.
+    `spec.versions[*].schema.**` or `**.description`. Each pattern is compiled once into a
+    list of segment matchers, and traversal carries the set of partial matches, so a subtree
+    that is excluded, or that can no longer lead to an included path, is never visited.
+    """
+    IGNORE_FILE_NAME = ".crdignore"
+    
+    def __init__(self, include: Iterable[str] = (), exclude: Iterable[str] = ()):
+        self.include_patterns = list(include)
+        self.exclude_patterns = list(exclude)
+        self._include = [self._compile(p) for p in self.include_patterns]
+        self._exclude = [self._compile(p) for p in self.exclude_patterns]
+        # Transitions are memoized; CRD schemas repeat the same keys at every level
+        self._steps = {}
+        # A state is (include positions or True once an include matched, exclude positions)
+        include_state = self._closure(self._include, {(i, 0) for i in range(len(self._include))}) if self._include else True
+        if include_state is not True and self._matched(self._include, include_state):
+            include_state = True
+        self.initial = (include_state, self._closure(self._exclude, {(i, 0) for i in range(len(self._exclude))}))
+    
+    @staticmethod
+    def _compile(pattern: str) -> Tuple[Any, ...]:
+        """Split a pattern into tokens: '**', ('key', regex) or ('item', regex)."""
+        tokens = []
+        for part in re.findall(r'\[[^\]]*\]|[^.\[]+', pattern):
+            if part == "**":
+                tokens.append("**")
+            elif part.startswith("["):
+                tokens.append(("item", re.compile(fnmatch.translate(part[1:-1]))))
+            else:
+                tokens.append(("key", re.compile(fnmatch.translate(part))))
+        return tuple(tokens)
+    
+    @classmethod
+    def read_ignore_file(cls, path: Path) -> List[str]:
+        """Exclude patterns from an ignore file: one per line, '#' starts a comment."""
+        with open(path, 'r') as f:
+            return [line.split('#', 1)[0].strip() for line in f if line.split('#', 1)[0].strip()]
+    
+    @staticmethod
+    def _closure(patterns: List[Tuple[Any, ...]], positions: Set[Tuple[int, int]]) -> frozenset:
+        # '**' may match nothing, so a position before it is also a position after it
+        pending = list(positions)
+        closed = set(positions)
+        while pending:
+            i, pos = pending.pop()
+            if pos < len(patterns[i]) and patterns[i][pos] == "**" and (i, pos + 1) not in closed:
+                closed.add((i, pos + 1))
+                pending.append((i, pos + 1))
+        return frozenset(closed)
+    
+    @staticmethod
+    def _matched(patterns: List[Tuple[Any, ...]], positions: frozenset) -> bool:
+        return any(pos == len(patterns[i]) for i, pos in positions)
+    
+    def _advance(self, patterns: List[Tuple[Any, ...]], positions: frozenset, kind: str, text: str) -> frozenset:
+        advanced = set()
+        for i, pos in positions:
+            if pos == len(patterns[i]):
+                continue
+            token = patterns[i][pos]
+            if token == "**":
+                advanced.add((i, pos))
+            elif token[0] == kind and token[1].match(text):
+                advanced.add((i, pos + 1))
+        return self._closure(patterns, advanced)
+    
+    def _step(self, state: Tuple[Any, frozenset], kind: str, text: str) -> Optional[Tuple[Any, frozenset]]:
+        key = (state, kind, text)
+        if key in self._steps:
+            return self._steps[key]
+        include_state, exclude_state = state
+        result = None
+        exclude_state = self._advance(self._exclude, exclude_state, kind, text)
+        if not self._matched(self._exclude, exclude_state):
+            if include_state is not True:
+                include_state = self._advance(self._include, include_state, kind, text)
+                if self._matched(self._include, include_state):
+                    include_state = True
+            # Positions left means some include can still match below this node
+            if include_state:
+                result = (include_state, exclude_state)
+        self._steps[key] = result
+        return result
+    
+    def includes(self, state: Tuple[Any, frozenset]) -> bool:
+        """Whether a node is included itself, rather than only kept because an include may match below it."""
+        return state[0] is True
+    
+    def step_key(self, state: Tuple[Any, frozenset], key: Any) -> Optional[Tuple[Any, frozenset]]:
+        """Advance past a mapping key; None if the key's subtree is to be skipped."""
+        # Keys containing dots (e.g. annotations) are shown dotted, so they match as several segments
+        for part in f"{key}".split('.'):
+            state = self._step(state, "key", part)
+            if state is None:
+                return None
+        return state
+    
+    def step_item(self, state: Tuple[Any, frozenset], segment: Any) -> Optional[Tuple[Any, frozenset]]:
+        """Advance past a list item segment (position or identity); None if it is to be skipped."""
+        return self._step(state, "item", format_path((segment,))[1:-1])
+    
+    def step_segment(self, state: Tuple[Any, frozenset], segment: Any) -> Optional[Tuple[Any, frozenset]]:
+        """Advance past any trie segment; documents of a multi-document file are matched from their root."""
+        if isinstance(segment, DocumentKey):
+            return state
+        if isinstance(segment, str):
+            return self.step_key(state, segment)
+        return self.step_item(state, segment)
+    
+    def select(self, tree: "ParameterTrie", state: Optional[Tuple[Any, frozenset]] = None) -> "ParameterTrie":
+        """Return the part of an already built trie that this filter keeps.
+        
+        Nodes kept only on the way to an included path are not parameters in the result.
+        """
+        state = self.initial if state is None else state
+        result = ParameterTrie(tree.is_param and self.includes(state), tree.line, tree.column)
+        for segment, child in tree.children.items():
+            child_state = self.step_segment(state, segment)
+            if child_state is None:
+                continue
+            selected = self.select(child, child_state)
+            if not selected.is_empty():
+                result.children[segment] = selected
+        return result
+    
+    def matches(self, tree: "ParameterTrie", prefix: PathSegments = (),
+                state: Optional[Tuple[Any, frozenset]] = None) -> Iterator[Tuple[PathSegments, "ParameterTrie"]]:
+        """Yield (path, node) for the outermost parameters of a trie that an include pattern matches."""
+        state = self.initial if state is None else state
+        for segment, child in tree.children.items():
+            child_state = self.step_segment(state, segment)
+            if child_state is None:
+                continue
+            if child.is_param and self.includes(child_state):
+                yield prefix + (segment,), child
+            else:
+                yield from self.matches(child, prefix + (segment,), child_state)
+
+class ParameterTrie:
+    """A trie of parameter paths with interned segments and a Merkle digest per node.
+
+    A file's parameters are one trie: mapping keys are parameters, and list items are
+    intermediate nodes that only group the parameters of one element. Path segments are
+    stored once per node (interned), so the long shared prefixes of CRD schemas are never
+    repeated, and paths are turned into dotted strings only for reported changes.
+
+    The digest covers the shape of a subtree (keys, list positions and which nodes are
+    parameters) but not scalar values. Set operations skip subtrees with equal digests,
+    so identical files and subtrees compare in O(1). Tries built by set operations share
+    unchanged subtrees with their inputs and are not sealed (they have no digest).
+    """
+    __slots__ = ("is_param", "line", "column", "children", "digest")
+
+    def __init__(self, is_param: bool = False, line: int = 0, column: int = 0):
+        self.is_param = is_param
+        self.line = line
+        self.column = column
+        self.children = {}
+        self.digest = b""
+
+    def seal(self) -> "ParameterTrie":
+        """Compute this node's digest from its (already sealed) children."""
+        h = hashlib.blake2b(b"P" if self.is_param else b"I", digest_size=16)
+        for segment, child in sorted(self.children.items(), key=lambda item: str(item[0])):
+            h.update(f"{segment!r}\0".encode())
+            h.update(child.digest)
+        self.digest = h.digest()
+        return self
+
+    def is_empty(self) -> bool:
+        return not self.is_param and not self.children
+
+    def _same_shape(self, other: "ParameterTrie") -> bool:
+        return self is other or (bool(self.digest) and self.digest == other.digest)
+
+    def difference(self, other: "ParameterTrie") -> "ParameterTrie":
+        """Return a trie of the parameters in this trie that are not in other."""
+        result = ParameterTrie(self.is_param and not other.is_param, self.line, self.column)
+        if self._same_shape(other):
+            result.is_param = False
+            return result
+        
+        for segment, child in self.children.items():
+            other_child = other.children.get(segment)
+            if other_child is None:
+                # Whole subtree is missing from other; share it rather than copy it
+                result.children[segment] = child
+            else:
+                child_difference = child.difference(other_child)
+                if not child_difference.is_empty():
+                    result.children[segment] = child_difference
+        return result
+
+    def union(self, other: "ParameterTrie") -> "ParameterTrie":
+        """Return a trie of the parameters in either trie."""
+        if other.is_empty() or self._same_shape(other):
+            return self
+        if self.is_empty():
+            return other
+        
+        result = ParameterTrie(self.is_param or other.is_param, self.line, self.column)
+        result.children = dict(self.children)
+        for segment, other_child in other.children.items():
+            child = result.children.get(segment)
+            result.children[segment] = other_child if child is None else child.union(other_child)
+        return result
+
+    def find(self, segments: PathSegments) -> Optional["ParameterTrie"]:
+        """Return the descendant at the given path, or None."""
+        node = self
+        for segment in segments:
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def iter_params(self, prefix: PathSegments = ()) -> Iterator[Tuple[PathSegments, "ParameterTrie"]]:
+        """Yield (path, node) for this node (if it is a parameter) and every parameter below it."""
+        if self.is_param:
+            yield prefix, self
+        for segment, child in self.children.items():
+            yield from child.iter_params(prefix + (segment,))
+
+    def to_json(self) -> list:
+        """Compact JSON form used by the parse cache."""
+        return [int(self.is_param), self.line, self.column, self.digest.hex(),
+                [[{"doc": str(segment)} if isinstance(segment, DocumentKey) else segment, child.to_json()]
+                 for segment, child in self.children.items()]]
+
+    @classmethod
+    def from_json(cls, value: list) -> "ParameterTrie":
+        is_param, line, column, digest, children = value
+        node = cls(bool(is_param), line, column)
+        node.digest = bytes.fromhex(digest)
+        node.children = {}
+        for segment, child in children:
+            if isinstance(segment, str):
+                segment = sys.intern(segment)
+            elif isinstance(segment, list):
+                segment = tuple(sys.intern(part) for part in segment)
+            elif isinstance(segment, dict):
+                segment = DocumentKey(segment["doc"])
+            node.children[segment] = cls.from_json(child)
+        return node
+
+def list_item_segments(items: List[Dict], key_fields: Tuple[str, ...]) -> Optional[List[Segment]]:
+    """Return identity segments for the dict items of a list, or None to match by position.
+
+    Each item is identified by the values of the key fields it has. If any item has none
+    of them, or two items share an identity, the whole list falls back to positions.
+    """
+    if not key_fields:
+        return None
+    
+    segments = []
+    for item in items:
+        identity = []
+        for field_name in key_fields:
+            if field_name not in item:
+                continue
+            value = item[field_name]
+            if isinstance(value, list) and all(not isinstance(v, (dict, list)) for v in value):
+                value = "|".join(str(v) for v in value)
+            elif isinstance(value, (dict, list)):
+                return None
+            identity.extend((sys.intern(field_name), sys.intern(str(value))))
+        if not identity:
+            return None
+        segments.append(tuple(identity))
+    
+    if len(set(segments)) != len(segments):
+        return None
+    return segments
+
+# Size of the bottom-k MinHash sketches used to spot renamed files
+SKETCH_SIZE = 128
+
+# Files with fewer parameters are never reported as renames: small RBAC roles and config maps
+# of the same kind share most of their shape, so any two of them look alike
+RENAME_MIN_PARAMETERS = 20
+
+def sketch_parameters(paths: Iterable[str], size: int = SKETCH_SIZE) -> List[int]:
+    """Bottom-k MinHash sketch of a set of parameter paths: the k smallest 64-bit path hashes."""
+    hashes = {int.from_bytes(hashlib.blake2b(path.encode(), digest_size=8).digest(), 'little') for path in paths}
+    return sorted(heapq.nsmallest(size, hashes))
+
+def sketch_similarity(a: List[int], b: List[int], size: int = SKETCH_SIZE) -> float:
+    """Estimate the Jaccard similarity of two parameter sets from their sketches."""
+    if not a or not b:
+        return 0.0
+    # The k smallest hashes of the union are a uniform sample of it; count those in both sets
+    union_sample = heapq.nsmallest(size, set(a) | set(b))
+    a_set, b_set = set(a), set(b)
+    return sum(1 for h in union_sample if h in a_set and h in b_set) / len(union_sample)
+
+def match_renames(removed: Dict[str, List[int]], added: Dict[str, List[int]], threshold: float,
+                  kinds: Optional[Dict[str, Optional[str]]] = None) -> List[Tuple[str, str, float]]:
+    """Pair removed and added files whose sketches are at least threshold similar, best matches first.
+    
+    Candidates are found through an inverted index of sketch hashes, so only files that share
+    at least one sampled parameter are ever compared. With kinds ({file name: manifest kind}),
+    only files of the same kind are paired.
+    """
+    index = defaultdict(list)
+    for name, sketch in added.items():
+        for h in sketch:
+            index[h].append(name)
+    
+    candidates = []
+    for old_name, sketch in removed.items():
+        for new_name in {name for h in sketch for name in index.get(h, ())}:
+            if kinds is not None and kinds.get(old_name) != kinds.get(new_name):
+                continue
+            similarity = sketch_similarity(sketch, added[new_name])
+            if similarity >= threshold:
+                candidates.append((similarity, old_name, new_name))
+    
+    # Greedy one-to-one matching; ties broken by name so the result is stable
+    candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+    matched_old, matched_new, renames = set(), set(), []
+    for similarity, old_name, new_name in candidates:
+        if old_name not in matched_old and new_name not in matched_new:
+            matched_old.add(old_name)
+            matched_new.add(new_name)
+            renames.append((old_name, new_name, similarity))
+    return renames
+
+def canonical_digest(data: Any) -> Optional[str]:
+    """SHA-256 of parsed YAML content with sorted keys, so key order, whitespace and comments do not matter.
+    
+    Returns None for mappings with mixed key types, which cannot be sorted.
+    """
+    try:
+        text = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    except TypeError:
+        return None
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def diff_trees(old: ParameterTrie, new: ParameterTrie) -> Tuple[ParameterTrie, ParameterTrie]:
+    """Return tries of the (added, removed) parameters between two sealed parameter tries."""
+    return new.difference(old), old.difference(new)
+
+VERSION_DIR_PATTERN = re.compile(r'^v?(\d+(?:\.\d+)*)$')
+
+def parse_version(name: str) -> Optional[Tuple[int, ...]]:
+    """Return a sortable version key for a directory name like '1.4' or 'v1.4.2', or None."""
+    match = VERSION_DIR_PATTERN.match(name)
+    if not match:
+        return None
+    return tuple(int(part) for part in match.group(1).split('.'))
+
+def parse_pairs(specs: List[str], versions: List[str]) -> List[Tuple[str, str]]:
+    """Expand --pairs selectors ('OLD:NEW', 'consecutive' or 'all') into version pairs."""
+    pairs = []
+    for spec in specs:
+        if spec == "consecutive":
+            pairs.extend(zip(versions, versions[1:]))
+        elif spec == "all":
+            pairs.extend((old, new) for i, old in enumerate(versions) for new in versions[i + 1:])
+        else:
+            old_version, sep, new_version = spec.partition(':')
+            if not sep or old_version == new_version:
+                raise ValueError(f"Invalid version pair '{spec}' (expected OLD:NEW, 'consecutive' or 'all')")
+            for version in (old_version, new_version):
+                if version not in versions:
+                    raise ValueError(f"Version {version} in pair '{spec}' not found (available: {', '.join(versions)})")
+            pairs.append((old_version, new_version))
+    
+    # Drop duplicates while keeping the requested order
+    return list(dict.fromkeys(pairs))
+
+def default_pairs(versions: List[str]) -> List[Tuple[str, str]]:
+    """Every consecutive transition, plus first -> last when there are more than two versions."""
+    pairs = list(zip(versions, versions[1:]))
+    if len(versions) > 2:
+        pairs.append((versions[0], versions[-1]))
+    return pairs
+
+def compose_deltas(deltas: List[Tuple[ParameterTrie, ParameterTrie]]) -> Tuple[ParameterTrie, ParameterTrie]:
+    """Compose consecutive (added, removed) deltas into the net delta across the whole span.
+
+    Work is proportional to the size of the deltas, not to the number of parameters.
+    """
+    added, removed = deltas[0]
+    for step_added, step_removed in deltas[1:]:
+        # A parameter re-added after a removal (or removed after an addition) cancels out
+        added, removed = (
+            added.difference(step_removed).union(step_added.difference(removed)),
+            removed.difference(step_added).union(step_removed.difference(added)),
+        )
+    return added, removed
+
+class ParseCache:
+    """On-disk cache of parameter trees, keyed by the SHA-256 of the file bytes.
+
+    Each entry is a small JSON file. Reading an entry refreshes its modification time,
+    and once the directory grows past max_bytes the least recently used entries are
+    evicted first.
+    """
+
+    # Bump whenever the stored parameter format changes so stale entries are ignored
+    FORMAT_VERSION = 5
+    DEFAULT_DIR_NAME = ".crd_cache"
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES, variant: str = ""):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        # Distinguishes entries built with different extraction options from the same bytes
+        self.variant = variant
+        self.hits = 0
+        self.misses = 0
+        # Bytes on disk, counted once on the first write and kept as a running total after that
+        self._size: Optional[int] = None
+
+    def _entry_path(self, digest: str) -> Path:
+        if self.variant:
+            return self.cache_dir / f"{digest}-{self.variant}.json"
+        return self.cache_dir / f"{digest}.json"
+
+    def get(self, digest: str) -> Optional[ParameterTrie]:
+        """Return the cached parameter tree for a file digest, or None on a miss."""
+        entry_path = self._entry_path(digest)
+        try:
+            with open(entry_path, 'r') as f:
+                entry = json.load(f)
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        
+        if entry.get("format") != self.FORMAT_VERSION:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        return ParameterTrie.from_json(entry["tree"])
+
+    def put(self, digest: str, tree: ParameterTrie) -> None:
+        """Store the parameter tree for a file digest, then evict entries over the size limit."""
+        entry = {"format": self.FORMAT_VERSION, "tree": tree.to_json()}
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f, separators=(',', ':'))
+            entry_path = self._entry_path(digest)
+            os.replace(tmp_path, entry_path)
+            self._grow(entry_path.stat().st_size)
+        except OSError:
+            # Caching is best effort; an unwritable cache directory just means no cache
+            return
+
+    def get_canonical(self, digest: str) -> Optional[str]:
+        """Return the canonical YAML digest recorded for a file digest, or None."""
+        entry_path = self.cache_dir / f"{digest}.canonical"
+        try:
+            canonical = entry_path.read_text().strip()
+            os.utime(entry_path)
+        except OSError:
+            return None
+        return canonical or None
+
+    def put_canonical(self, digest: str, canonical: str) -> None:
+        """Record the canonical YAML digest of a file digest; entries are tiny and evicted with the trees."""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            entry_path = self.cache_dir / f"{digest}.canonical"
+            entry_path.write_text(canonical)
+            self._grow(entry_path.stat().st_size)
+        except OSError:
+            return
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for entry_path in [*self.cache_dir.glob("*.json"), *self.cache_dir.glob("*.canonical")]:
+            try:
+                stat = entry_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        return entries
+
+    def _grow(self, size: int) -> None:
+        """Account for a written entry and prune only once the running total passes max_bytes."""
+        if self._size is None:
+            # The first write of a run counts what is already on disk, including this entry
+            self._size = sum(entry_size for _, entry_size, _ in self._scan())
+        else:
+            # Overwritten entries are counted twice; the next prune rescans and corrects that
+            self._size += size
+        if self._size > self.max_bytes:
+            self.prune()
+
+    def prune(self) -> None:
+        """Evict least recently used entries until the cache fits within max_bytes.
+
+        Eviction goes down to 90% of the limit so that the following writes do not
+        trigger another directory scan straight away.
+        """
+        try:
+            entries = self._scan()
+        except OSError:
+            return
+        total_size = sum(size for _, size, _ in entries)
+        
+        entries.sort()
+        for _, size, entry_path in entries:
+            if total_size <= self.max_bytes * 0.9:
+                break
+            try:
+                entry_path.unlink()
+            except OSError:
+                continue
+            total_size -= size
+        self._size = total_size
+
+@dataclass
+class ChangeDelta:
+    """Changes that appeared or disappeared since the previous run."""
+    new: List[ParameterChange] = field(default_factory=list)
+    resolved: List[ParameterChange] = field(default_factory=list)
+    previous_run: Optional[str] = None
+    files_rediffed: List[str] = field(default_factory=list)
+    files_skipped: int = 0
+
+class RunSnapshot:
+    """Compact record of one run: the input hashes and change set of every file.
+
+    A later --since-last run reuses the changes of files whose inputs hash the same, and
+    reports only the changes that appeared or disappeared in between.
+    """
+
+    FORMAT_VERSION = 4
+    DEFAULT_FILE_NAME = ".crd_last_run.json"
+
+    def __init__(self, signature: Dict[str, Any], created: Optional[str] = None,
+                 files: Optional[Dict[str, Dict[str, Any]]] = None):
+        # Snapshots are only comparable between runs with the same versions, pairs and options
+        self.signature = signature
+        self.created = created
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path: Path, signature: Dict[str, Any]) -> Optional["RunSnapshot"]:
+        """Load the snapshot at path, or None if it is missing, unreadable or from a different setup."""
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("format") != cls.FORMAT_VERSION or entry.get("signature") != signature:
+            return None
+        return cls(signature, entry.get("created"), entry.get("files"))
+
+    def save(self, path: Path) -> None:
+        """Write the snapshot atomically."""
+        entry = {"format": self.FORMAT_VERSION, "signature": self.signature,
+                 "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "files": self.files}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def changes_for(self, filename: str, inputs: Dict[str, str]) -> Optional[List[ParameterChange]]:
+        """The recorded changes of a file, if its inputs are unchanged since the snapshot."""
+        record = self.files.get(filename)
+        if record is None or record["inputs"] != inputs:
+            return None
+        return [self.decode_change(filename, item) for item in record["changes"]]
+
+    def record(self, filename: str, inputs: Dict[str, str], changes: List[ParameterChange]) -> None:
+        self.files[filename] = {"inputs": inputs, "changes": [self.encode_change(c) for c in changes]}
+
+    @staticmethod
+    def encode_change(change: ParameterChange) -> list:
+        return [change.change_type, change.version_from, change.version_to, change.full_path,
+                change.line_number, change.column_number, change.parameter_name, change.parameters]
+
+    @staticmethod
+    def decode_change(filename: str, item: list) -> ParameterChange:
+        change_type, version_from, version_to, full_path, line_number, column_number, parameter_name, parameters = item
+        return ParameterChange(path=filename, line_number=line_number, column_number=column_number,
+                               change_type=change_type, version_from=version_from, version_to=version_to,
+                               parameter_name=parameter_name, full_path=full_path, parameters=parameters)
+
+class PhaseProfiler:
+    """Records wall time, CPU time and tracemalloc peak memory of each phase of each file.
+
+    Phases must not nest: tracemalloc's peak is reset at the start of every phase.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def start(self) -> None:
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self) -> None:
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, filename: str = ""):
+        """Time the enclosed block as one phase of a file."""
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory and tracemalloc.is_tracing() else 0
+            self.events.append({
+                "phase": name,
+                "file": filename,
+                "start": wall_start - self.origin,
+                "wall": time.perf_counter() - wall_start,
+                "cpu": time.process_time() - cpu_start,
+                "peak_bytes": peak,
+            })
+
+    def _totals(self, key: str) -> List[Tuple[str, Dict[str, float]]]:
+        """Aggregate events by phase or file, ranked by wall time."""
+        totals = defaultdict(lambda: {"calls": 0, "wall": 0.0, "cpu": 0.0, "peak_bytes": 0})
+        for event in self.events:
+            total = totals[event[key]]
+            total["calls"] += 1
+            total["wall"] += event["wall"]
+            total["cpu"] += event["cpu"]
+            total["peak_bytes"] = max(total["peak_bytes"], event["peak_bytes"])
+        return sorted(totals.items(), key=lambda item: item[1]["wall"], reverse=True)
+
+    def summary_lines(self, top_files: int = 10) -> Iterator[str]:
+        """Yield a ranked summary of time and memory by phase and of the slowest files."""
+        total_wall = sum(event["wall"] for event in self.events) or 1.0
+        
+        yield f"\n⏱️  Profile by phase (total {total_wall:.3f}s)"
+        yield f"{'Phase':<12} {'Calls':>6} {'Wall (s)':>10} {'CPU (s)':>10} {'Share':>7} {'Peak MB':>8}"
+        yield f"{'-'*12} {'-'*6} {'-'*10} {'-'*10} {'-'*7} {'-'*8}"
+        for phase, total in self._totals("phase"):
+            yield (f"{phase:<12} {total['calls']:>6} {total['wall']:>10.3f} {total['cpu']:>10.3f} "
+                   f"{total['wall'] / total_wall * 100:>6.1f}% {total['peak_bytes'] / (1024 * 1024):>8.1f}")
+        
+        files = [(name, total) for name, total in self._totals("file") if name]
+        yield f"\n🐢 Slowest files (top {min(top_files, len(files))} of {len(files)})"
+        yield f"{'File Name':<50} {'Wall (s)':>10} {'CPU (s)':>10} {'Peak MB':>8}  Slowest phase"
+        yield f"{'-'*50} {'-'*10} {'-'*10} {'-'*8}  {'-'*13}"
+        for name, total in files[:top_files]:
+            phase_walls = defaultdict(float)
+            for event in self.events:
+                if event["file"] == name:
+                    phase_walls[event["phase"]] += event["wall"]
+            slowest = max(phase_walls, key=phase_walls.get)
+            yield (f"{name:<50} {total['wall']:>10.3f} {total['cpu']:>10.3f} "
+                   f"{total['peak_bytes'] / (1024 * 1024):>8.1f}  {slowest} ({phase_walls[slowest]:.3f}s)")
+    
+    def write_chrome_trace(self, output_file: str) -> None:
+        """Write the recorded phases as Chrome trace events (chrome://tracing, Perfetto)."""
+        trace_events = [{
+            "name": event["phase"],
+            "cat": event["file"] or "report",
+            "ph": "X",
+            "ts": round(event["start"] * 1e6, 3),
+            "dur": round(event["wall"] * 1e6, 3),
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": {"file": event["file"], "cpu_ms": round(event["cpu"] * 1e3, 3),
+                     "peak_kb": event["peak_bytes"] // 1024},
+        } for event in self.events]
+        with open(output_file, 'w') as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+# Comparator copy used by pool workers, sent once per worker rather than once per file
+_worker_comparator = None
+
+def _init_worker(comparator: "CRDComparator") -> None:
+    global _worker_comparator
+    _worker_comparator = comparator
+    # Errors are sent back with each result and reported by the parent
+    _worker_comparator.on_error = None
+
+def _compare_in_worker(filename: str) -> Tuple[List[ParameterChange], List[str]]:
+    first_error = len(_worker_comparator.errors)
+    changes = _worker_comparator.compare_versions(filename)
+    return changes, _worker_comparator.errors[first_error:]
 
 class CRDComparator:
-    def __init__(self, base_dir: str = ".", show_additions: bool = False):
+    def __init__(self, base_dir: str = ".", show_additions: bool = False,
+                 use_cache: bool = True, cache_dir: Optional[str] = None, jobs: Optional[int] = None,
+                 pairs: Optional[List[str]] = None, sources: Optional[Dict[str, ManifestSource]] = None,
+                 list_keys: Optional[Dict[str, Tuple[str, ...]]] = None, rename_threshold: float = 0.6,
+                 kinds: Optional[Set[str]] = None, path_filter: Optional[PathFilter] = None,
+                 collapse_subtrees: bool = True):
         self.base_dir = Path(base_dir)
-        self.versions = ["1.3", "1.4", "1.5"]
+        self.list_keys = {**DEFAULT_LIST_KEYS, **(list_keys or {})}
+        self.sources = self._order_sources(sources) if sources else self._discover_sources()
+        self.versions = list(self.sources)
+        self.version_pairs = parse_pairs(pairs, self.versions) if pairs else default_pairs(self.versions)
+        # Only versions spanned by a requested pair need to be loaded
+        pair_indexes = [self.versions.index(v) for pair in self.version_pairs for v in pair]
+        self.active_versions = self.versions[min(pair_indexes):max(pair_indexes) + 1]
         self.show_additions = show_additions
+        # Minimum estimated parameter-set similarity for a removed and an added file to count as a rename
+        self.rename_threshold = rename_threshold
+        self.jobs = jobs if jobs else (os.cpu_count() or 1)
+        # Only files whose first document is one of these kinds are compared (None compares every file)
+        self.kinds = set(kinds) if kinds else None
+        # Include/exclude patterns applied while building parameter trees (None keeps every parameter)
+        self.path_filter = path_filter
+        # Report a wholly added or removed subtree as its root with a parameter count
+        self.collapse_subtrees = collapse_subtrees
+        self.cache = None
+        if use_cache:
+            # Tries depend on the list key configuration and path filters, so they are part of every cache key
+            # (unfiltered runs keep the list-key-only variant, so existing caches stay valid)
+            settings = self.tree_settings() if path_filter is not None else self.list_keys
+            variant = hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:12]
+            self.cache = ParseCache(Path(cache_dir) if cache_dir else self.base_dir / ParseCache.DEFAULT_DIR_NAME,
+                                    variant=variant)
         self.common_files = self._find_common_files()
+        self._result = None
+        # Set to a PhaseProfiler to time each phase of each file
+        self.profiler = None
+        # When set (watch mode), parsed trees stay in memory until their file changes
+        self.keep_trees = False
+        self._trees = {}
+        # Canonical YAML digests by byte digest, see _canonical_digest()
+        self._canonical = {}
+        # Messages for files that could not be parsed; on_error (e.g. print) is also called with each one
+        self.errors = []
+        self.on_error = None
+        # How many of self.errors have already been streamed as NDJSON 'error' records
+        self._errors_streamed = 0
+        
+    def _discover_sources(self) -> Dict[str, ManifestSource]:
+        """Find version subdirectories, OCI layouts and archives (e.g. 1.3, 1.4.2.tar.gz) ordered by semantic version."""
+        if not self.base_dir.is_dir():
+            raise ValueError(f"Directory not found: {self.base_dir}")
+        
+        sources = {}
+        # Directories sort first, so an unpacked version wins over an archive of the same version
+        for entry in sorted(self.base_dir.iterdir(), key=lambda p: (not p.is_dir(), p.name)):
+            label = source_label(entry)
+            if not parse_version(label) or label in sources:
+                continue
+            if entry.is_dir() or entry.name.endswith(ARCHIVE_SUFFIXES):
+                sources[label] = open_source(entry)
+        return self._order_sources(sources)
+    
+    def _order_sources(self, sources: Dict[str, ManifestSource]) -> Dict[str, ManifestSource]:
+        """Order version sources semantically when every label is a version, else keep the given order."""
+        if len(sources) < 2:
+            raise ValueError(f"Need at least 2 versions to compare, found: {', '.join(sources) or 'none'}")
         
+        versions = list(sources)
+        if all(parse_version(v) for v in versions):
+            versions.sort(key=parse_version)
+        return {version: sources[version] for version in versions}
+    
     def _find_common_files(self) -> List[str]:
-        """Find files that exist in all three version directories."""
-        version_files = {}
-        for version in self.versions:
-            version_dir = self.base_dir / version
-            if version_dir.exists():
-                version_files[version] = set(f.name for f in version_dir.iterdir() if f.is_file())
-        
-        if len(version_files) < 3:
-            raise ValueError("Not all version directories (1.3, 1.4, 1.5) found")
-        
-        # Find intersection of all sets
-        common = version_files[self.versions[0]]
-        for version in self.versions[1:]:
-            common = common.intersection(version_files[version])
-        
-        return sorted(list(common))
-    
-    def _load_yaml_with_line_numbers(self, file_path: Path) -> Tuple[Dict, Dict[str, int]]:
-        """Load YAML file and create a mapping of parameter paths to line numbers."""
-        with open(file_path, 'r') as f:
-            content = f.read()
-            lines = content.split('\n')
-        
-        # Parse YAML
-        try:
-            data = yaml.safe_load(content)
-        except yaml.YAMLError as e:
-            print(f"Error parsing YAML {file_path}: {e}")
-            return {}, {}
+        """Find files that exist in both versions of at least one requested pair."""
+        if self.kinds:
+            # The kind index comes from setup where available, otherwise only file headers are read
+            self.version_files = {}
+            for version in self.active_versions:
+                index = self.sources[version].kind_index()
+                self.version_files[version] = {name for name, header in index.items()
+                                               if header is not None and header.kind in self.kinds}
+        else:
+            self.version_files = {version: set(self.sources[version].list_files()) for version in self.active_versions}
         
-        # Create line number mapping
-        line_map = {}
-        current_path = []
+        # A file added in a later release is still diffed in the pairs that have it on both sides;
+        # compare_versions() skips the pairs where it is missing
+        common = set()
+        for old_version, new_version in self.version_pairs:
+            common |= self.version_files[old_version] & self.version_files[new_version]
         
-        for i, line in enumerate(lines, 1):
-            line_stripped = line.strip()
-            if not line_stripped or line_stripped.startswith('#'):
-                continue
-                
-            # Calculate indentation level
-            indent_level = (len(line) - len(line.lstrip())) // 2
-            
-            # Adjust current path based on indentation
-            if indent_level < len(current_path):
-                current_path = current_path[:indent_level]
-            
-            # Extract key from line
-            if ':' in line_stripped:
-                key = line_stripped.split(':')[0].strip().strip('"\'')
-                if key and not key.startswith('-'):
-                    # Add to current path
-                    if indent_level == len(current_path):
-                        current_path.append(key)
-                    elif indent_level < len(current_path):
-                        current_path = current_path[:indent_level] + [key]
-                    else:
-                        current_path.append(key)
-                    
-                    # Store line number for this path
-                    path_str = '.'.join(current_path)
-                    line_map[path_str] = i
+        return sorted(common)
+    
+    def _iter_documents(self, content: str, filename: str = "") -> Iterator[Tuple[Any, Dict[str, Tuple[int, int]]]]:
+        """Yield (value, line map) for each document of a YAML stream, composing one document at a time.
         
-        return data, line_map
+        Only the current document is held in memory, so large concatenated manifests are
+        never built into a single tree. Raises yaml.YAMLError.
+        """
+        loader = YAMLLoader(content)
+        try:
+            while True:
+                with self._phase("parse", filename):
+                    if not loader.check_node():
+                        break
+                    node = loader.get_node()
+                    line_map = {}
+                    data = self._construct_with_marks(loader, node, "", line_map)
+                    # Anchors and constructed objects never span documents
+                    loader.constructed_objects = {}
+                yield data, line_map
+        finally:
+            loader.dispose()
+    
+    def _construct_with_marks(self, loader, node: yaml.Node, path: str, line_map: Dict[str, Tuple[int, int]]) -> Any:
+        """Build the value for a composed node, recording the start mark of every key and list item."""
+        if isinstance(node, yaml.MappingNode):
+            loader.flatten_mapping(node)
+            mapping = {}
+            for key_node, value_node in node.value:
+                key = loader.construct_object(key_node, deep=True)
+                current_path = f"{path}.{key}" if path else f"{key}"
+                mark = key_node.start_mark
+                line_map[current_path] = (mark.line + 1, mark.column + 1)
+                mapping[key] = self._construct_with_marks(loader, value_node, current_path, line_map)
+            return mapping
+        
+        if isinstance(node, yaml.SequenceNode):
+            items = []
+            for i, item_node in enumerate(node.value):
+                item_path = f"{path}[{i}]"
+                mark = item_node.start_mark
+                line_map[item_path] = (mark.line + 1, mark.column + 1)
+                items.append(self._construct_with_marks(loader, item_node, item_path, line_map))
+            return items
+        
+        return loader.construct_object(node, deep=True)
     
-    def _extract_parameters(self, data: Dict, prefix: str = "", line_map: Dict[str, int] = None) -> Dict[str, int]:
-        """Recursively extract all parameters and their line numbers from CRD data."""
-        params = {}
+    def _extract_parameters(self, data: Dict, prefix: str = "", line_map: Dict[str, Tuple[int, int]] = None,
+                            node: Optional[ParameterTrie] = None, state: Any = None) -> ParameterTrie:
+        """Recursively extract all parameters and their (line, column) positions into a sealed parameter tree.
+        
+        With a path filter, state is the filter's match state at this node, and keys the filter
+        rejects are skipped without visiting their subtrees.
+        """
+        if node is None:
+            node = ParameterTrie()
         if line_map is None:
             line_map = {}
+        if state is None and self.path_filter is not None:
+            state = self.path_filter.initial
             
         if not isinstance(data, dict):
-            return params
+            return node.seal()
             
         for key, value in data.items():
-            current_path = f"{prefix}.{key}" if prefix else key
+            child_state = None
+            if self.path_filter is not None:
+                child_state = self.path_filter.step_key(state, key)
+                if child_state is None:
+                    continue
+            current_path = f"{prefix}.{key}" if prefix else f"{key}"
             
-            # Store this parameter
-            if current_path in line_map:
-                params[current_path] = line_map[current_path]
-            else:
-                params[current_path] = 0  # Fallback if line number not found
+            # Store this parameter; a key only on the way to an include pattern is not one itself
+            # Fallback to (0, 0) if the position is not known
+            line, column = line_map.get(current_path, (0, 0))
+            param = ParameterTrie(child_state is None or self.path_filter.includes(child_state), line, column)
+            node.children[sys.intern(f"{key}")] = param
             
             # Recursively process nested dictionaries
             if isinstance(value, dict):
-                nested_params = self._extract_parameters(value, current_path, line_map)
-                params.update(nested_params)
-            elif isinstance(value, list):
-                for i, item in enumerate(value):
-                    if isinstance(item, dict):
-                        list_path = f"{current_path}[{i}]"
-                        nested_params = self._extract_parameters(item, list_path, line_map)
-                        params.update(nested_params)
+                self._extract_parameters(value, current_path, line_map, param, child_state)
+            else:
+                if isinstance(value, list):
+                    self._extract_list_items(key, value, current_path, line_map, param, child_state)
+                param.seal()
+            
+            # A key on the way to an include pattern is only kept if something below it matched
+            if child_state is not None and not param.children and not self.path_filter.includes(child_state):
+                del node.children[sys.intern(f"{key}")]
+        
+        return node.seal()
+    
+    def _extract_list_items(self, key: Any, items: List, current_path: str,
+                            line_map: Dict[str, Tuple[int, int]], param: ParameterTrie, state: Any = None) -> None:
+        """Add the dict items of a list under a parameter, keyed by identity where possible.
+        
+        Matching items by identity (e.g. a container's name) instead of by position means
+        inserting one element does not show up as changes to every element after it.
+        """
+        indexed_items = [(i, item) for i, item in enumerate(items) if isinstance(item, dict)]
+        key_fields = self.list_keys.get(f"{key}", self.list_keys.get("*", ()))
+        segments = list_item_segments([item for _, item in indexed_items], key_fields)
+        
+        for n, (i, item) in enumerate(indexed_items):
+            segment = segments[n] if segments else i
+            item_state = None
+            if self.path_filter is not None:
+                item_state = self.path_filter.step_item(state, segment)
+                if item_state is None:
+                    continue
+            # Positions in the line map are always indexed by [i]
+            list_path = f"{current_path}[{i}]"
+            item_node = ParameterTrie()
+            param.children[segment] = item_node
+            self._extract_parameters(item, list_path, line_map, item_node, item_state)
+            if item_state is not None and not item_node.children and not self.path_filter.includes(item_state):
+                del param.children[segment]
+    
+    def _report_error(self, message: str) -> None:
+        """Record a problem with an input file; the comparator itself never prints."""
+        self.errors.append(message)
+        if self.on_error is not None:
+            self.on_error(message)
+    
+    def _phase(self, name: str, filename: str = ""):
+        """Context manager timing a phase when profiling, and doing nothing otherwise."""
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.phase(name, filename)
+    
+    def _read_file(self, version: str, filename: str) -> Tuple[bytes, str]:
+        """Return the raw bytes of a file and their SHA-256."""
+        with self._phase("read", filename):
+            raw = self.sources[version].read_bytes(filename)
+            return raw, hashlib.sha256(raw).hexdigest()
+    
+    def _load_parameters(self, version: str, filename: str, raw: Optional[bytes] = None,
+                         digest: Optional[str] = None, parsed: Optional[Dict] = None) -> ParameterTrie:
+        """Return the parameter tree of a file, served from memory or the parse cache when possible."""
+        if self.keep_trees:
+            tree = self._trees.get((version, filename))
+            if tree is None:
+                tree = self._read_parameters(version, filename, raw, digest, parsed)
+                self._trees[(version, filename)] = tree
+            return tree
+        return self._read_parameters(version, filename, raw, digest, parsed)
+    
+    def _read_parameters(self, version: str, filename: str, raw: Optional[bytes] = None,
+                         digest: Optional[str] = None, parsed: Optional[Dict] = None) -> ParameterTrie:
+        """Read and parse a file's parameter tree, through the parse cache when enabled.
+        
+        parsed may hold the trees of versions already built while fingerprinting, or None for
+        a version that failed to parse.
+        """
+        if raw is None:
+            raw, digest = self._read_file(version, filename)
+        
+        if self.cache is not None:
+            with self._phase("cache", filename):
+                tree = self.cache.get(digest)
+            if tree is not None:
+                return tree
         
-        return params
+        if parsed is not None and version in parsed:
+            tree = parsed[version]
+        else:
+            tree, canonical = self._build_file_tree(version, filename, raw)
+            if tree is not None:
+                self._remember_canonical(digest, canonical)
+        if tree is None:
+            return ParameterTrie().seal()
+        
+        if self.cache is not None:
+            with self._phase("cache", filename):
+                self.cache.put(digest, tree)
+        return tree
+    
+    def _document_key(self, data: Any, index: int, taken: Dict) -> DocumentKey:
+        """Key a document by kind/name, falling back to its position in the stream."""
+        key = f"#{index}"
+        if isinstance(data, dict) and data.get("kind"):
+            metadata = data.get("metadata")
+            name = metadata.get("name") if isinstance(metadata, dict) else None
+            key = f"{data['kind']}/{name}" if name else f"{data['kind']}#{index}"
+        if key in taken:
+            key = f"{key}#{index}"
+        return DocumentKey(sys.intern(key))
+    
+    def _build_file_tree(self, version: str, filename: str, raw: bytes) -> Tuple[Optional[ParameterTrie], Optional[str]]:
+        """Stream a file's documents into one tree keyed by document, with its canonical digest.
+        
+        Each document is fingerprinted and flattened as soon as it is parsed, then dropped.
+        Returns (None, None) if the file is not valid YAML.
+        """
+        root = ParameterTrie()
+        document_digests = []
+        try:
+            for index, (data, line_map) in enumerate(self._iter_documents(raw.decode('utf-8'), filename)):
+                if data is None:
+                    # Empty document, e.g. a trailing ---
+                    continue
+                with self._phase("fingerprint", filename):
+                    document_digests.append(canonical_digest(data))
+                key = self._document_key(data, index, root.children)
+                with self._phase("flatten", filename):
+                    root.children[key] = self._extract_parameters(data, "", line_map)
+        except yaml.YAMLError as e:
+            # Parse failures are not cached so the error is reported on every run
+            self._report_error(f"Error parsing YAML {self.sources[version].describe(filename)}: {e}")
+            return None, None
+        
+        if None in document_digests:
+            canonical = None
+        elif len(document_digests) == 1:
+            canonical = document_digests[0]
+        else:
+            canonical = hashlib.sha256("".join(document_digests).encode()).hexdigest()
+        return root.seal(), canonical
+    
+    def _remember_canonical(self, digest: str, canonical: Optional[str]) -> None:
+        if canonical is None or self._canonical.get(digest) == canonical:
+            return
+        self._canonical[digest] = canonical
+        if self.cache is not None:
+            self.cache.put_canonical(digest, canonical)
+    
+    def _canonical_digest(self, version: str, filename: str, raw: bytes, digest: str, parsed: Dict) -> str:
+        """Hash of a file's YAML content independent of key order, whitespace and comments.
+        
+        Computed once per distinct file and remembered in memory and in the parse cache. A miss
+        costs a full parse and flatten, about as much as diffing the file, so the skip is only
+        cheap for cached digests. The tree built while computing it is kept in parsed, so the
+        file is not parsed again if it has to be diffed.
+        """
+        canonical = self._canonical.get(digest)
+        if canonical is None and self.cache is not None:
+            canonical = self.cache.get_canonical(digest)
+        if canonical is not None:
+            self._canonical[digest] = canonical
+            return canonical
+        
+        tree, canonical = self._build_file_tree(version, filename, raw)
+        parsed[version] = tree
+        if tree is None:
+            # Never equal to anything else, so a broken file is always diffed
+            return f"unparsable:{digest}"
+        if canonical is None:
+            # Mappings with mixed key types cannot be canonicalised; fall back to the byte hash
+            return f"bytes:{digest}"
+        self._remember_canonical(digest, canonical)
+        return canonical
     
     def compare_versions(self, filename: str) -> List[ParameterChange]:
-        """Compare a specific file across all versions and return changes."""
+        """Compare a specific file across all versions and return changes.
+        
+        Files are fingerprinted first: if every version has the same bytes the file is unchanged
+        and is not parsed; if they have the same canonical YAML content it is not diffed.
+        """
         changes = []
-        file_data = {}
-        file_params = {}
-        
-        # Load data for all versions
-        for version in self.versions:
-            file_path = self.base_dir / version / filename
-            if file_path.exists():
-                data, line_map = self._load_yaml_with_line_numbers(file_path)
-                file_data[version] = data
-                file_params[version] = self._extract_parameters(data, "", line_map)
-        
-        # Compare versions pairwise (1.3->1.4, 1.4->1.5, 1.3->1.5)
-        version_pairs = [("1.3", "1.4"), ("1.4", "1.5"), ("1.3", "1.5")]
-        
-        for old_version, new_version in version_pairs:
-            if old_version not in file_params or new_version not in file_params:
+        versions = [v for v in self.active_versions if filename in self.version_files[v]]
+        files = {version: self._read_file(version, filename) for version in versions}
+        if len({digest for _, digest in files.values()}) <= 1:
+            return changes
+        
+        parsed = {}
+        canonical = {version: self._canonical_digest(version, filename, raw, digest, parsed)
+                     for version, (raw, digest) in files.items()}
+        if len(set(canonical.values())) == 1:
+            return changes
+        
+        # Load data for every version spanned by the requested pairs; versions with
+        # identical bytes share one tree
+        file_trees = {}
+        trees_by_digest = {}
+        for version, (raw, digest) in files.items():
+            if digest not in trees_by_digest:
+                trees_by_digest[digest] = self._load_parameters(version, filename, raw, digest, parsed)
+            file_trees[version] = trees_by_digest[digest]
+        
+        # Single-document files are diffed by content, whatever their kind/name; documents
+        # of multi-document files are matched by kind/name and diffed independently
+        if all(len(tree.children) <= 1 for tree in file_trees.values()):
+            file_trees = {version: next(iter(tree.children.values()), ParameterTrie().seal())
+                          for version, tree in file_trees.items()}
+        
+        with self._phase("diff", filename):
+            self._diff_file(filename, file_trees, changes)
+        
+        return changes
+    
+    def _diff_file(self, filename: str, file_trees: Dict[str, ParameterTrie], changes: List[ParameterChange],
+                   pairs: Optional[List[Tuple[str, str]]] = None, path_filter: Optional[PathFilter] = None) -> None:
+        """Append the changes of every requested pair (or the given pairs) of one file's loaded trees.
+        
+        path_filter narrows the changes of already built trees, e.g. to answer a query about one path.
+        """
+        # Diff only consecutive versions; any other pair is derived by composing these deltas
+        present = [v for v in self.active_versions if v in file_trees]
+        deltas = [diff_trees(file_trees[old_version], file_trees[new_version])
+                  for old_version, new_version in zip(present, present[1:])]
+        
+        for old_version, new_version in pairs or self.version_pairs:
+            if old_version not in file_trees or new_version not in file_trees:
                 continue
-                
-            old_params = set(file_params[old_version].keys())
-            new_params = set(file_params[new_version].keys())
+            
+            old_index = present.index(old_version)
+            new_index = present.index(new_version)
+            if old_index < new_index:
+                added, removed = compose_deltas(deltas[old_index:new_index])
+            else:
+                # Downgrade pair: the forward delta with additions and removals swapped
+                removed, added = compose_deltas(deltas[new_index:old_index])
+            if path_filter is not None:
+                added, removed = path_filter.select(added), path_filter.select(removed)
             
             # Find added parameters (in new version but not in old)
-            added = new_params - old_params
-            for param in added:
+            for param, node, name, count in self._resolve_paths(added, file_trees[new_version], file_trees[old_version]):
                 changes.append(ParameterChange(
                     path=filename,
-                    line_number=file_params[new_version][param],
+                    line_number=node.line,
+                    column_number=node.column,
                     change_type="added",
                     version_from=old_version,
                     version_to=new_version,
-                    parameter_name=param.split('.')[-1],
-                    full_path=param
+                    parameter_name=name,
+                    full_path=param,
+                    parameters=count
                 ))
             
             # Find removed parameters (in old version but not in new)
-            removed = old_params - new_params
-            for param in removed:
+            for param, node, name, count in self._resolve_paths(removed, file_trees[old_version], file_trees[new_version]):
                 changes.append(ParameterChange(
                     path=filename,
-                    line_number=file_params[old_version][param],
+                    line_number=node.line,
+                    column_number=node.column,
                     change_type="removed",
                     version_from=old_version,
                     version_to=new_version,
-                    parameter_name=param.split('.')[-1],
-                    full_path=param
+                    parameter_name=name,
+                    full_path=param,
+                    parameters=count
                 ))
+    
+    def _resolve_paths(self, delta: ParameterTrie, tree: ParameterTrie,
+                       other: ParameterTrie) -> List[Tuple[str, ParameterTrie, str, int]]:
+        """Render the parameters of a delta trie as sorted dotted strings, with their node in the given
+        version's trie, their parameter name (the last dotted part of the final key) and how many
+        parameters the entry stands for.
         
+        Unless subtrees are expanded, a delta subtree whose root is missing from the other
+        version entirely is reported once, at its root, instead of once per parameter.
+        """
+        resolved = []
+        
+        def visit(delta_node: ParameterTrie, segments: PathSegments, other_node: Optional[ParameterTrie]) -> None:
+            for segment, child in delta_node.children.items():
+                child_segments = segments + (segment,)
+                other_child = other_node.children.get(segment) if other_node is not None else None
+                if other_child is None and self.collapse_subtrees:
+                    count = sum(1 for _ in child.iter_params())
+                    # A list item or document is not a parameter itself, so one with a single parameter is not
+                    # collapsed; nor is a key that a path filter kept only on the way to a selected path
+                    is_key = isinstance(segment, str) and not isinstance(segment, DocumentKey)
+                    if child.is_param or (not is_key and count > 1):
+                        resolved.append((child_segments, count))
+                        continue
+                if child.is_param:
+                    resolved.append((child_segments, 1))
+                visit(child, child_segments, other_child)
+        
+        visit(delta, (), other)
+        
+        entries = []
+        for segments, count in resolved:
+            node = tree.find(segments)
+            if not node.is_param:
+                # Point a collapsed list item or document at its first parameter
+                node = min((c for c in node.children.values() if c.is_param),
+                           key=lambda c: (c.line, c.column), default=node)
+            last = segments[-1]
+            path = format_path(segments)
+            if isinstance(last, DocumentKey):
+                # A whole document: 'Service/web', not 'Service/web:'
+                name = str(last)
+                path = path[:-1]
+            else:
+                name = str(last).split('.')[-1] if isinstance(last, str) else format_path((last,))
+            entries.append((path, node, name, count))
+        return sorted(entries, key=lambda item: item[0])
+    
+    def iter_file_changes(self, filenames: Optional[List[str]] = None) -> Iterator[Tuple[str, List[ParameterChange]]]:
+        """Yield (filename, changes) for each common file (or the given files) as soon as it has been diffed."""
+        filenames = self.common_files if filenames is None else filenames
+        # Resident trees (serve and watch modes) are already parsed and would only be pickled
+        # into every worker, so those runs diff in this process
+        jobs = 1 if self.keep_trees else min(self.jobs, len(filenames))
+        if jobs > 1:
+            # Each worker loads, flattens and diffs whole files; map() yields results
+            # in submission order so the merged result matches a serial run exactly
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(self,)) as executor:
+                for filename, (changes, errors) in zip(filenames, executor.map(_compare_in_worker, filenames)):
+                    for message in errors:
+                        self._report_error(message)
+                    yield filename, changes
+        else:
+            for filename in filenames:
+                yield filename, self.compare_versions(filename)
+    
+    def diff_pair(self, old_version: str, new_version: str, filenames: Optional[List[str]] = None,
+                  path_filter: Optional[PathFilter] = None) -> List[ParameterChange]:
+        """Diff two active versions directly, whether or not they are one of the requested pairs.
+        
+        Files present in both versions (or the given files) are compared; with keep_trees set
+        their trees stay in memory, so repeated queries only walk the tries.
+        """
+        for version in (old_version, new_version):
+            if version not in self.active_versions:
+                raise ValueError(f"Version {version} not loaded (available: {', '.join(self.active_versions)})")
+        
+        changes = []
+        common = self.version_files[old_version] & self.version_files[new_version]
+        for filename in sorted(common if filenames is None else common & set(filenames)):
+            file_trees = {version: self._load_parameters(version, filename) for version in (old_version, new_version)}
+            if all(len(tree.children) <= 1 for tree in file_trees.values()):
+                file_trees = {version: next(iter(tree.children.values()), ParameterTrie().seal())
+                              for version, tree in file_trees.items()}
+            self._diff_file(filename, file_trees, changes, [(old_version, new_version)], path_filter)
         return changes
     
-    def generate_markdown_report(self, output_file: str = None) -> str:
-        """Generate a comprehensive comparison report in markdown format."""
-        lines = []
-        lines.append("# OADP CRD Version Comparison Report")
-        lines.append("")
-        lines.append(f"**Comparing versions:** {', '.join(self.versions)}")
-        lines.append(f"**Common files found:** {len(self.common_files)}")
-        if not self.show_additions:
-            lines.append("**Note:** Hiding additions by default. Use --show-additions to see added parameters.")
-        lines.append("")
+    def poll_changes(self, snapshots: Dict[str, Dict[str, object]]) -> Set[Tuple[str, str]]:
+        """Return the (version, filename) entries whose stamps changed since snapshots, updating snapshots."""
+        changed = set()
+        for version, previous in snapshots.items():
+            current = self.sources[version].snapshot()
+            changed.update((version, name) for name in current.keys() | previous.keys()
+                           if current.get(name) != previous.get(name))
+            snapshots[version] = current
+        return changed
+    
+    def refresh(self, changed: Set[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Re-diff only the files touched by changed (version, filename) entries.
         
-        total_changes = 0
-        files_with_changes = 0
+        Updates the cached result in place and returns (filename, status) for every file whose
+        section changed, where status is 'changed', 'added' (now in both versions of a requested
+        pair) or 'removed' (no longer in both versions of any pair).
+        """
+        for key in changed:
+            self._trees.pop(key, None)
         
+        old_common = set(self.common_files)
+        self.common_files = self._find_common_files()
+        new_common = set(self.common_files)
+        result = self.result
+        
+        updates = []
+        for filename in sorted(old_common - new_common):
+            result.remove_file(filename)
+            updates.append((filename, "removed"))
+        
+        touched = {filename for _, filename in changed} | (new_common - old_common)
+        for filename in sorted(touched & new_common):
+            result.replace_file(filename, self.compare_versions(filename))
+            updates.append((filename, "changed" if filename in old_common else "added"))
+        
+        # Files present in only some versions may have appeared, gone or been edited
+        result.file_events = self.compare_file_sets()
+        return updates
+    
+    def tree_settings(self) -> Dict[str, Any]:
+        """Settings that change how a file is turned into a parameter tree."""
+        settings = {"list_keys": {key: list(fields) for key, fields in sorted(self.list_keys.items())}}
+        if self.path_filter is not None:
+            settings["include"] = self.path_filter.include_patterns
+            settings["exclude"] = self.path_filter.exclude_patterns
+        return settings
+    
+    def snapshot_signature(self) -> Dict[str, Any]:
+        """Settings that must match for a previous run's changes to be reusable."""
+        return {"versions": list(self.active_versions), "pairs": [list(pair) for pair in self.version_pairs],
+                "collapse_subtrees": self.collapse_subtrees,
+                "kinds": sorted(self.kinds) if self.kinds else None, **self.tree_settings()}
+    
+    def input_digests(self, filename: str) -> Dict[str, str]:
+        """SHA-256 of a file's bytes in every active version that has it."""
+        return {version: hashlib.sha256(self.sources[version].read_bytes(filename)).hexdigest()
+                for version in self.active_versions if filename in self.version_files[version]}
+    
+    def compare_since(self, snapshot_path: Path) -> ChangeDelta:
+        """Diff only files whose inputs changed since the snapshot, then report what appeared or disappeared.
+        
+        The full result is still available through self.result, and the snapshot is rewritten
+        for the next run.
+        """
+        signature = self.snapshot_signature()
+        previous = RunSnapshot.load(snapshot_path, signature)
+        current = RunSnapshot(signature)
+        delta = ChangeDelta(previous_run=previous.created if previous else None)
+        
+        inputs = {filename: self.input_digests(filename) for filename in self.common_files}
+        file_changes = {}
         for filename in self.common_files:
-            changes = self.compare_versions(filename)
+            reused = previous.changes_for(filename, inputs[filename]) if previous else None
+            if reused is not None:
+                file_changes[filename] = reused
+        
+        delta.files_skipped = len(file_changes)
+        delta.files_rediffed = [f for f in self.common_files if f not in file_changes]
+        file_changes.update(self.iter_file_changes(delta.files_rediffed))
+        
+        result = ComparisonResult(versions=list(self.active_versions), pairs=list(self.version_pairs))
+        for filename in self.common_files:
+            result.add_file(filename, file_changes[filename])
+            current.record(filename, inputs[filename], file_changes[filename])
+        result.file_events = self.compare_file_sets()
+        self._result = result
+        
+        def change_key(change: ParameterChange) -> Tuple[str, str, str, str, str]:
+            return (change.path, change.change_type, change.version_from, change.version_to, change.full_path)
+        
+        previous_changes = {}
+        if previous:
+            # Files that are no longer common resolve all their earlier changes
+            for filename in previous.files:
+                for item in previous.files[filename]["changes"]:
+                    change = RunSnapshot.decode_change(filename, item)
+                    previous_changes[change_key(change)] = change
+        current_changes = {change_key(change): change for f in result.files for change in f.changes}
+        
+        delta.new = [current_changes[key] for key in current_changes.keys() - previous_changes.keys()]
+        delta.resolved = [previous_changes[key] for key in previous_changes.keys() - current_changes.keys()]
+        for changes in (delta.new, delta.resolved):
+            changes.sort(key=lambda c: (c.path, c.version_from, c.version_to, c.change_type == "added", c.full_path))
+        
+        current.save(snapshot_path)
+        return delta
+    
+    def render_delta(self, delta: ChangeDelta, report_format: str = "console", colors: type = None) -> Iterator[str]:
+        """Yield a report of only the changes that appeared or disappeared since the previous run."""
+        c = colors or Colors
+        new = [change for change in delta.new if self.show_additions or change.change_type == "removed"]
+        resolved = [change for change in delta.resolved if self.show_additions or change.change_type == "removed"]
+        counts = {
+            "new_removals": sum(1 for change in new if change.change_type == "removed"),
+            "resolved_removals": sum(1 for change in resolved if change.change_type == "removed"),
+        }
+        if self.show_additions:
+            counts["new_additions"] = sum(1 for change in new if change.change_type == "added")
+            counts["resolved_additions"] = sum(1 for change in resolved if change.change_type == "added")
+        summary = {"previous_run": delta.previous_run, "files_rediffed": delta.files_rediffed,
+                   "files_skipped": delta.files_skipped, **counts}
+        
+        if report_format in ("json", "ndjson"):
+            records = ([{"record": "new", **asdict(change)} for change in new] +
+                       [{"record": "resolved", **asdict(change)} for change in resolved])
+            if report_format == "ndjson":
+                yield from self.ndjson_error_records()
+                for record in records:
+                    yield json.dumps(record, ensure_ascii=False)
+                yield json.dumps({"record": "summary", **summary}, ensure_ascii=False)
+            else:
+                yield json.dumps({"changes": records, "summary": summary}, indent=2, ensure_ascii=False)
+            return
+        
+        markdown = report_format == "markdown"
+        labels = {("new", "removed"): "NEW REMOVAL", ("new", "added"): "NEW ADDITION",
+                  ("resolved", "removed"): "RESOLVED REMOVAL", ("resolved", "added"): "RESOLVED ADDITION"}
+        icons = {("new", "removed"): "❌", ("new", "added"): "✅",
+                 ("resolved", "removed"): "♻️", ("resolved", "added"): "↩️"}
+        tones = {("new", "removed"): c.RED, ("new", "added"): c.GREEN,
+                 ("resolved", "removed"): c.GREEN, ("resolved", "added"): c.YELLOW}
+        
+        if markdown:
+            yield "# OADP CRD Changes Since Last Run"
+            yield ""
+        else:
+            yield f"{c.BOLD}{c.CYAN}OADP CRD Changes Since Last Run{c.END}"
+            yield f"{c.CYAN}{'='*60}{c.END}"
+        if delta.previous_run:
+            yield f"{'**Previous run:** ' if markdown else 'Previous run: '}{delta.previous_run}"
+        else:
+            yield f"{'**Note:** ' if markdown else c.YELLOW}No previous run snapshot found; every change is reported as new.{'' if markdown else c.END}"
+        yield (f"{'**Files re-diffed:** ' if markdown else 'Files re-diffed: '}{len(delta.files_rediffed)} of "
+               f"{len(self.common_files)} ({delta.files_skipped} unchanged, skipped)")
+        yield ""
+        
+        entries = [("new", change) for change in new] + [("resolved", change) for change in resolved]
+        by_file = defaultdict(list)
+        for kind, change in entries:
+            by_file[change.path].append((kind, change))
+        
+        for filename in sorted(by_file):
+            yield f"## 📄 File: `{filename}`" if markdown else f"{c.BOLD}{c.YELLOW}📄 File: {filename}{c.END}"
+            if markdown:
+                yield ""
+            else:
+                yield f"{c.YELLOW}{'-'*50}{c.END}"
             
-            # Filter changes based on show_additions flag
-            if not self.show_additions:
-                changes = [c for c in changes if c.change_type == "removed"]
+            by_pair = defaultdict(list)
+            for kind, change in by_file[filename]:
+                by_pair[f"{change.version_from}→{change.version_to}"].append((kind, change))
             
-            if changes:
-                files_with_changes += 1
-                total_changes += len(changes)
-                
-                lines.append(f"## 📄 File: `{filename}`")
-                lines.append("")
-                
-                # Group changes by type and version pair
-                grouped_changes = defaultdict(list)
-                for change in changes:
-                    key = f"{change.version_from}→{change.version_to}"
-                    grouped_changes[key].append(change)
+            for version_pair, pair_entries in by_pair.items():
+                pair_entries.sort(key=lambda e: (e[0] == "resolved", e[1].change_type == "added", e[1].full_path))
+                if markdown:
+                    yield f"### {version_pair}"
+                    yield ""
+                else:
+                    yield f"{c.BOLD}  {version_pair}:{c.END}"
                 
-                for version_pair, version_changes in grouped_changes.items():
-                    lines.append(f"### {version_pair}")
-                    lines.append("")
-                    
-                    # Sort by change type (removed first, then added)
-                    version_changes.sort(key=lambda x: (x.change_type == "added", x.full_path))
-                    
-                    for change in version_changes:
-                        if change.change_type == "removed":
-                            icon = "❌"
-                            action = "**REMOVED**"
-                        else:
-                            icon = "✅"
-                            action = "**ADDED**"
-                        
-                        lines.append(f"- {icon} {action}: `{change.full_path}`")
+                for kind, change in pair_entries:
+                    style = (kind, change.change_type)
+                    version = change.version_to if change.change_type == "added" else change.version_from
+                    if markdown:
+                        yield f"- {icons[style]} **{labels[style]}**: `{change.full_path}`"
                         if change.line_number > 0:
-                            lines.append(f"  - Line {change.line_number} in version {change.version_to if change.change_type == 'added' else change.version_from}")
-                    lines.append("")
-                
-                lines.append("")
-        
-        # Summary
-        lines.append("## 📊 Summary")
-        lines.append("")
-        lines.append(f"- **Files analyzed:** {len(self.common_files)}")
-        lines.append(f"- **Files with changes:** {files_with_changes}")
+                            yield f"  - Line {change.line_number} in version {version}"
+                    else:
+                        yield f"    {icons[style]} {tones[style]}{labels[style]}{c.END}: {change.full_path}"
+                        if change.line_number > 0:
+                            yield f"      {c.BLUE}Line {change.line_number}{c.END} in version {version}"
+                yield ""
+            
+            yield ""
         
-        # Calculate actual counts from all changes (not filtered)
-        all_changes = []
-        file_stats = {}
+        if markdown:
+            yield "## 📊 Summary"
+            yield ""
+            if not entries:
+                yield "- ✅ **Nothing changed since the last run.**"
+            for key, value in counts.items():
+                yield f"- **{key.replace('_', ' ').capitalize()}:** {value}"
+        else:
+            yield f"{c.BOLD}{c.MAGENTA}📊 Summary{c.END}"
+            yield f"{c.MAGENTA}{'='*60}{c.END}"
+            if not entries:
+                yield f"{c.GREEN}✅ Nothing changed since the last run.{c.END}"
+            for key, value in counts.items():
+                yield f"{key.replace('_', ' ').capitalize()}: {value}"
+    
+    def _file_parameters(self, version: str, filename: str) -> ParameterTrie:
+        """Parameter tree of a file in one version, unwrapped when it holds a single document."""
+        tree = self._load_parameters(version, filename)
+        if len(tree.children) <= 1:
+            return next(iter(tree.children.values()), ParameterTrie().seal())
+        return tree
+    
+    def compare_file_sets(self) -> List[FileEvent]:
+        """Find files added, removed or renamed in each reported transition.
         
-        for filename in self.common_files:
-            file_changes = self.compare_versions(filename)
-            all_changes.extend(file_changes)
+        Removed and added files of a transition are sketched (bottom-k MinHash of their
+        parameter paths), and pairs of the same kind that are at least rename_threshold similar
+        are reported as renames. Files under RENAME_MIN_PARAMETERS are only added or removed.
+        A file that is added or removed in several pairs is loaded and sketched once.
+        """
+        events = []
+        trees, file_kinds, sketches = {}, {}, {}
+        for old_version, new_version in self.version_pairs:
+            old_files = self.version_files[old_version]
+            new_files = self.version_files[new_version]
+            kinds = {}
+            for version, names in ((old_version, old_files - new_files), (new_version, new_files - old_files)):
+                for filename in names:
+                    key = (version, filename)
+                    if key not in trees:
+                        trees[key] = self._file_parameters(version, filename)
+                        header = read_manifest_header(self.sources[version].read_bytes(filename))
+                        file_kinds[key] = header.kind if header is not None else None
+                        paths = [format_path(segments) for segments, _ in trees[key].iter_params()]
+                        if len(paths) >= RENAME_MIN_PARAMETERS:
+                            sketches[key] = sketch_parameters(paths)
+                    kinds[filename] = file_kinds[key]
+            
+            renames = match_renames({f: sketches[(old_version, f)] for f in old_files - new_files
+                                     if (old_version, f) in sketches},
+                                    {f: sketches[(new_version, f)] for f in new_files - old_files
+                                     if (new_version, f) in sketches},
+                                    self.rename_threshold, kinds)
+            renamed_old = {old for old, _, _ in renames}
+            renamed_new = {new for _, new, _ in renames}
             
-            # Count additions and removals per file
-            file_added = sum(1 for c in file_changes if c.change_type == "added")
-            file_removed = sum(1 for c in file_changes if c.change_type == "removed")
-            file_stats[filename] = {
-                'added': file_added,
-                'removed': file_removed,
-                'total': file_added + file_removed
-            }
-        
-        added_count = sum(1 for c in all_changes if c.change_type == "added")
-        removed_count = sum(1 for c in all_changes if c.change_type == "removed")
+            for old_name, new_name, similarity in renames:
+                added, removed = diff_trees(trees[(old_version, old_name)], trees[(new_version, new_name)])
+                events.append(FileEvent("renamed", old_version, new_version, new_name, renamed_from=old_name,
+                                        similarity=round(similarity, 2),
+                                        parameters=sum(1 for _ in trees[(new_version, new_name)].iter_params()),
+                                        parameters_added=sum(1 for _ in added.iter_params()),
+                                        parameters_removed=sum(1 for _ in removed.iter_params())))
+            for filename in sorted(old_files - new_files - renamed_old):
+                events.append(FileEvent("removed", old_version, new_version, filename,
+                                        parameters=sum(1 for _ in trees[(old_version, filename)].iter_params())))
+            for filename in sorted(new_files - old_files - renamed_new):
+                events.append(FileEvent("added", old_version, new_version, filename,
+                                        parameters=sum(1 for _ in trees[(new_version, filename)].iter_params())))
+        
+        events.sort(key=lambda e: (self.version_pairs.index((e.version_from, e.version_to)),
+                                   ["removed", "renamed", "added"].index(e.event_type), e.filename))
+        return events
+    
+    def compare_all(self) -> "ComparisonResult":
+        """Diff every common file once and collect the counters used by all report sections."""
+        result = ComparisonResult(versions=list(self.active_versions), pairs=list(self.version_pairs))
+        for filename, changes in self.iter_file_changes():
+            result.add_file(filename, changes)
+        result.file_events = self.compare_file_sets()
+        return result
+
+    @property
+    def result(self) -> "ComparisonResult":
+        """Comparison result for this run, computed on first access and reused afterwards."""
+        if self._result is None:
+            self._result = self.compare_all()
+        return self._result
+
+    def render_markdown(self) -> Iterator[str]:
+        """Yield the lines of the comparison report in markdown format."""
+        result = self.result
+        yield "# OADP CRD Version Comparison Report"
+        yield ""
+        yield f"**Comparing versions:** {', '.join(result.versions)}"
+        yield f"**Common files found:** {len(result.files)}"
+        if not self.show_additions:
+            yield "**Note:** Hiding additions by default. Use --show-additions to see added parameters."
+        yield ""
+        
+        for file_result in result.files:
+            yield from self.render_markdown_file(file_result)
+        
+        yield from self.render_markdown_file_events(result)
+        
+        total_changes = result.shown_count(self.show_additions)
+        added_count = result.added_count
+        removed_count = result.removed_count
+        
+        # Summary
+        yield "## 📊 Summary"
+        yield ""
+        yield f"- **Files analyzed:** {len(result.files)}"
+        yield f"- **Files with changes:** {result.files_with_changes(self.show_additions)}"
         
         if self.show_additions:
-            lines.append(f"- **Total parameter changes:** {total_changes}")
+            yield f"- **Total parameter changes:** {total_changes}"
             if total_changes == 0:
-                lines.append("- ✅ **No parameter differences found across versions!**")
+                yield "- ✅ **No parameter differences found across versions!**"
             else:
-                lines.append(f"- ✅ **Parameters added:** {added_count}")
-                lines.append(f"- ❌ **Parameters removed:** {removed_count}")
+                yield f"- ✅ **Parameters added:** {added_count}"
+                yield f"- ❌ **Parameters removed:** {removed_count}"
         else:
-            lines.append(f"- **Parameters removed (shown):** {total_changes}")
-            lines.append(f"- ❌ **Parameters removed:** {removed_count}")
+            yield f"- **Parameters removed (shown):** {total_changes}"
+            yield f"- ❌ **Parameters removed:** {removed_count}"
             if added_count > 0:
-                lines.append(f"- 💡 **Parameters added (hidden):** {added_count} - use --show-additions to view")
+                yield f"- 💡 **Parameters added (hidden):** {added_count} - use --show-additions to view"
         
-        lines.append("")
+        file_events = result.file_event_counts()
+        if any(file_events.values()):
+            yield (f"- 📁 **Files removed:** {file_events['removed']}, **renamed:** {file_events['renamed']}, "
+                   f"**added:** {file_events['added']}")
         
-        # Detailed file breakdown
-        lines.append("## 📄 File Analysis Breakdown")
-        lines.append("")
-        lines.append("| File Name | Added | Removed | Total |")
-        lines.append("|-----------|--------|---------|-------|")
+        yield ""
         
-        # Sort files by total changes (descending), then by name
-        sorted_files = sorted(file_stats.items(), key=lambda x: (-x[1]['total'], x[0]))
+        # Detailed file breakdown
+        yield "## 📄 File Analysis Breakdown"
+        yield ""
+        yield "| File Name | Added | Removed | Total |"
+        yield "|-----------|--------|---------|-------|"
         
-        for filename, stats in sorted_files:
-            lines.append(f"| `{filename}` | {stats['added']} | {stats['removed']} | {stats['total']} |")
+        for file_result in result.files_by_total():
+            yield f"| `{file_result.filename}` | {file_result.added} | {file_result.removed} | {file_result.total} |"
         
-        lines.append(f"| **TOTAL** | **{added_count}** | **{removed_count}** | **{added_count + removed_count}** |")
+        yield f"| **TOTAL** | **{added_count}** | **{removed_count}** | **{added_count + removed_count}** |"
         
         # Additional insights
-        lines.append("")
-        files_with_only_additions = sum(1 for stats in file_stats.values() if stats['added'] > 0 and stats['removed'] == 0)
-        files_with_only_removals = sum(1 for stats in file_stats.values() if stats['removed'] > 0 and stats['added'] == 0)
-        files_with_both = sum(1 for stats in file_stats.values() if stats['added'] > 0 and stats['removed'] > 0)
-        files_unchanged = sum(1 for stats in file_stats.values() if stats['total'] == 0)
+        yield ""
+        distribution = result.change_distribution()
         
-        lines.append("## 📈 Change Distribution")
-        lines.append("")
-        lines.append(f"- **Files with only additions:** {files_with_only_additions}")
-        lines.append(f"- **Files with only removals:** {files_with_only_removals}")
-        lines.append(f"- **Files with both changes:** {files_with_both}")
-        lines.append(f"- **Files unchanged:** {files_unchanged}")
+        yield "## 📈 Change Distribution"
+        yield ""
+        yield f"- **Files with only additions:** {distribution['only_additions']}"
+        yield f"- **Files with only removals:** {distribution['only_removals']}"
+        yield f"- **Files with both changes:** {distribution['both']}"
+        yield f"- **Files unchanged:** {distribution['unchanged']}"
+
+    def render_markdown_file(self, file_result: FileComparison) -> Iterator[str]:
+        """Yield the markdown section of one file, or nothing if it has no listed changes."""
+        changes = file_result.visible_changes(self.show_additions)
+        if not changes:
+            return
         
-        markdown_content = "\n".join(lines)
+        yield f"## 📄 File: `{file_result.filename}`"
+        yield ""
         
-        # Save to file if specified
-        if output_file:
-            with open(output_file, 'w') as f:
-                f.write(markdown_content)
-            print(f"Markdown report saved to: {output_file}")
+        for version_pair, version_changes in file_result.group_by_pair(changes).items():
+            yield f"### {version_pair}"
+            yield ""
+            
+            for change in version_changes:
+                if change.change_type == "removed":
+                    icon = "❌"
+                    action = "**REMOVED**"
+                else:
+                    icon = "✅"
+                    action = "**ADDED**"
+                
+                yield f"- {icon} {action}: `{change.full_path}`{change.subtree_note()}"
+                if change.line_number > 0:
+                    yield f"  - Line {change.line_number} in version {change.version_to if change.change_type == 'added' else change.version_from}"
+            yield ""
         
-        return markdown_content
+        yield ""
 
-    def generate_report(self) -> None:
-        """Generate a comprehensive comparison report."""
-        print(f"{Colors.BOLD}{Colors.CYAN}OADP CRD Version Comparison Report{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"Comparing versions: {', '.join(self.versions)}")
-        print(f"Common files found: {len(self.common_files)}")
-        if not self.show_additions:
-            print(f"{Colors.YELLOW}Note: Hiding additions by default. Use --show-additions to see added parameters.{Colors.END}")
-        print()
+    def _file_event_text(self, event: FileEvent) -> str:
+        """Plain description of a file event, shared by the console and markdown sections."""
+        if event.event_type == "renamed":
+            return (f"{event.renamed_from} → {event.filename} ({event.similarity:.0%} similar, "
+                    f"{event.parameters_added} parameters added, {event.parameters_removed} removed)")
+        return f"{event.filename} ({event.parameters} parameters)"
+    
+    def render_markdown_file_events(self, result: "ComparisonResult") -> Iterator[str]:
+        """Yield the markdown section listing files added, removed or renamed between versions."""
+        events = result.visible_file_events(self.show_additions)
+        hidden = len(result.file_events) - len(events)
+        if not events and not hidden:
+            return
         
-        total_changes = 0
-        files_with_changes = 0
+        yield "## 📁 File Changes"
+        yield ""
+        by_pair = defaultdict(list)
+        for event in events:
+            by_pair[f"{event.version_from}→{event.version_to}"].append(event)
+        for version_pair, pair_events in by_pair.items():
+            yield f"### {version_pair}"
+            yield ""
+            for event in pair_events:
+                label = {"added": "✅ **ADDED FILE**", "removed": "❌ **REMOVED FILE**",
+                         "renamed": "🔀 **RENAMED FILE**"}[event.event_type]
+                yield f"- {label}: {self._file_event_text(event)}"
+            yield ""
+        if hidden:
+            yield f"💡 **Files added (hidden):** {hidden} - use --show-additions to view"
+            yield ""
+    
+    def render_console_file_events(self, result: "ComparisonResult", colors: type = None) -> Iterator[str]:
+        """Yield the console section listing files added, removed or renamed between versions."""
+        c = colors or Colors
+        events = result.visible_file_events(self.show_additions)
+        hidden = len(result.file_events) - len(events)
+        if not events and not hidden:
+            return
         
-        for filename in self.common_files:
-            changes = self.compare_versions(filename)
-            
-            # Filter changes based on show_additions flag
-            if not self.show_additions:
-                changes = [c for c in changes if c.change_type == "removed"]
-            
-            if changes:
-                files_with_changes += 1
-                total_changes += len(changes)
-                
-                print(f"{Colors.BOLD}{Colors.YELLOW}📄 File: {filename}{Colors.END}")
-                print(f"{Colors.YELLOW}{'-'*50}{Colors.END}")
-                
-                # Group changes by type and version pair
-                grouped_changes = defaultdict(list)
-                for change in changes:
-                    key = f"{change.version_from}→{change.version_to}"
-                    grouped_changes[key].append(change)
-                
-                for version_pair, version_changes in grouped_changes.items():
-                    print(f"{Colors.BOLD}  {version_pair}:{Colors.END}")
-                    
-                    # Sort by change type (removed first, then added)
-                    version_changes.sort(key=lambda x: (x.change_type == "added", x.full_path))
-                    
-                    for change in version_changes:
-                        if change.change_type == "removed":
-                            icon = f"{Colors.RED}❌{Colors.END}"
-                            color = Colors.RED
-                            action = "REMOVED"
-                        else:
-                            icon = f"{Colors.GREEN}✅{Colors.END}"
-                            color = Colors.GREEN
-                            action = "ADDED"
-                        
-                        print(f"    {icon} {color}{action}{Colors.END}: {change.full_path}")
-                        if change.line_number > 0:
-                            print(f"      {Colors.BLUE}Line {change.line_number}{Colors.END} in version {change.version_to if change.change_type == 'added' else change.version_from}")
-                    print()
-                
-                print()
+        yield f"{c.BOLD}{c.YELLOW}📁 File Changes{c.END}"
+        yield f"{c.YELLOW}{'-'*50}{c.END}"
+        by_pair = defaultdict(list)
+        for event in events:
+            by_pair[f"{event.version_from}→{event.version_to}"].append(event)
+        for version_pair, pair_events in by_pair.items():
+            yield f"{c.BOLD}  {version_pair}:{c.END}"
+            for event in pair_events:
+                label = {"added": f"{c.GREEN}✅ ADDED FILE{c.END}", "removed": f"{c.RED}❌ REMOVED FILE{c.END}",
+                         "renamed": f"{c.YELLOW}🔀 RENAMED FILE{c.END}"}[event.event_type]
+                yield f"    {label}: {self._file_event_text(event)}"
+            yield ""
+        if hidden:
+            yield f"{c.YELLOW}💡 Files added (hidden): {hidden} - use --show-additions to view{c.END}"
+            yield ""
+    
+    def render_console(self, colors: type = None) -> Iterator[str]:
+        """Yield the lines of the comparison report as console text, coloured with the given palette."""
+        c = colors or Colors
+        result = self.result
+        yield f"{c.BOLD}{c.CYAN}OADP CRD Version Comparison Report{c.END}"
+        yield f"{c.CYAN}{'='*60}{c.END}"
+        yield f"Comparing versions: {', '.join(result.versions)}"
+        yield f"Common files found: {len(result.files)}"
+        if not self.show_additions:
+            yield f"{c.YELLOW}Note: Hiding additions by default. Use --show-additions to see added parameters.{c.END}"
+        yield ""
         
-        # Summary
-        print(f"{Colors.BOLD}{Colors.MAGENTA}📊 Summary{Colors.END}")
-        print(f"{Colors.MAGENTA}{'='*60}{Colors.END}")
-        print(f"Files analyzed: {len(self.common_files)}")
-        print(f"Files with changes: {files_with_changes}")
+        for file_result in result.files:
+            yield from self.render_console_file(file_result, c)
         
-        # Calculate actual counts from all changes (not filtered)
-        all_changes = []
-        file_stats = {}
+        yield from self.render_console_file_events(result, c)
         
-        for filename in self.common_files:
-            file_changes = self.compare_versions(filename)
-            all_changes.extend(file_changes)
-            
-            # Count additions and removals per file
-            file_added = sum(1 for c in file_changes if c.change_type == "added")
-            file_removed = sum(1 for c in file_changes if c.change_type == "removed")
-            file_stats[filename] = {
-                'added': file_added,
-                'removed': file_removed,
-                'total': file_added + file_removed
-            }
-        
-        added_count = sum(1 for c in all_changes if c.change_type == "added")
-        removed_count = sum(1 for c in all_changes if c.change_type == "removed")
+        total_changes = result.shown_count(self.show_additions)
+        added_count = result.added_count
+        removed_count = result.removed_count
+        
+        # Summary
+        yield f"{c.BOLD}{c.MAGENTA}📊 Summary{c.END}"
+        yield f"{c.MAGENTA}{'='*60}{c.END}"
+        yield f"Files analyzed: {len(result.files)}"
+        yield f"Files with changes: {result.files_with_changes(self.show_additions)}"
         
         if self.show_additions:
-            print(f"Total parameter changes: {total_changes}")
+            yield f"Total parameter changes: {total_changes}"
             if total_changes == 0:
-                print(f"{Colors.GREEN}✅ No parameter differences found across versions!{Colors.END}")
+                yield f"{c.GREEN}✅ No parameter differences found across versions!{c.END}"
             else:
-                print(f"{Colors.GREEN}✅ Parameters added: {added_count}{Colors.END}")
-                print(f"{Colors.RED}❌ Parameters removed: {removed_count}{Colors.END}")
+                yield f"{c.GREEN}✅ Parameters added: {added_count}{c.END}"
+                yield f"{c.RED}❌ Parameters removed: {removed_count}{c.END}"
         else:
-            print(f"Parameters removed (shown): {total_changes}")
-            print(f"{Colors.RED}❌ Parameters removed: {removed_count}{Colors.END}")
+            yield f"Parameters removed (shown): {total_changes}"
+            yield f"{c.RED}❌ Parameters removed: {removed_count}{c.END}"
             if added_count > 0:
-                print(f"{Colors.YELLOW}💡 Parameters added (hidden): {added_count} - use --show-additions to view{Colors.END}")
+                yield f"{c.YELLOW}💡 Parameters added (hidden): {added_count} - use --show-additions to view{c.END}"
         
-        print()
+        file_events = result.file_event_counts()
+        if any(file_events.values()):
+            yield (f"📁 Files removed: {file_events['removed']}, renamed: {file_events['renamed']}, "
+                   f"added: {file_events['added']}")
         
-        # Detailed file breakdown
-        print(f"{Colors.BOLD}{Colors.CYAN}📄 File Analysis Breakdown{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{'File Name':<50} {'Added':<8} {'Removed':<8} {'Total':<8}")
-        print(f"{'-'*50} {'-'*8} {'-'*8} {'-'*8}")
+        yield ""
         
-        # Sort files by total changes (descending), then by name
-        sorted_files = sorted(file_stats.items(), key=lambda x: (-x[1]['total'], x[0]))
+        # Detailed file breakdown
+        yield f"{c.BOLD}{c.CYAN}📄 File Analysis Breakdown{c.END}"
+        yield f"{c.CYAN}{'='*60}{c.END}"
+        yield f"{'File Name':<50} {'Added':<8} {'Removed':<8} {'Total':<8}"
+        yield f"{'-'*50} {'-'*8} {'-'*8} {'-'*8}"
         
-        for filename, stats in sorted_files:
+        for file_result in result.files_by_total():
+            filename = file_result.filename
             # Truncate filename if too long
             display_name = filename if len(filename) <= 50 else filename[:47] + "..."
             
-            added_color = Colors.GREEN if stats['added'] > 0 else Colors.WHITE
-            removed_color = Colors.RED if stats['removed'] > 0 else Colors.WHITE
-            total_color = Colors.YELLOW if stats['total'] > 0 else Colors.WHITE
+            added_color = c.GREEN if file_result.added > 0 else c.WHITE
+            removed_color = c.RED if file_result.removed > 0 else c.WHITE
+            total_color = c.YELLOW if file_result.total > 0 else c.WHITE
             
-            print(f"{display_name:<50} "
-                  f"{added_color}{stats['added']:<8}{Colors.END} "
-                  f"{removed_color}{stats['removed']:<8}{Colors.END} "
-                  f"{total_color}{stats['total']:<8}{Colors.END}")
+            yield (f"{display_name:<50} "
+                   f"{added_color}{file_result.added:<8}{c.END} "
+                   f"{removed_color}{file_result.removed:<8}{c.END} "
+                   f"{total_color}{file_result.total:<8}{c.END}")
         
-        print(f"{'-'*50} {'-'*8} {'-'*8} {'-'*8}")
-        print(f"{'TOTAL':<50} "
-              f"{Colors.GREEN}{added_count:<8}{Colors.END} "
-              f"{Colors.RED}{removed_count:<8}{Colors.END} "
-              f"{Colors.YELLOW}{added_count + removed_count:<8}{Colors.END}")
+        yield f"{'-'*50} {'-'*8} {'-'*8} {'-'*8}"
+        yield (f"{'TOTAL':<50} "
+               f"{c.GREEN}{added_count:<8}{c.END} "
+               f"{c.RED}{removed_count:<8}{c.END} "
+               f"{c.YELLOW}{added_count + removed_count:<8}{c.END}")
         
         # Additional insights
-        print()
-        files_with_only_additions = sum(1 for stats in file_stats.values() if stats['added'] > 0 and stats['removed'] == 0)
-        files_with_only_removals = sum(1 for stats in file_stats.values() if stats['removed'] > 0 and stats['added'] == 0)
-        files_with_both = sum(1 for stats in file_stats.values() if stats['added'] > 0 and stats['removed'] > 0)
-        files_unchanged = sum(1 for stats in file_stats.values() if stats['total'] == 0)
+        yield ""
+        distribution = result.change_distribution()
+        
+        yield f"{c.BOLD}📈 Change Distribution:{c.END}"
+        yield f"  Files with only additions: {c.GREEN}{distribution['only_additions']}{c.END}"
+        yield f"  Files with only removals: {c.RED}{distribution['only_removals']}{c.END}"
+        yield f"  Files with both changes: {c.YELLOW}{distribution['both']}{c.END}"
+        yield f"  Files unchanged: {c.WHITE}{distribution['unchanged']}{c.END}"
+
+    def render_console_file(self, file_result: FileComparison, colors: type = None) -> Iterator[str]:
+        """Yield the console section of one file, or nothing if it has no listed changes."""
+        c = colors or Colors
+        changes = file_result.visible_changes(self.show_additions)
+        if not changes:
+            return
+        
+        yield f"{c.BOLD}{c.YELLOW}📄 File: {file_result.filename}{c.END}"
+        yield f"{c.YELLOW}{'-'*50}{c.END}"
         
-        print(f"{Colors.BOLD}📈 Change Distribution:{Colors.END}")
-        print(f"  Files with only additions: {Colors.GREEN}{files_with_only_additions}{Colors.END}")
-        print(f"  Files with only removals: {Colors.RED}{files_with_only_removals}{Colors.END}")
-        print(f"  Files with both changes: {Colors.YELLOW}{files_with_both}{Colors.END}")
-        print(f"  Files unchanged: {Colors.WHITE}{files_unchanged}{Colors.END}")
+        for version_pair, version_changes in file_result.group_by_pair(changes).items():
+            yield f"{c.BOLD}  {version_pair}:{c.END}"
+            
+            for change in version_changes:
+                if change.change_type == "removed":
+                    icon = f"{c.RED}❌{c.END}"
+                    color = c.RED
+                    action = "REMOVED"
+                else:
+                    icon = f"{c.GREEN}✅{c.END}"
+                    color = c.GREEN
+                    action = "ADDED"
+                
+                yield f"    {icon} {color}{action}{c.END}: {change.full_path}{change.subtree_note()}"
+                if change.line_number > 0:
+                    yield f"      {c.BLUE}Line {change.line_number}{c.END} in version {change.version_to if change.change_type == 'added' else change.version_from}"
+            yield ""
+        
+        yield ""
+
+    def ndjson_error_records(self) -> List[str]:
+        """NDJSON 'error' records for the input problems reported since the previous call."""
+        records = [json.dumps({"record": "error", "message": message}, ensure_ascii=False)
+                   for message in self.errors[self._errors_streamed:]]
+        self._errors_streamed = len(self.errors)
+        return records
+    
+    def ndjson_file_chunk(self, file_result: FileComparison) -> List[str]:
+        """NDJSON 'change' records for the listed changes of one file, followed by its 'file' record."""
+        chunk = [json.dumps({"record": "change", **asdict(change)}, ensure_ascii=False)
+                 for change in file_result.visible_changes(self.show_additions)]
+        chunk.append(json.dumps({"record": "file", **file_result.counts()}))
+        return chunk
+
+    def iter_ndjson_chunks(self) -> Iterator[List[str]]:
+        """Yield NDJSON records in per-file chunks, each as soon as that file has been diffed.
+        
+        Every file contributes one 'change' record per listed change followed by a 'file'
+        record with its counters; a final 'summary' record closes the stream. Files that could
+        not be parsed are reported as 'error' records ahead of the chunk they affected.
+        """
+        if self._result is not None:
+            result = self._result
+            file_results = iter(result.files)
+        else:
+            result = ComparisonResult(versions=list(self.active_versions), pairs=list(self.version_pairs))
+            file_results = (result.add_file(filename, changes) for filename, changes in self.iter_file_changes())
+        
+        for file_result in file_results:
+            yield self.ndjson_error_records() + self.ndjson_file_chunk(file_result)
+        
+        if self._result is None:
+            result.file_events = self.compare_file_sets()
+        self._result = result
+        yield self.ndjson_error_records() + [json.dumps({"record": "file_event", **asdict(event)}, ensure_ascii=False)
+                                             for event in result.visible_file_events(self.show_additions)]
+        yield [json.dumps({"record": "summary", **result.summary(self.show_additions)}, ensure_ascii=False)]
+    
+    def render_ndjson(self) -> Iterator[str]:
+        """Yield the change feed as newline-delimited JSON records."""
+        for chunk in self.iter_ndjson_chunks():
+            yield from chunk
+    
+    def render_json(self) -> Iterator[str]:
+        """Yield a single JSON document with every listed change, the per-file counters and the summary."""
+        result = self.result
+        yield "{"
+        yield f'  "changes": ['
+        first = True
+        for file_result in result.files:
+            for change in file_result.visible_changes(self.show_additions):
+                prefix = "    " if first else "   ,"
+                first = False
+                yield prefix + json.dumps(asdict(change), ensure_ascii=False)
+        yield "  ],"
+        yield '  "files": ' + json.dumps([f.counts() for f in result.files]) + ","
+        yield '  "file_events": ' + json.dumps([asdict(e) for e in result.visible_file_events(self.show_additions)],
+                                              ensure_ascii=False) + ","
+        yield '  "summary": ' + json.dumps(result.summary(self.show_additions), ensure_ascii=False)
+        yield "}"
+    
+    def write_report(self, sink: TextIO, report_format: str = "console", color: Optional[bool] = None) -> None:
+        """Stream the report to any writable text sink, line by line.
+        
+        Colour defaults to on only when the sink is a terminal. NDJSON output is flushed after
+        every file so consumers can process records before the run finishes.
+        """
+        if report_format == "ndjson":
+            for chunk in self.iter_ndjson_chunks():
+                sink.writelines(f"{line}\n" for line in chunk)
+                sink.flush()
+            return
+        
+        if report_format == "markdown":
+            lines = self.render_markdown()
+        elif report_format == "json":
+            lines = self.render_json()
+        else:
+            if color is None:
+                color = hasattr(sink, "isatty") and sink.isatty()
+            lines = self.render_console(Colors if color else NoColors)
+        
+        sink.writelines(f"{line}\n" for line in lines)
+    
+    def render_update(self, updates: List[Tuple[str, str]], changed: Set[Tuple[str, str]],
+                      elapsed: float, report_format: str = "console", colors: type = None) -> Iterator[str]:
+        """Yield the report sections of the files re-diffed in watch mode, followed by fresh totals."""
+        c = colors or Colors
+        result = self.result
+        file_results = {f.filename: f for f in result.files}
+        
+        if report_format == "ndjson":
+            yield from self.ndjson_error_records()
+            for filename, status in updates:
+                if status == "removed":
+                    yield json.dumps({"record": "file_removed", "filename": filename})
+                else:
+                    yield from self.ndjson_file_chunk(file_results[filename])
+            yield json.dumps({"record": "summary", **result.summary(self.show_additions)}, ensure_ascii=False)
+            return
+        
+        stamp = time.strftime("%H:%M:%S")
+        for filename, status in updates:
+            versions = ", ".join(v for v in self.active_versions if (v, filename) in changed)
+            if status == "removed":
+                note = "no longer present in every version"
+            elif status == "added":
+                note = "now present in every version"
+            else:
+                note = f"changed in {versions}"
+            
+            if report_format == "markdown":
+                yield f"## 🔄 {stamp} `{filename}` {note} ({elapsed * 1000:.0f} ms)"
+                yield ""
+            else:
+                yield f"{c.BOLD}{c.CYAN}🔄 [{stamp}] {filename} {note} ({elapsed * 1000:.0f} ms){c.END}"
+            if status == "removed":
+                yield ""
+                continue
+            
+            file_result = file_results[filename]
+            if report_format == "markdown":
+                section = list(self.render_markdown_file(file_result))
+            else:
+                section = list(self.render_console_file(file_result, c))
+            if section:
+                yield from section
+            else:
+                yield f"✅ No {'parameter changes' if self.show_additions else 'removals'} listed for this file"
+                yield ""
+        
+        totals = (f"Totals: {result.removed_count} removed, {result.added_count} added, "
+                  f"{result.files_with_changes(self.show_additions)} of {len(result.files)} files with listed changes")
+        yield f"**{totals}**" if report_format == "markdown" else f"{c.MAGENTA}{totals}{c.END}"
+        yield ""
+    
+    def watch(self, sink: TextIO, report_format: str = "console", color: Optional[bool] = None,
+              interval: float = 1.0) -> None:
+        """Print the full report, then poll the version sources and re-report each changed file until interrupted.
+        
+        Parsed trees are kept in memory, so a change costs one re-parse and one file diff.
+        """
+        self.keep_trees = True
+        self.write_report(sink, report_format, color)
+        sink.flush()
+        
+        if color is None:
+            color = hasattr(sink, "isatty") and sink.isatty()
+        colors = Colors if color else NoColors
+        snapshots = {version: self.sources[version].snapshot() for version in self.active_versions}
+        print(f"👀 Watching {len(snapshots)} versions for changes every {interval:g}s (Ctrl+C to stop)",
+              file=sys.stderr)
+        
+        while True:
+            time.sleep(interval)
+            changed = self.poll_changes(snapshots)
+            if not changed:
+                continue
+            
+            start = time.perf_counter()
+            updates = self.refresh(changed)
+            elapsed = time.perf_counter() - start
+            if updates:
+                sink.writelines(f"{line}\n" for line in self.render_update(updates, changed, elapsed,
+                                                                             report_format, colors))
+                sink.flush()
+    
+    def generate_markdown_report(self, output_file: str = None) -> str:
+        """Generate a comprehensive comparison report in markdown format."""
+        markdown_content = "\n".join(self.render_markdown())
+        
+        # Save to file if specified
+        if output_file:
+            with open(output_file, 'w') as f:
+                f.write(markdown_content)
+            print(f"Markdown report saved to: {output_file}")
+        
+        return markdown_content
+    
+    def generate_report(self, sink: Optional[TextIO] = None, color: Optional[bool] = None) -> None:
+        """Generate a comprehensive comparison report on the console (or another sink)."""
+        self.write_report(sink or sys.stdout, color=color)
+
+class Comparison:
+    """Changes found by compare(), produced lazily one file at a time.
+    
+    Iterating yields every ParameterChange as soon as its file has been diffed. The summary,
+    file events and errors are complete once iteration has finished; reading them earlier
+    finishes the comparison first.
+    """
+    
+    def __init__(self, comparator: CRDComparator):
+        self.comparator = comparator
+        self.result = ComparisonResult(versions=list(comparator.active_versions), pairs=list(comparator.version_pairs))
+        self._files = comparator.iter_file_changes()
+        self._done = False
+    
+    def __iter__(self) -> Iterator[ParameterChange]:
+        if self._done:
+            for file_result in self.result.files:
+                yield from file_result.changes
+            return
+        for filename, changes in self._files:
+            self.result.add_file(filename, changes)
+            yield from changes
+        if not self._done:
+            self.result.file_events = self.comparator.compare_file_sets()
+            self.comparator._result = self.result
+            self._done = True
+    
+    def _finish(self) -> ComparisonResult:
+        for _ in self:
+            pass
+        return self.result
+    
+    @property
+    def versions(self) -> List[str]:
+        return list(self.comparator.active_versions)
+    
+    @property
+    def pairs(self) -> List[Tuple[str, str]]:
+        return list(self.comparator.version_pairs)
+    
+    @property
+    def summary(self) -> Dict[str, Any]:
+        """Run counters, as in the JSON report's summary (additions included)."""
+        return self._finish().summary(show_additions=True)
+    
+    @property
+    def files(self) -> List[FileComparison]:
+        return self._finish().files
+    
+    @property
+    def file_events(self) -> List[FileEvent]:
+        return self._finish().file_events
+    
+    @property
+    def errors(self) -> List[str]:
+        """Files that could not be parsed; they are compared as if empty."""
+        self._finish()
+        return list(self.comparator.errors)
+
+def compare(sources: Union[str, Path, Dict[str, Union[str, Path, ManifestSource]]],
+            pairs: Optional[List[Union[str, Tuple[str, str]]]] = None,
+            filters: Optional[Union[PathFilter, Dict[str, List[str]]]] = None, *,
+            kinds: Optional[Iterable[str]] = None, list_keys: Optional[Dict[str, Tuple[str, ...]]] = None,
+            collapse_subtrees: bool = True, rename_threshold: float = 0.6,
+            cache_dir: Optional[Union[str, Path]] = None, jobs: int = 1) -> Comparison:
+    """Compare OADP manifest versions in-process, without printing or writing anything.
+    
+    sources is a directory of version subdirectories/archives, or {version: source}, where a
+    source is a ManifestSource or the path of a version directory, tarball, zip or OCI layout.
+    pairs takes 'OLD:NEW', 'consecutive' or 'all' selectors, or (old, new) tuples; by default
+    every consecutive transition plus first -> last. filters is a PathFilter or
+    {"include": [...], "exclude": [...]}. Nothing is cached unless cache_dir is given.
+    
+        result = compare("/var/tmp/OADP", pairs=["1.4:1.5"], filters={"include": ["spec.install"]})
+        removed = [c.full_path for c in result if c.change_type == "removed"]
+        print(result.summary["removed"])
+    """
+    if isinstance(sources, (str, Path)):
+        base_dir, version_sources = Path(sources), None
+    else:
+        base_dir = Path(".")
+        version_sources = {version: source if isinstance(source, ManifestSource) else open_source(Path(source))
+                           for version, source in sources.items()}
+    if isinstance(filters, dict):
+        filters = PathFilter(filters.get("include", ()), filters.get("exclude", ()))
+    pair_specs = [pair if isinstance(pair, str) else f"{pair[0]}:{pair[1]}" for pair in pairs] if pairs else None
+    
+    comparator = CRDComparator(base_dir, show_additions=True, use_cache=cache_dir is not None,
+                               cache_dir=str(cache_dir) if cache_dir is not None else None, jobs=jobs,
+                               pairs=pair_specs, sources=version_sources, list_keys=list_keys,
+                               rename_threshold=rename_threshold, kinds=set(kinds) if kinds else None,
+                               path_filter=filters, collapse_subtrees=collapse_subtrees)
+    return Comparison(comparator)
 
 def main():
     """Main function to run the CRD comparison tool."""
     parser = argparse.ArgumentParser(
-        description="Compare OADP CRD files across versions 1.3, 1.4, and 1.5",
+        description="Compare OADP CRD files across all version directories (e.g. 1.3, 1.4, 1.5)",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
@@ -481,13 +2308,20 @@ Examples:
   python3 oadp_crd_comparison.py --markdown              # Output in markdown format to console
   python3 oadp_crd_comparison.py --markdown --output-file report.md  # Save markdown to file
   python3 oadp_crd_comparison.py --output-file report.txt            # Save console output to file
+  python3 oadp_crd_comparison.py --format ndjson --show-additions    # Stream machine-readable change records
+  python3 oadp_crd_comparison.py --pairs 1.3:1.5 1.4:1.5             # Report only the selected transitions
+  python3 oadp_crd_comparison.py --repo ~/oadp-operator --ref 1.4=oadp-1.4 --ref 1.5=oadp-1.5  # Compare git refs directly
+  python3 oadp_crd_comparison.py --no-cache                          # Re-parse every file, ignoring the parse cache
+  python3 oadp_crd_comparison.py --profile --trace-events trace.json # Time each phase of each file
+  python3 oadp_crd_comparison.py --watch /var/tmp/OADP               # Re-report files as they are edited
+  python3 oadp_crd_comparison.py --since-last /var/tmp/OADP          # Only what changed since the previous run
         """
     )
     
     parser.add_argument(
         "directory", 
         nargs="?", 
-        help="Directory containing version subdirectories (1.3, 1.4, 1.5). If not provided, will prompt user."
+        help="Directory containing version subdirectories (e.g. 1.3, 1.4, 1.5). If not provided, will prompt user."
     )
     
     parser.add_argument(
@@ -514,10 +2348,261 @@ Examples:
         help="Save output to specified file. If not specified with --markdown, prints markdown to console."
     )
     
+    parser.add_argument(
+        "--format",
+        choices=["console", "markdown", "json", "ndjson"],
+        default="console",
+        help="Output format. 'ndjson' streams one change record per line as each file is diffed, "
+             "followed by a summary record. --markdown is shorthand for --format markdown."
+    )
+    
+    parser.add_argument(
+        "--color",
+        choices=["auto", "always", "never"],
+        default="auto",
+        help="Colour console output: 'auto' (default) colours only when writing to a terminal."
+    )
+    
+    parser.add_argument(
+        "--repo",
+        type=str,
+        metavar="PATH",
+        help="Read manifests straight from the git objects of this oadp-operator repository instead of version directories (requires --ref)."
+    )
+    
+    parser.add_argument(
+        "--ref",
+        action="append",
+        metavar="VERSION=REF",
+        help="Version label and git branch, tag or commit to compare, e.g. --ref 1.3=oadp-1.3. Repeat for each version."
+    )
+    
+    parser.add_argument(
+        "--source",
+        action="append",
+        metavar="VERSION=PATH",
+        help="Version label and a version directory, tarball, zip or OCI image layout (PATH or PATH:TAG) "
+             "to compare, e.g. --source 1.4=bundles/oadp-1.4.tar.gz. Repeat for each version."
+    )
+    
+    parser.add_argument(
+        "--manifests-path",
+        type=str,
+        help="Path of the manifests directory inside each --ref (default: bundle/manifests), archive or "
+             "image (default: the shallowest 'manifests' directory)."
+    )
+    
+    parser.add_argument(
+        "--list-key",
+        action="append",
+        metavar="LIST=FIELD[,FIELD...]",
+        help="Fields that identify the items of lists held under key LIST, e.g. --list-key ports=name,port. "
+             "Use '*' for the default (name) and an empty value (LIST=) for positional [i] matching."
+    )
+    
+    parser.add_argument(
+        "--expand-subtrees",
+        action="store_true",
+        help="List every parameter of a wholly added or removed subtree, instead of only its root "
+             "with a parameter count."
+    )
+    
+    parser.add_argument(
+        "--include",
+        action="append",
+        metavar="PATTERN",
+        help="Only compare parameters under paths matching this glob, e.g. 'spec.versions[*].schema.openAPIV3Schema' "
+             "or 'spec.install'. '*' matches within a key, '[*]' any list item, '**' any number of segments. Repeatable."
+    )
+    
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        metavar="PATTERN",
+        help="Skip parameters under paths matching this glob, e.g. 'metadata.annotations' or '**.description'. Repeatable."
+    )
+    
+    parser.add_argument(
+        "--ignore-file",
+        type=str,
+        metavar="FILE",
+        help=f"File of exclude patterns, one per line (default: {PathFilter.IGNORE_FILE_NAME} in the current "
+             "directory and in the compared directory, when present)."
+    )
+    
+    parser.add_argument(
+        "--kind",
+        action="append",
+        metavar="KIND",
+        help="Only compare manifests of this kind, e.g. --kind CustomResourceDefinition. Repeat for "
+             "several kinds. Kinds come from the index written by setup, or from each file's header."
+    )
+    
+    parser.add_argument(
+        "--rename-threshold",
+        type=float,
+        default=0.6,
+        metavar="SIMILARITY",
+        help="Minimum estimated parameter-set similarity (0-1) for a removed and an added file to be "
+             "reported as a rename (default: 0.6). Use a value above 1 to disable rename detection."
+    )
+    
+    parser.add_argument(
+        "--pairs",
+        nargs="+",
+        metavar="PAIR",
+        help="Version transitions to report, as OLD:NEW (e.g. 1.3:1.6), 'consecutive' or 'all'. "
+             "Default: every consecutive pair plus first:last."
+    )
+    
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        metavar="N",
+        help="Number of worker processes used to compare files in parallel (default: CPU count). Use 1 to run serially."
+    )
+    
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Disable the on-disk parse cache and re-parse every YAML file."
+    )
+    
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help=f"Directory for the parse cache (default: <directory>/{ParseCache.DEFAULT_DIR_NAME})."
+    )
+    
+    parser.add_argument(
+        "--since-last",
+        action="store_true",
+        help="Report only changes that appeared or were resolved since the previous --since-last run. "
+             "Files whose inputs are unchanged are not re-parsed or re-diffed."
+    )
+    
+    parser.add_argument(
+        "--snapshot-file",
+        type=str,
+        metavar="FILE",
+        help=f"Where --since-last keeps the previous run (default: <directory>/{RunSnapshot.DEFAULT_FILE_NAME})."
+    )
+    
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="After the report, keep watching the version directories (or git refs) and print an updated "
+             "section for each file that changes. Parsed files stay in memory, so only changed files are re-parsed."
+    )
+    
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="How often --watch and --serve poll for changes (default: 1.0)."
+    )
+    
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Load every version once and answer diff, path lookup and per-file summary queries over "
+             "HTTP/JSON (see crd_query_server.py), reloading files as they change."
+    )
+    
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address --serve listens on (default: 127.0.0.1)."
+    )
+    
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="Port --serve listens on (default: 8765)."
+    )
+    
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time every phase (read, cache, parse, flatten, diff, render) of every file, with CPU time "
+             "and tracemalloc peak memory, and print a ranked summary to stderr. Runs serially."
+    )
+    
+    parser.add_argument(
+        "--profile-dump",
+        type=str,
+        metavar="FILE",
+        help="With --profile, also write a cProfile dump (open with pstats or snakeviz)."
+    )
+    
+    parser.add_argument(
+        "--trace-events",
+        type=str,
+        metavar="FILE",
+        help="With --profile, also write the phases as Chrome trace-event JSON (chrome://tracing or Perfetto)."
+    )
+    
     args = parser.parse_args()
+    if (args.profile_dump or args.trace_events) and not args.profile:
+        parser.error("--profile-dump and --trace-events require --profile")
+    if args.since_last and args.watch:
+        parser.error("--since-last and --watch cannot be combined")
+    if args.serve and (args.watch or args.since_last or args.output_file or args.profile):
+        parser.error("--serve cannot be combined with --watch, --since-last, --output-file or --profile")
+    if args.watch and (args.output_file or args.profile or args.format == "json"):
+        parser.error("--watch streams updates to stdout; it cannot be combined with --output-file, --profile "
+                     "or --format json (use --format ndjson)")
+    
+    list_keys = {}
+    for spec in args.list_key or []:
+        list_name, sep, fields = spec.partition('=')
+        if not sep or not list_name:
+            parser.error(f"Invalid --list-key '{spec}' (expected LIST=FIELD[,FIELD...])")
+        list_keys[list_name] = tuple(f for f in fields.split(',') if f)
+    
+    sources = None
+    cache_dir = args.cache_dir
+    if args.source and (args.repo or args.ref):
+        parser.error("--source cannot be combined with --repo/--ref")
+    if args.repo or args.ref:
+        if not (args.repo and args.ref):
+            parser.error("--repo and --ref must be used together")
+        
+        sources = {}
+        for spec in args.ref:
+            version, sep, ref = spec.partition('=')
+            if not sep or not version or not ref:
+                parser.error(f"Invalid --ref '{spec}' (expected VERSION=REF, e.g. 1.3=oadp-1.3)")
+            sources[version] = GitRefSource(Path(args.repo).expanduser(), ref, args.manifests_path or "bundle/manifests")
+        
+        # Keep the parse cache inside the repository's .git directory rather than the work tree
+        git_dir = Path(args.repo).expanduser() / ".git"
+        if cache_dir is None and git_dir.is_dir():
+            cache_dir = str(git_dir / "oadp_crd_cache")
+        if args.snapshot_file is None and git_dir.is_dir():
+            args.snapshot_file = str(git_dir / "oadp_crd_last_run.json")
+    
+    elif args.source:
+        sources = {}
+        for spec in args.source:
+            version, sep, path = spec.partition('=')
+            if not sep or not version or not path:
+                parser.error(f"Invalid --source '{spec}' (expected VERSION=PATH, e.g. 1.4=oadp-1.4.tar.gz)")
+            try:
+                sources[version] = open_source(Path(path), args.manifests_path)
+            except ValueError as e:
+                parser.error(str(e))
     
     # Determine the directory to use
-    if args.directory:
+    if args.repo:
+        directory = args.repo
+    elif args.source and not args.directory:
+        # The parse cache and --since-last snapshot live next to the first source
+        directory = str(Path(args.source[0].partition('=')[2]).expanduser().resolve().parent)
+    elif args.directory:
         directory = args.directory
     elif args.non_interactive:
         directory = "/var/tmp/OADP"
@@ -539,36 +2624,105 @@ Examples:
         
         print()
     
+    exclude = list(args.exclude or [])
+    if args.ignore_file:
+        ignore_files = [Path(args.ignore_file).expanduser()]
+    else:
+        ignore_files = [path for path in dict.fromkeys([Path.cwd() / PathFilter.IGNORE_FILE_NAME,
+                                                        (Path(directory).expanduser() / PathFilter.IGNORE_FILE_NAME).resolve()])
+                        if path.is_file()]
+    for ignore_file in ignore_files:
+        try:
+            exclude.extend(PathFilter.read_ignore_file(ignore_file))
+        except OSError as e:
+            parser.error(f"Cannot read ignore file: {e}")
+    path_filter = PathFilter(args.include or [], exclude) if (args.include or exclude) else None
+    
     try:
-        comparator = CRDComparator(directory, args.show_additions)
+        comparator = CRDComparator(directory, args.show_additions,
+                                   use_cache=not args.no_cache, cache_dir=cache_dir,
+                                   jobs=1 if args.profile else args.jobs, pairs=args.pairs, sources=sources,
+                                   list_keys=list_keys, rename_threshold=args.rename_threshold,
+                                   kinds=args.kind, path_filter=path_filter,
+                                   collapse_subtrees=not args.expand_subtrees)
+        report_format = "markdown" if args.markdown else args.format
+        # Input problems never go to stdout, where they would corrupt JSON and NDJSON reports;
+        # NDJSON streams carry them as 'error' records instead
+        if report_format != "ndjson" or args.serve:
+            comparator.on_error = lambda message: print(message, file=sys.stderr)
         
-        if args.markdown:
-            # Generate markdown report
-            if args.output_file:
-                # Save to file
-                comparator.generate_markdown_report(args.output_file)
-            else:
-                # Print to console
-                markdown_content = comparator.generate_markdown_report()
-                print(markdown_content)
+        cprofile = None
+        if args.profile:
+            comparator.profiler = PhaseProfiler()
+            comparator.profiler.start()
+            if args.profile_dump:
+                import cProfile
+                cprofile = cProfile.Profile()
+                cprofile.enable()
+            if not args.since_last:
+                # Diff everything up front so rendering is timed on its own
+                comparator.result
+        
+        color = {"auto": None, "always": True, "never": False}[args.color]
+        report_kind = {"console": "Console", "markdown": "Markdown", "json": "JSON", "ndjson": "NDJSON"}[report_format]
+        
+        if args.serve:
+            from crd_query_server import serve
+            try:
+                serve(comparator, args.host, args.port, interval=args.watch_interval)
+            except KeyboardInterrupt:
+                print(f"\n{Colors.YELLOW}Stopped serving.{Colors.END}", file=sys.stderr)
+            return
+        
+        if args.watch:
+            try:
+                comparator.watch(sys.stdout, report_format=report_format, color=color, interval=args.watch_interval)
+            except KeyboardInterrupt:
+                print(f"\n{Colors.YELLOW}Stopped watching.{Colors.END}", file=sys.stderr)
+            return
+        
+        if args.since_last:
+            snapshot_path = Path(args.snapshot_file or Path(directory) / RunSnapshot.DEFAULT_FILE_NAME).expanduser()
+            # Only files whose inputs changed are re-diffed, so nothing is diffed up front here
+            delta = comparator.compare_since(snapshot_path)
+            sink = open(args.output_file, 'w') if args.output_file else sys.stdout
+            use_color = (hasattr(sink, "isatty") and sink.isatty()) if color is None else color
+            try:
+                with comparator._phase("render"):
+                    sink.writelines(f"{line}\n" for line in comparator.render_delta(
+                        delta, report_format, Colors if use_color else NoColors))
+            finally:
+                if sink is not sys.stdout:
+                    sink.close()
+                    print(f"{report_kind} report saved to: {args.output_file}")
         else:
-            # Generate regular colored console report
-            if args.output_file:
-                # Redirect console output to file (includes ANSI codes)
-                with open(args.output_file, 'w') as f:
-                    import io
-                    import contextlib
-                    
-                    old_stdout = sys.stdout
-                    sys.stdout = f
-                    try:
-                        comparator.generate_report()
-                    finally:
-                        sys.stdout = old_stdout
-                print(f"Console report saved to: {args.output_file}")
-            else:
-                comparator.generate_report()
+            with comparator._phase("render"):
+                if args.output_file:
+                    # Stream the report straight into the file
+                    with open(args.output_file, 'w') as f:
+                        comparator.write_report(f, report_format=report_format, color=color)
+                    print(f"{report_kind} report saved to: {args.output_file}")
+                else:
+                    comparator.write_report(sys.stdout, report_format=report_format, color=color)
+        
+        if args.profile:
+            if cprofile is not None:
+                cprofile.disable()
+                cprofile.dump_stats(args.profile_dump)
+            comparator.profiler.stop()
+            # The summary goes to stderr so it never mixes with a report on stdout
+            for line in comparator.profiler.summary_lines():
+                print(line, file=sys.stderr)
+            if args.profile_dump:
+                print(f"\ncProfile dump saved to: {args.profile_dump}", file=sys.stderr)
+            if args.trace_events:
+                comparator.profiler.write_chrome_trace(args.trace_events)
+                print(f"Trace events saved to: {args.trace_events}", file=sys.stderr)
                 
+    except BrokenPipeError:
+        # The reader (e.g. `head` or a CI consumer) stopped early; exit without a traceback
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
     except Exception as e:
         print(f"{Colors.RED}Error: {e}{Colors.END}")
         sys.exit(1)
@@ -14,6 +14,8 @@ import subprocess
 from pathlib import Path
 from typing import List, Optional
 
+from manifest_sources import COMPARED_KINDS, read_file_header, write_kind_index
+
 # ANSI color codes for output formatting
 class Colors:
     RED = '\033[91m'
@@ -31,6 +33,8 @@ class OADPSetup:
     def __init__(self):
         self.base_dir = Path("/var/tmp/OADP")
         self.target_versions = ["1.3", "1.4", "1.5"]
+        # Header of every file find_crd_files() selected, written out as the version's kind index
+        self.manifest_headers = {}
         
     def print_header(self):
         """Print setup script header."""
@@ -131,18 +135,13 @@ class OADPSetup:
         """Find all CRD files in bundle/manifests."""
         crd_files = []
         
-        # Look for YAML files that are likely CRDs
+        # Classify each YAML file by the kind in its header; unreadable files are skipped
         for file_path in bundle_path.glob("*.yaml"):
             if file_path.is_file():
-                # Read first few lines to check if it's a CRD
-                try:
-                    with open(file_path, 'r') as f:
-                        content = f.read(500)  # Read first 500 chars
-                        if 'kind: CustomResourceDefinition' in content or 'ClusterRole' in content or 'Service' in content or 'ConfigMap' in content:
-                            crd_files.append(file_path)
-                except Exception:
-                    # If we can't read it, skip it
-                    continue
+                header = read_file_header(file_path)
+                if header is not None and header.kind in COMPARED_KINDS:
+                    crd_files.append(file_path)
+                    self.manifest_headers[file_path.name] = header
         
         return sorted(crd_files)
     
@@ -170,6 +169,10 @@ class OADPSetup:
             except Exception as e:
                 print(f"  {Colors.RED}❌ Failed to copy {crd_file.name}: {e}{Colors.END}")
         
+        # Let the comparator choose kinds without opening the copied files again
+        write_kind_index(version_dir, {f.name: self.manifest_headers.get(f.name) for f in crd_files
+                                       if (version_dir / f.name).is_file()})
+        
         print(f"{Colors.GREEN}✅ Copied {copied_count} files to version {version}{Colors.END}")
         return copied_count > 0
     
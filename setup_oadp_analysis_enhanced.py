@@ -5,15 +5,23 @@ OADP CRD Analysis Enhanced Setup Script
 This script automatically sets up the directory structure needed for OADP CRD version comparison.
 It prompts for the local oadp-operator repository path, then automatically checks out each
 required branch (release-1.3, release-1.4, release-1.5) and copies CRDs from bundle/manifests
-to the corresponding versioned directories.
+to the corresponding versioned directories. With --git-objects the manifests are read straight
+from the git objects of each branch instead, leaving HEAD and the working tree untouched.
 """
 
 import os
 import sys
-import shutil
+import json
+import hashlib
 import subprocess
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict
+
+from manifest_sources import (GitCatFile, ManifestHeader, COMPARED_KINDS, load_kind_index,
+                              read_file_header, read_manifest_header, write_kind_index)
+
+# Written into each version directory; records the source commit and blob id of every file
+SETUP_MANIFEST_NAME = ".oadp-setup.json"
 
 # ANSI color codes for output formatting
 class Colors:
@@ -29,8 +37,11 @@ class Colors:
     END = '\033[0m'
 
 class OADPSetupEnhanced:
-    def __init__(self):
+    def __init__(self, use_git_objects: bool = False):
         self.base_dir = Path("/var/tmp/OADP")
+        self.use_git_objects = use_git_objects
+        # Header of every file find_crd_files() selected, written out as the version's kind index
+        self.manifest_headers = {}
         # Map of version to potential git branch/tag names (in order of preference)
         self.version_mapping = {
             "1.3": ["oadp-1.3", "release-1.3", "v1.3.0", "v1.3", "1.3"],
@@ -181,20 +192,21 @@ class OADPSetupEnhanced:
             print(f"{Colors.RED}Error checking git status: {e}{Colors.END}")
             return False
     
-    def checkout_branch(self, repo_path: Path, branch: str) -> bool:
+    def checkout_branch(self, repo_path: Path, branch: str, fetch: bool = True) -> bool:
         """Checkout a specific branch or tag."""
         try:
-            # Fetch latest changes
-            print(f"  📡 Fetching latest changes...")
-            fetch_result = subprocess.run(
-                ["git", "fetch", "origin"], 
-                cwd=repo_path, 
-                capture_output=True, 
-                text=True
-            )
-            
-            if fetch_result.returncode != 0:
-                print(f"{Colors.YELLOW}⚠️  Warning: Failed to fetch from origin (continuing anyway){Colors.END}")
+            if fetch:
+                # Fetch latest changes
+                print(f"  📡 Fetching latest changes...")
+                fetch_result = subprocess.run(
+                    ["git", "fetch", "origin"], 
+                    cwd=repo_path, 
+                    capture_output=True, 
+                    text=True
+                )
+                
+                if fetch_result.returncode != 0:
+                    print(f"{Colors.YELLOW}⚠️  Warning: Failed to fetch from origin (continuing anyway){Colors.END}")
             
             # Try different checkout strategies
             checkout_attempts = [
@@ -226,59 +238,150 @@ class OADPSetupEnhanced:
             print(f"  {Colors.RED}❌ Error checking out {branch}: {e}{Colors.END}")
             return False
     
+    def is_compared_kind(self, header: Optional[ManifestHeader]) -> bool:
+        """Check whether a manifest header names a kind we compare."""
+        return header is not None and header.kind in COMPARED_KINDS
+    
     def find_crd_files(self, bundle_path: Path) -> List[Path]:
         """Find all CRD files in bundle/manifests."""
         crd_files = []
+        self.manifest_headers = {}
         
-        # Look for YAML files that are likely CRDs
+        # Classify each YAML file by the kind in its header; unreadable files are skipped
         for file_path in bundle_path.glob("*.yaml"):
             if file_path.is_file():
-                # Read first few lines to check if it's a CRD
-                try:
-                    with open(file_path, 'r') as f:
-                        content = f.read(500)  # Read first 500 chars
-                        if ('kind: CustomResourceDefinition' in content or 
-                            'ClusterRole' in content or 
-                            'Service' in content or 
-                            'ConfigMap' in content or
-                            'ClusterServiceVersion' in content):
-                            crd_files.append(file_path)
-                except Exception:
-                    # If we can't read it, skip it
-                    continue
+                header = read_file_header(file_path)
+                if self.is_compared_kind(header):
+                    crd_files.append(file_path)
+                    self.manifest_headers[file_path.name] = header
         
         return sorted(crd_files)
     
-    def create_version_directory(self, version: str, crd_files: List[Path]) -> bool:
-        """Create version directory and copy CRD files."""
+    def git_blob_id(self, data: bytes) -> str:
+        """Compute the git blob id of file contents (same as `git hash-object`)."""
+        return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+    
+    def load_setup_manifest(self, version: str) -> Dict:
+        """Load the setup manifest written by the previous run for a version, if any."""
+        manifest_path = self.base_dir / version / SETUP_MANIFEST_NAME
+        try:
+            with open(manifest_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_setup_manifest(self, version: str, branch: str, commit: str, files: Dict[str, str]):
+        """Record the resolved commit and the blob id of every copied file for a version."""
+        manifest = {
+            "version": version,
+            "ref": branch,
+            "commit": commit,
+            "files": dict(sorted(files.items()))
+        }
+        manifest_path = self.base_dir / version / SETUP_MANIFEST_NAME
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+            f.write("\n")
+    
+    def is_version_up_to_date(self, version: str, commit: str) -> bool:
+        """Check whether a version directory was already populated from this exact commit."""
+        manifest = self.load_setup_manifest(version)
+        if manifest.get("commit") != commit or not manifest.get("files"):
+            return False
+        version_dir = self.base_dir / version
+        return all((version_dir / name).is_file() for name in manifest["files"])
+    
+    def sync_version_directory(self, version: str, branch: str, commit: str,
+                               files: Dict[str, str], read_file: Callable[[str], bytes],
+                               headers: Dict[str, ManifestHeader]) -> bool:
+        """Bring a version directory in line with the given {file name: blob id} set.
+        
+        Only files whose blob id differs from the previous run's manifest are written, and
+        files no longer present in the bundle are removed. The kind index is rewritten from
+        headers so the comparator can choose kinds without opening the files.
+        """
         version_dir = self.base_dir / version
         
         # Create base directory structure
         try:
-            self.base_dir.mkdir(parents=True, exist_ok=True)
             version_dir.mkdir(parents=True, exist_ok=True)
-            print(f"  📁 Created directory: {version_dir}")
         except Exception as e:
             print(f"  {Colors.RED}❌ Error creating directory {version_dir}: {e}{Colors.END}")
             return False
         
-        # Clear existing files in version directory
-        for existing_file in version_dir.glob("*.yaml"):
-            existing_file.unlink()
+        previous_files = self.load_setup_manifest(version).get("files", {})
+        synced_files = {}
+        written_count = 0
         
-        # Copy CRD files
-        copied_count = 0
-        for crd_file in crd_files:
+        for name, blob_id in sorted(files.items()):
+            dest_file = version_dir / name
+            if previous_files.get(name) == blob_id and dest_file.is_file():
+                synced_files[name] = blob_id
+                continue
             try:
-                dest_file = version_dir / crd_file.name
-                shutil.copy2(crd_file, dest_file)
-                copied_count += 1
-                print(f"    📄 {crd_file.name}")
+                dest_file.write_bytes(read_file(name))
+                synced_files[name] = blob_id
+                written_count += 1
+                print(f"    📄 {name}")
             except Exception as e:
-                print(f"    {Colors.RED}❌ Failed to copy {crd_file.name}: {e}{Colors.END}")
+                print(f"    {Colors.RED}❌ Failed to write {name}: {e}{Colors.END}")
+        
+        # Remove files that are no longer part of the bundle
+        removed_count = 0
+        for existing_file in version_dir.glob("*.yaml"):
+            if existing_file.name not in files:
+                existing_file.unlink()
+                removed_count += 1
+                print(f"    🗑️  {existing_file.name}")
+        
+        self.save_setup_manifest(version, branch, commit, synced_files)
+        write_kind_index(version_dir, {name: headers.get(name) for name in synced_files})
+        
+        unchanged_count = len(synced_files) - written_count
+        print(f"  {Colors.GREEN}✅ Version {version}: {written_count} written, {unchanged_count} unchanged, {removed_count} removed{Colors.END}")
+        return len(synced_files) > 0
+    
+    def create_version_directory(self, version: str, branch: str, commit: str, crd_files: List[Path]) -> bool:
+        """Create version directory and copy the CRD files that changed since the last run."""
+        contents = {crd_file.name: crd_file.read_bytes() for crd_file in crd_files}
+        files = {name: self.git_blob_id(data) for name, data in contents.items()}
+        return self.sync_version_directory(version, branch, commit, files, contents.__getitem__,
+                                           self.manifest_headers)
+    
+    def extract_version_from_git(self, reader: GitCatFile, version: str, branch: str, commit: str) -> bool:
+        """Copy CRDs for one version from the git objects of a commit, without checking it out."""
+        previous_files = self.load_setup_manifest(version).get("files", {})
+        previous_headers = load_kind_index(self.base_dir / version)
+        files = {}
+        contents = {}
+        headers = {}
+        
+        for name, blob_id in sorted(reader.list_tree(f"{commit}:bundle/manifests").items()):
+            if not name.endswith(".yaml"):
+                continue
+            if previous_files.get(name) == blob_id and name in previous_headers:
+                # Already classified by a previous run; no need to read the blob
+                files[name] = blob_id
+                headers[name] = previous_headers[name]
+                continue
+            data = reader.read_blob(blob_id)
+            # Same check as find_crd_files(): classify by the kind in the header
+            header = read_manifest_header(data)
+            if self.is_compared_kind(header):
+                files[name] = blob_id
+                contents[name] = data
+                headers[name] = header
+        
+        if not files:
+            print(f"  {Colors.RED}❌ bundle/manifests not found for {version}{Colors.END}")
+            return False
+        print(f"  📄 Found {len(files)} CRD files")
         
-        print(f"  {Colors.GREEN}✅ Copied {copied_count} files to version {version}{Colors.END}")
-        return copied_count > 0
+        return self.sync_version_directory(
+            version, branch, commit, files,
+            lambda name: contents[name] if name in contents else reader.read_blob(files[name]),
+            headers
+        )
     
     def process_all_versions(self, repo_path: Path) -> Dict[str, bool]:
         """Process all OADP versions automatically."""
@@ -303,48 +406,79 @@ class OADPSetupEnhanced:
         else:
             print(f"{Colors.YELLOW}⚠️  Could not discover branches, will try default names{Colors.END}")
         
-        for version in self.version_mapping.keys():
-            # Find the best branch for this version
-            if available_branches:
-                best_branch = self.find_best_branch_for_version(repo_path, version, available_branches)
-            else:
-                # Fallback to first candidate if discovery failed
-                best_branch = self.version_mapping[version][0]
-            
-            if not best_branch:
-                print(f"\n{Colors.BOLD}{Colors.RED}📦 Processing OADP {version} - No suitable branch found{Colors.END}")
-                print(f"Available branches: {', '.join(available_branches) if available_branches else 'Unknown'}")
-                results[version] = False
-                continue
-            
-            print(f"\n{Colors.BOLD}{Colors.CYAN}📦 Processing OADP {version} (branch: {best_branch}){Colors.END}")
-            print(f"{Colors.CYAN}{'-'*40}{Colors.END}")
-            
+        # Refresh remote refs once up front so every branch resolves to its latest commit
+        print(f"📡 Fetching latest changes...")
+        fetch_result = subprocess.run(
+            ["git", "fetch", "origin"], 
+            cwd=repo_path, 
+            capture_output=True, 
+            text=True
+        )
+        if fetch_result.returncode != 0:
+            print(f"{Colors.YELLOW}⚠️  Warning: Failed to fetch from origin (continuing anyway){Colors.END}")
+        
+        reader = GitCatFile(repo_path)
+        try:
+            for version in self.version_mapping.keys():
+                results[version] = self.process_version(repo_path, version, available_branches, reader)
+        finally:
+            reader.close()
+        
+        return results
+    
+    def process_version(self, repo_path: Path, version: str, available_branches: List[str],
+                        reader: GitCatFile) -> bool:
+        """Process a single OADP version, skipping it if its branch has not moved since the last run."""
+        # Find the best branch for this version
+        if available_branches:
+            best_branch = self.find_best_branch_for_version(repo_path, version, available_branches)
+        else:
+            # Fallback to first candidate if discovery failed
+            best_branch = self.version_mapping[version][0]
+        
+        if not best_branch:
+            print(f"\n{Colors.BOLD}{Colors.RED}📦 Processing OADP {version} - No suitable branch found{Colors.END}")
+            print(f"Available branches: {', '.join(available_branches) if available_branches else 'Unknown'}")
+            return False
+        
+        print(f"\n{Colors.BOLD}{Colors.CYAN}📦 Processing OADP {version} (branch: {best_branch}){Colors.END}")
+        print(f"{Colors.CYAN}{'-'*40}{Colors.END}")
+        
+        commit = reader.resolve_commit(best_branch)
+        if commit is None:
+            print(f"  {Colors.RED}❌ Could not resolve {best_branch}{Colors.END}")
+            return False
+        print(f"  🔖 Resolved {best_branch} to {commit[:12]}")
+        
+        if self.is_version_up_to_date(version, commit):
+            print(f"  {Colors.GREEN}✅ Version {version} is up to date (commit unchanged since last run){Colors.END}")
+            return True
+        
+        if self.use_git_objects:
+            success = self.extract_version_from_git(reader, version, best_branch, commit)
+        else:
             # Checkout the branch
-            if not self.checkout_branch(repo_path, best_branch):
+            if not self.checkout_branch(repo_path, best_branch, fetch=False):
                 print(f"  {Colors.RED}❌ Skipping version {version} due to checkout failure{Colors.END}")
-                results[version] = False
-                continue
+                return False
             
             # Find CRD files
             bundle_path = repo_path / "bundle" / "manifests"
             if not bundle_path.exists():
                 print(f"  {Colors.RED}❌ bundle/manifests not found for {version}{Colors.END}")
-                results[version] = False
-                continue
+                return False
                 
             crd_files = self.find_crd_files(bundle_path)
             print(f"  📄 Found {len(crd_files)} CRD files")
             
             # Create version directory and copy files
-            if self.create_version_directory(version, crd_files):
-                results[version] = True
-                print(f"  {Colors.GREEN}✅ Version {version} completed successfully{Colors.END}")
-            else:
-                results[version] = False
-                print(f"  {Colors.RED}❌ Version {version} failed{Colors.END}")
+            success = self.create_version_directory(version, best_branch, commit, crd_files)
         
-        return results
+        if success:
+            print(f"  {Colors.GREEN}✅ Version {version} completed successfully{Colors.END}")
+        else:
+            print(f"  {Colors.RED}❌ Version {version} failed{Colors.END}")
+        return success
     
     def verify_setup(self) -> bool:
         """Verify the setup is correct."""
@@ -398,9 +532,10 @@ class OADPSetupEnhanced:
         print(f"1. 📁 Navigate to: {Colors.CYAN}cd ~/OADP/CHECK_CRDS{Colors.END}")
         print(f"2. 🔍 Run comparison: {Colors.CYAN}python3 oadp_crd_comparison.py {self.base_dir}{Colors.END}")
         print(f"3. 📊 View full report: {Colors.CYAN}python3 oadp_crd_comparison.py --show-additions {self.base_dir}{Colors.END}")
-        print()
-        print(f"{Colors.YELLOW}💡 Tip: Your git repository has been left on the last processed branch.{Colors.END}")
-        print(f"{Colors.YELLOW}    You may want to checkout your original branch when done.{Colors.END}")
+        if not self.use_git_objects:
+            print()
+            print(f"{Colors.YELLOW}💡 Tip: Your git repository has been left on the last processed branch.{Colors.END}")
+            print(f"{Colors.YELLOW}    You may want to checkout your original branch when done.{Colors.END}")
     
     def show_troubleshooting_info(self, repo_path: Path):
         """Show troubleshooting information for branch issues."""
@@ -434,15 +569,16 @@ class OADPSetupEnhanced:
         print(f"  3. Check if releases use different naming (v1.3.0, 1.3-release, etc.)")
         print(f"  4. Use the manual setup if automatic detection fails")
     
-    def run(self):
+    def run(self, repo_path: Optional[Path] = None):
         """Run the complete enhanced setup process."""
         self.print_header()
         
         # Get oadp-operator path
-        repo_path = self.prompt_for_oadp_path()
+        if repo_path is None:
+            repo_path = self.prompt_for_oadp_path()
         
-        # Check git status and handle uncommitted changes
-        if not self.check_git_status(repo_path):
+        # Check git status and handle uncommitted changes (not needed when nothing is checked out)
+        if not self.use_git_objects and not self.check_git_status(repo_path):
             print(f"{Colors.RED}Setup cancelled due to git status issues.{Colors.END}")
             return
         
@@ -480,13 +616,19 @@ def main():
     )
     parser.add_argument(
         "--repo-path",
-        help="Repository path (for troubleshooting mode)"
+        help="Repository path (skips the prompt; also used by troubleshooting mode)"
+    )
+    parser.add_argument(
+        "--git-objects",
+        action="store_true",
+        help="Read bundle/manifests straight from git objects instead of checking out each branch "
+             "(HEAD and the working tree are left untouched, no stash needed)"
     )
     
     args = parser.parse_args()
     
     try:
-        setup = OADPSetupEnhanced()
+        setup = OADPSetupEnhanced(use_git_objects=args.git_objects)
         
         if args.troubleshoot:
             if args.repo_path:
@@ -495,6 +637,8 @@ def main():
                 repo_path = setup.prompt_for_oadp_path()
             
             setup.show_troubleshooting_info(repo_path)
+        elif args.repo_path:
+            setup.run(Path(args.repo_path).expanduser().resolve())
         else:
             setup.run()
             
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Small on-disk bundles for the tests: version directories of hand-written manifests.
+"""
+
+import textwrap
+from pathlib import Path
+from typing import Dict
+
+def crd(name: str, properties: Dict[str, str], kind: str = "CustomResourceDefinition") -> str:
+    """A minimal manifest of the given kind whose spec holds one string property per entry."""
+    lines = ["apiVersion: v1", f"kind: {kind}", "metadata:", f"  name: {name}", "spec:"]
+    lines += [f"  {key}: {value}" for key, value in properties.items()] or ["  {}"]
+    return "\n".join(lines) + "\n"
+
+def write_bundle(root: Path, versions: Dict[str, Dict[str, str]]) -> Path:
+    """Write {version: {file name: YAML text}} as version directories under root."""
+    root = Path(root)
+    for version, files in versions.items():
+        version_dir = root / version
+        version_dir.mkdir(parents=True, exist_ok=True)
+        for name, text in files.items():
+            (version_dir / name).write_text(textwrap.dedent(text))
+    return root
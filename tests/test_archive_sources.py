@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Tests for reading manifests straight out of tarballs, zip archives and OCI image layouts.
+"""
+
+import hashlib
+import io
+import json
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from typing import Dict, List
+
+from manifest_sources import OCILayoutSource, TarSource, ZipSource, open_source, source_label
+from oadp_crd_comparison import CRDComparator
+
+from bundle import crd, write_bundle
+
+FILES = {
+    "bundle/manifests/dpa.yaml": crd("dpa", {"restic": "x"}).encode(),
+    "bundle/manifests/backup.yml": crd("backup", {"ttl": "1h"}).encode(),
+    "bundle/manifests/README.md": b"not a manifest\n",
+    "bundle/metadata/annotations.yaml": b"annotations: {}\n",
+}
+
+def tar_bytes(files: Dict[str, bytes], mode: str = "w") -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+def write_tar(path: Path, files: Dict[str, bytes], mode: str = "w") -> Path:
+    path.write_bytes(tar_bytes(files, mode))
+    return path
+
+def write_zip(path: Path, files: Dict[str, bytes]) -> Path:
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return path
+
+def write_oci_layout(path: Path, layers: List[Dict[str, bytes]], tag: str = "latest") -> Path:
+    """An OCI image layout holding one image whose layers are gzipped tarballs of the given files."""
+    blobs = path / "blobs" / "sha256"
+    blobs.mkdir(parents=True)
+
+    def blob(data: bytes, media_type: str) -> dict:
+        digest = hashlib.sha256(data).hexdigest()
+        (blobs / digest).write_bytes(data)
+        return {"mediaType": media_type, "digest": f"sha256:{digest}", "size": len(data)}
+
+    config = blob(b"{}", "application/vnd.oci.image.config.v1+json")
+    manifest = {
+        "schemaVersion": 2,
+        "config": config,
+        "layers": [blob(tar_bytes(files, "w:gz"), "application/vnd.oci.image.layer.v1.tar+gzip")
+                   for files in layers],
+    }
+    descriptor = blob(json.dumps(manifest).encode(), "application/vnd.oci.image.manifest.v1+json")
+    descriptor["annotations"] = {"org.opencontainers.image.ref.name": tag}
+    (path / "oci-layout").write_text('{"imageLayoutVersion": "1.0.0"}')
+    (path / "index.json").write_text(json.dumps({"schemaVersion": 2, "manifests": [descriptor]}))
+    return path
+
+class ArchiveSourceTests(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+
+    def assertServes(self, source, files: Dict[str, bytes]):
+        self.assertEqual(source.list_files(), sorted(files))
+        for name, data in files.items():
+            self.assertEqual(source.read_bytes(name), data)
+
+    def test_archives_serve_the_files_of_the_manifests_directory(self):
+        expected = {"backup.yml": FILES["bundle/manifests/backup.yml"], "dpa.yaml": FILES["bundle/manifests/dpa.yaml"]}
+        archives = {
+            "1.4.tar": write_tar(self.tmp / "1.4.tar", FILES),
+            "1.4.tar.gz": write_tar(self.tmp / "1.4.tar.gz", FILES, "w:gz"),
+            "1.4.zip": write_zip(self.tmp / "1.4.zip", FILES),
+            "1.4-oci": write_oci_layout(self.tmp / "1.4-oci", [FILES]),
+        }
+        types = {"1.4.tar": TarSource, "1.4.tar.gz": TarSource, "1.4.zip": ZipSource, "1.4-oci": OCILayoutSource}
+        for name, path in archives.items():
+            with self.subTest(archive=name):
+                source = open_source(path)
+                self.assertIsInstance(source, types[name])
+                self.assertServes(source, expected)
+
+    def test_manifests_path_picks_another_directory(self):
+        expected = {"annotations.yaml": FILES["bundle/metadata/annotations.yaml"]}
+        for source in (TarSource(write_tar(self.tmp / "a.tar", FILES), "bundle/metadata"),
+                       TarSource(write_tar(self.tmp / "a.tar.gz", FILES, "w:gz"), "/bundle/metadata/"),
+                       ZipSource(write_zip(self.tmp / "a.zip", FILES), "bundle/metadata"),
+                       OCILayoutSource(write_oci_layout(self.tmp / "oci", [FILES]), "bundle/metadata")):
+            with self.subTest(source=type(source).__name__):
+                self.assertServes(source, expected)
+
+    def test_oci_layers_apply_whiteouts(self):
+        base = {"manifests/dpa.yaml": b"a: 1\n", "manifests/old.yaml": b"b: 1\n", "manifests/keep.yaml": b"c: 1\n"}
+        upper = {
+            "manifests/dpa.yaml": b"a: 2\n",
+            "manifests/.wh.old.yaml": b"",
+            "manifests/new.yaml": b"d: 1\n",
+        }
+        source = open_source(write_oci_layout(self.tmp / "oci", [base, upper]))
+        self.assertServes(source, {"dpa.yaml": b"a: 2\n", "keep.yaml": b"c: 1\n", "new.yaml": b"d: 1\n"})
+
+    def test_oci_opaque_whiteout_hides_only_lower_layers(self):
+        base = {"manifests/dpa.yaml": b"a: 1\n", "manifests/old.yaml": b"b: 1\n"}
+        upper = {"manifests/.wh..wh..opq": b"", "manifests/new.yaml": b"d: 1\n"}
+        source = open_source(write_oci_layout(self.tmp / "oci", [base, upper]))
+        self.assertServes(source, {"new.yaml": b"d: 1\n"})
+
+    def test_oci_tag_selects_the_image(self):
+        layout = write_oci_layout(self.tmp / "oci", [FILES], tag="1.5")
+        self.assertEqual(open_source(Path(f"{layout}:1.5")).list_files(), ["backup.yml", "dpa.yaml"])
+        with self.assertRaises(ValueError):
+            open_source(Path(f"{layout}:9.9")).list_files()
+
+    def test_snapshot_notices_a_rewritten_archive(self):
+        path = write_zip(self.tmp / "1.4.zip", FILES)
+        source = open_source(path)
+        before = source.snapshot()
+        write_zip(path, dict(FILES, **{"bundle/manifests/extra.yaml": b"e: 1\n"}))
+        self.assertIn("extra.yaml", source.snapshot())
+        self.assertNotIn("extra.yaml", before)
+
+    def test_comparator_discovers_archives_next_to_directories(self):
+        root = write_bundle(self.tmp / "versions", {"1.5": {"dpa.yaml": crd("dpa", {})}})
+        write_tar(root / "1.4.tar.gz", FILES, "w:gz")
+        self.assertEqual(source_label(root / "1.4.tar.gz"), "1.4")
+        comparator = CRDComparator(str(root), use_cache=False, jobs=1)
+        self.assertEqual(comparator.active_versions, ["1.4", "1.5"])
+        changes = comparator.result.files[0].changes
+        self.assertEqual([(c.change_type, c.full_path) for c in changes], [("removed", "spec.restic")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Checks that positional list matching with expanded subtrees still reproduces the
+report of the original comparison tool on the CRDS bundle.
+
+data/baseline_removals.md is the original tool's markdown report for CRDS. Its
+"Line N in version V" marks are left out because the original tool lost most of
+them; the File Changes section and summary line are newer than the baseline and
+are dropped from the current report before comparing. The original tool only
+compared files present in every version, so the check runs on a copy of CRDS
+holding just those files.
+"""
+
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from oadp_crd_comparison import DEFAULT_LIST_KEYS
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+BASELINE_REPORT = Path(__file__).resolve().parent / "data" / "baseline_removals.md"
+LINE_MARK = re.compile(r"^  - Line \d+ in version ")
+
+def normalize(report: str) -> list:
+    lines = []
+    in_file_changes = False
+    for line in report.splitlines():
+        if line.startswith("## "):
+            in_file_changes = line.startswith("## 📁 File Changes")
+        if in_file_changes or LINE_MARK.match(line) or line.startswith("- 📁 **Files"):
+            continue
+        lines.append(line)
+    return lines
+
+class BaselineReportTests(unittest.TestCase):
+
+    def test_positional_keys_and_expanded_subtrees_match_baseline(self):
+        # Every list, including those with built-in identity keys, falls back to [i] positions
+        positional = [arg for key in DEFAULT_LIST_KEYS for arg in ("--list-key", f"{key}=")]
+        versions = sorted(path for path in (REPO_DIR / "CRDS").iterdir() if path.is_dir() and not path.name.startswith("."))
+        common = set.intersection(*({f.name for f in version.iterdir() if f.is_file()} for version in versions))
+        with tempfile.TemporaryDirectory() as bundle_dir:
+            for version in versions:
+                (Path(bundle_dir) / version.name).mkdir()
+                for name in common:
+                    shutil.copy(version / name, Path(bundle_dir) / version.name / name)
+            completed = subprocess.run(
+                [sys.executable, "oadp_crd_comparison.py", bundle_dir, "--markdown", "--expand-subtrees",
+                 "--no-cache", *positional],
+                cwd=REPO_DIR, capture_output=True, text=True, check=True,
+            )
+        expected = normalize(BASELINE_REPORT.read_text(encoding="utf-8"))
+        self.assertEqual(normalize(completed.stdout), expected)
+
+if __name__ == "__main__":
+    unittest.main()
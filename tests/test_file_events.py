@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for files added, removed or renamed between versions.
+"""
+
+import tempfile
+import unittest
+from unittest import mock
+
+from oadp_crd_comparison import CRDComparator, RENAME_MIN_PARAMETERS
+
+from bundle import crd, write_bundle
+
+def properties(count: int, prefix: str = "field") -> dict:
+    return {f"{prefix}{i}": "x" for i in range(count)}
+
+LARGE = properties(RENAME_MIN_PARAMETERS + 10)
+
+class FileEventTests(unittest.TestCase):
+
+    def events(self, versions, **kwargs):
+        with tempfile.TemporaryDirectory() as tmp:
+            comparator = CRDComparator(str(write_bundle(tmp, versions)), use_cache=False, jobs=1, **kwargs)
+            result = comparator.result
+            return comparator, [(e.event_type, e.version_from, e.version_to, e.renamed_from, e.filename)
+                                for e in result.file_events], result.file_event_counts()
+
+    def test_similar_file_of_the_same_kind_is_a_rename(self):
+        _, events, _ = self.events({
+            "1.4": {"old.yaml": crd("dpa", LARGE)},
+            "1.5": {"new.yaml": crd("dpa", dict(LARGE, extra="x"))},
+        })
+        self.assertEqual(events, [("renamed", "1.4", "1.5", "old.yaml", "new.yaml")])
+
+    def test_files_of_another_kind_are_not_paired(self):
+        _, events, _ = self.events({
+            "1.4": {"old.yaml": crd("dpa", LARGE)},
+            "1.5": {"new.yaml": crd("dpa", LARGE, kind="ConfigMap")},
+        })
+        self.assertEqual([e[0] for e in events], ["removed", "added"])
+
+    def test_small_files_are_never_renames(self):
+        small = properties(RENAME_MIN_PARAMETERS // 2)
+        _, events, _ = self.events({
+            "1.4": {"old.yaml": crd("role", small)},
+            "1.5": {"new.yaml": crd("role", small)},
+        })
+        self.assertEqual([e[0] for e in events], ["removed", "added"])
+
+    def test_rename_threshold_above_one_disables_renames(self):
+        _, events, _ = self.events({
+            "1.4": {"old.yaml": crd("dpa", LARGE)},
+            "1.5": {"new.yaml": crd("dpa", LARGE)},
+        }, rename_threshold=2)
+        self.assertEqual([e[0] for e in events], ["removed", "added"])
+
+    def test_files_in_several_pairs_are_counted_and_loaded_once(self):
+        versions = {
+            "1.3": {"kept.yaml": crd("kept", {"a": "x"}), "gone.yaml": crd("gone", LARGE)},
+            "1.4": {"kept.yaml": crd("kept", {"a": "x"}), "gone.yaml": crd("gone", LARGE)},
+            "1.5": {"kept.yaml": crd("kept", {"a": "x"}), "new.yaml": crd("new", properties(5, "other"))},
+        }
+        pairs = ["1.3:1.5", "1.4:1.5"]
+        with mock.patch.object(CRDComparator, "_build_file_tree", autospec=True,
+                               side_effect=CRDComparator._build_file_tree) as build:
+            _, events, counts = self.events(versions, pairs=pairs)
+        self.assertEqual([e[:3] for e in events], [("removed", "1.3", "1.5"), ("added", "1.3", "1.5"),
+                                                   ("removed", "1.4", "1.5"), ("added", "1.4", "1.5")])
+        self.assertEqual(counts, {"added": 1, "removed": 1, "renamed": 0})
+        # gone.yaml once per version it was removed from, new.yaml once for both pairs
+        loaded = [(call.args[1], call.args[2]) for call in build.call_args_list
+                  if call.args[2] != "kept.yaml"]
+        self.assertEqual(sorted(loaded), [("1.3", "gone.yaml"), ("1.4", "gone.yaml"), ("1.5", "new.yaml")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for skipping files whose bytes or canonical YAML content are the same in every version.
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from oadp_crd_comparison import CRDComparator, PhaseProfiler
+
+from bundle import write_bundle
+
+ORIGINAL = """\
+kind: CustomResourceDefinition
+metadata:
+  name: dpa
+spec:
+  restic: x
+  velero: y
+"""
+
+# Same content: reordered keys, other indentation and a comment
+REFORMATTED = """\
+# Reformatted by a newer generator
+spec:
+    velero: y
+    restic: x
+metadata:
+    name: dpa
+kind: CustomResourceDefinition
+"""
+
+class FingerprintTests(unittest.TestCase):
+
+    def profile(self, root: Path, **kwargs):
+        comparator = CRDComparator(str(root), jobs=1, **kwargs)
+        comparator.profiler = PhaseProfiler(trace_memory=False)
+        changes = comparator.compare_versions("dpa.yaml")
+        return changes, [event["phase"] for event in comparator.profiler.events]
+
+    def test_identical_bytes_are_not_parsed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = write_bundle(tmp, {"1.4": {"dpa.yaml": ORIGINAL}, "1.5": {"dpa.yaml": ORIGINAL}})
+            changes, phases = self.profile(root, use_cache=False)
+        self.assertEqual(changes, [])
+        self.assertNotIn("parse", phases)
+
+    def test_equivalent_content_is_not_diffed_and_cached_digests_skip_parsing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = write_bundle(tmp, {"1.4": {"dpa.yaml": ORIGINAL}, "1.5": {"dpa.yaml": REFORMATTED}})
+            changes, phases = self.profile(root)
+            self.assertEqual(changes, [])
+            self.assertIn("parse", phases)
+            self.assertNotIn("diff", phases)
+            # A second run reads the canonical digests from the parse cache
+            changes, phases = self.profile(root)
+        self.assertEqual(changes, [])
+        self.assertNotIn("parse", phases)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for reading bundle manifests straight from git refs.
+"""
+
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+from manifest_sources import GitRefSource
+from oadp_crd_comparison import CRDComparator
+
+from bundle import crd
+
+def git(repo: Path, *args: str) -> str:
+    return subprocess.run(["git", "-C", str(repo), *args], capture_output=True, text=True, check=True).stdout
+
+@unittest.skipIf(shutil.which("git") is None, "git is not installed")
+class GitRefSourceTests(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.repo = Path(tmp.name)
+        git(self.repo, "init", "-q", "-b", "oadp-1.4")
+        git(self.repo, "config", "user.email", "tests@example.com")
+        git(self.repo, "config", "user.name", "tests")
+        manifests = self.repo / "bundle" / "manifests"
+        manifests.mkdir(parents=True)
+        (manifests / "dpa.yaml").write_text(crd("dpa", {"restic": "x", "velero": "y"}))
+        (manifests / "notes.txt").write_text("not a manifest\n")
+        git(self.repo, "add", "-A")
+        git(self.repo, "commit", "-q", "-m", "1.4")
+        git(self.repo, "checkout", "-q", "-b", "oadp-1.5")
+        (manifests / "dpa.yaml").write_text(crd("dpa", {"velero": "y"}))
+        git(self.repo, "commit", "-q", "-am", "1.5")
+        git(self.repo, "checkout", "-q", "oadp-1.4")
+
+    def source(self, ref: str) -> GitRefSource:
+        source = GitRefSource(self.repo, ref)
+        # Stop the cat-file process the source starts on first use
+        self.addCleanup(lambda: source._reader and source._reader.close())
+        return source
+
+    def test_lists_and_reads_manifests_of_a_ref_without_checking_it_out(self):
+        source = self.source("oadp-1.5")
+        self.assertEqual(source.list_files(), ["dpa.yaml"])
+        self.assertNotIn(b"restic", source.read_bytes("dpa.yaml"))
+        # The working tree still holds the checked out branch
+        self.assertIn("restic", (self.repo / "bundle" / "manifests" / "dpa.yaml").read_text())
+        self.assertEqual(git(self.repo, "rev-parse", "--abbrev-ref", "HEAD").strip(), "oadp-1.4")
+
+    def test_unknown_ref_is_an_error(self):
+        with self.assertRaises(ValueError):
+            self.source("oadp-9.9").list_files()
+
+    def test_snapshot_notices_a_moved_branch(self):
+        source = self.source("oadp-1.5")
+        before = source.snapshot()
+        git(self.repo, "checkout", "-q", "oadp-1.5")
+        (self.repo / "bundle" / "manifests" / "dpa.yaml").write_text(crd("dpa", {}))
+        git(self.repo, "commit", "-q", "-am", "drop velero")
+        self.assertNotEqual(source.snapshot(), before)
+
+    def test_comparator_diffs_refs(self):
+        sources = {"1.4": self.source("oadp-1.4"), "1.5": self.source("oadp-1.5")}
+        comparator = CRDComparator(use_cache=False, jobs=1, sources=sources)
+        changes = comparator.result.files[0].changes
+        self.assertEqual([(c.change_type, c.full_path) for c in changes], [("removed", "spec.restic")])
+
+if __name__ == "__main__":
+    unittest.main()
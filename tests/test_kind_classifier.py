@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for classifying manifests by the header of their first document and filtering by kind.
+"""
+
+import io
+import tempfile
+import unittest
+
+from manifest_sources import (DirectorySource, ManifestHeader, load_kind_index, read_manifest_header,
+                              write_kind_index)
+from oadp_crd_comparison import CRDComparator
+
+from bundle import crd, write_bundle
+
+class ReadManifestHeaderTests(unittest.TestCase):
+
+    def test_reads_the_three_fields_in_any_order(self):
+        text = "metadata:\n  labels: {a: b}\n  name: dpa\nkind: CustomResourceDefinition\napiVersion: v1\n"
+        self.assertEqual(read_manifest_header(text), ManifestHeader("v1", "CustomResourceDefinition", "dpa"))
+
+    def test_nested_keys_of_the_same_name_are_ignored(self):
+        text = "spec:\n  kind: Nested\n  names: {kind: Other}\nkind: Role\nmetadata:\n  name: r\n"
+        self.assertEqual(read_manifest_header(text), ManifestHeader(None, "Role", "r"))
+
+    def test_only_the_first_document_is_read(self):
+        text = "kind: Service\nmetadata: {name: web}\n---\nkind: Deployment\napiVersion: apps/v1\n"
+        self.assertEqual(read_manifest_header(text), ManifestHeader(None, "Service", "web"))
+
+    def test_stops_reading_once_the_header_is_known(self):
+        # The tail is not valid YAML; it is never reached
+        stream = io.BytesIO(b"apiVersion: v1\nkind: Role\nmetadata:\n  name: r\nspec: [unclosed\n")
+        self.assertEqual(read_manifest_header(stream), ManifestHeader("v1", "Role", "r"))
+
+    def test_non_manifests_have_no_header(self):
+        for text in ("- a\n- b\n", "just text\n", "spec: {a: 1}\n", "kind: [unclosed\n", ""):
+            with self.subTest(text=text):
+                self.assertIsNone(read_manifest_header(text))
+
+class KindFilterTests(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        versions = {
+            version: {"dpa.yaml": crd("dpa", properties), "role.yaml": crd("role", properties, kind="ClusterRole")}
+            for version, properties in (("1.4", {"a": "x", "b": "x"}), ("1.5", {"a": "x"}))
+        }
+        self.root = write_bundle(tmp.name, versions)
+
+    def compared_files(self, kinds):
+        comparator = CRDComparator(str(self.root), use_cache=False, jobs=1, kinds=kinds)
+        return comparator.common_files
+
+    def test_kind_filter_selects_files_by_their_first_document(self):
+        self.assertEqual(self.compared_files(None), ["dpa.yaml", "role.yaml"])
+        self.assertEqual(self.compared_files({"ClusterRole"}), ["role.yaml"])
+        self.assertEqual(self.compared_files({"ClusterRole", "CustomResourceDefinition"}), ["dpa.yaml", "role.yaml"])
+        self.assertEqual(self.compared_files({"Secret"}), [])
+
+    def test_kind_index_from_setup_is_used_while_files_are_unchanged(self):
+        version_dir = self.root / "1.4"
+        write_kind_index(version_dir, {"dpa.yaml": ManifestHeader("v1", "Recorded", "dpa"), "role.yaml": None})
+        self.assertEqual(load_kind_index(version_dir), {"dpa.yaml": ManifestHeader("v1", "Recorded", "dpa")})
+        self.assertEqual(DirectorySource(version_dir).kind_index()["dpa.yaml"].kind, "Recorded")
+
+        # An edited file no longer matches its stamp, so its header is read again
+        (version_dir / "dpa.yaml").write_text(crd("dpa", {"a": "x", "b": "x", "c": "x"}))
+        self.assertEqual(load_kind_index(version_dir), {})
+        self.assertEqual(DirectorySource(version_dir).kind_index()["dpa.yaml"].kind, "CustomResourceDefinition")
+
+if __name__ == "__main__":
+    unittest.main()
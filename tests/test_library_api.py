@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for compare(), the in-process library API.
+"""
+
+import contextlib
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+from manifest_sources import DirectorySource
+from oadp_crd_comparison import ParameterChange, PathFilter, compare
+
+from bundle import crd, write_bundle
+
+class CompareTests(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = write_bundle(tmp.name, {
+            "1.3": {"dpa.yaml": crd("dpa", {"restic": "x", "velero": "y", "nodeAgent": "z"})},
+            "1.4": {"dpa.yaml": crd("dpa", {"restic": "x", "velero": "y"}), "broken.yaml": "a: [unclosed\n"},
+            "1.5": {"dpa.yaml": crd("dpa", {"velero": "y", "kopia": "k"}), "broken.yaml": "b: [unclosed\n"},
+        })
+
+    def test_yields_changes_and_summary_without_output(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            result = compare(self.root, pairs=["1.4:1.5"])
+            changes = list(result)
+        self.assertEqual((stdout.getvalue(), stderr.getvalue()), ("", ""))
+        self.assertTrue(all(isinstance(change, ParameterChange) for change in changes))
+        self.assertEqual(sorted((c.change_type, c.full_path) for c in changes),
+                         [("added", "spec.kopia"), ("removed", "spec.restic")])
+        self.assertEqual(result.versions, ["1.4", "1.5"])
+        self.assertEqual(result.pairs, [("1.4", "1.5")])
+        self.assertEqual((result.summary["added"], result.summary["removed"]), (1, 1))
+        self.assertEqual([f.filename for f in result.files], ["broken.yaml", "dpa.yaml"])
+        self.assertEqual(len(result.errors), 2)
+        # Iterating again replays the finished result
+        self.assertEqual(list(result), changes)
+        # Nothing is cached without a cache_dir
+        self.assertFalse(any(path.name.startswith(".") for path in Path(self.root).rglob("*")))
+
+    def test_summary_before_iteration_finishes_the_comparison(self):
+        result = compare(self.root)
+        self.assertEqual(result.pairs, [("1.3", "1.4"), ("1.4", "1.5"), ("1.3", "1.5")])
+        self.assertEqual(result.summary["removed"], 4)
+        # broken.yaml is added in both pairs from 1.3, and counted once
+        self.assertEqual([(e.event_type, e.version_from, e.version_to) for e in result.file_events],
+                         [("added", "1.3", "1.4"), ("added", "1.3", "1.5")])
+        self.assertEqual(result.summary["file_events"]["added"], 1)
+
+    def test_sources_pairs_and_filters(self):
+        sources = {"1.3": self.root / "1.3", "1.5": DirectorySource(self.root / "1.5")}
+        result = compare(sources, pairs=[("1.3", "1.5")], filters={"exclude": ["spec.restic"]})
+        self.assertEqual(sorted(c.full_path for c in result), ["spec.kopia", "spec.nodeAgent"])
+        result = compare(sources, filters=PathFilter(["spec.restic"]))
+        self.assertEqual([c.full_path for c in result], ["spec.restic"])
+
+    def test_cache_dir_is_used_when_given(self):
+        cache_dir = Path(self.root) / "cache"
+        list(compare(self.root, pairs=["1.3:1.4"], cache_dir=cache_dir))
+        self.assertTrue(any(cache_dir.rglob("*.json")))
+
+if __name__ == "__main__":
+    unittest.main()
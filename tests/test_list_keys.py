@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for matching list items by identity keys instead of by position.
+"""
+
+import tempfile
+import unittest
+
+from oadp_crd_comparison import CRDComparator, list_item_segments
+
+from bundle import write_bundle
+
+DEPLOYMENT = """\
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: controller
+spec:
+  containers:
+{containers}
+"""
+
+def container(name: str, *keys: str) -> str:
+    lines = [f"  - name: {name}"] + [f"    {key}: value" for key in keys]
+    return "\n".join(lines)
+
+class ListItemSegmentsTests(unittest.TestCase):
+
+    def test_items_are_identified_by_their_key_fields(self):
+        items = [{"name": "manager", "image": "a"}, {"name": "proxy"}]
+        self.assertEqual(list_item_segments(items, ("name",)), [("name", "manager"), ("name", "proxy")])
+
+    def test_scalar_lists_are_joined_into_the_identity(self):
+        items = [{"apiGroups": ["", "apps"], "resources": ["pods"]}]
+        self.assertEqual(list_item_segments(items, ("apiGroups", "resources")),
+                         [("apiGroups", "|apps", "resources", "pods")])
+
+    def test_falls_back_to_positions(self):
+        # No key fields, an item without any of them, or two items with the same identity
+        self.assertIsNone(list_item_segments([{"name": "a"}], ()))
+        self.assertIsNone(list_item_segments([{"name": "a"}, {"image": "b"}], ("name",)))
+        self.assertIsNone(list_item_segments([{"name": "a"}, {"name": "a"}], ("name",)))
+
+class IdentityMatchingTests(unittest.TestCase):
+
+    def compare(self, old_containers, new_containers, **kwargs):
+        with tempfile.TemporaryDirectory() as tmp:
+            write_bundle(tmp, {
+                "1.4": {"deployment.yaml": DEPLOYMENT.format(containers="\n".join(old_containers))},
+                "1.5": {"deployment.yaml": DEPLOYMENT.format(containers="\n".join(new_containers))},
+            })
+            comparator = CRDComparator(tmp, use_cache=False, jobs=1, **kwargs)
+            return [(c.change_type, c.full_path) for c in comparator.compare_versions("deployment.yaml")]
+
+    def test_reordered_items_are_unchanged(self):
+        old = [container("manager", "image"), container("proxy", "args")]
+        self.assertEqual(self.compare(old, old[::-1]), [])
+
+    def test_removed_item_is_reported_by_identity(self):
+        old = [container("manager", "image"), container("proxy", "args")]
+        new = [container("proxy", "args")]
+        self.assertEqual(self.compare(old, new, collapse_subtrees=False),
+                         [("removed", "spec.containers[name=manager].image"),
+                          ("removed", "spec.containers[name=manager].name")])
+
+    def test_empty_list_key_matches_by_position(self):
+        old = [container("manager", "image"), container("proxy", "args")]
+        changes = self.compare(old, old[::-1], list_keys={"containers": ()}, collapse_subtrees=False)
+        self.assertIn(("removed", "spec.containers[0].image"), changes)
+        self.assertIn(("added", "spec.containers[0].args"), changes)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for multi-document YAML files, whose documents are matched by kind/name.
+"""
+
+import tempfile
+import unittest
+
+from oadp_crd_comparison import CRDComparator
+
+from bundle import write_bundle
+
+SERVICE = """\
+kind: Service
+metadata:
+  name: {name}
+spec:
+  port: 80
+{extra}"""
+
+def stream(*documents: str) -> str:
+    return "---\n".join(documents)
+
+def service(name: str, extra: str = "") -> str:
+    return SERVICE.format(name=name, extra=extra)
+
+class MultiDocumentTests(unittest.TestCase):
+
+    def compare(self, old: str, new: str, **kwargs):
+        with tempfile.TemporaryDirectory() as tmp:
+            write_bundle(tmp, {"1.4": {"all.yaml": old}, "1.5": {"all.yaml": new}})
+            comparator = CRDComparator(tmp, use_cache=False, jobs=1, **kwargs)
+            return [(c.change_type, c.full_path) for c in comparator.compare_versions("all.yaml")]
+
+    def test_reordered_documents_are_unchanged(self):
+        old = stream(service("web"), service("api"))
+        new = stream(service("api"), service("web"), "")
+        self.assertEqual(self.compare(old, new), [])
+
+    def test_changes_are_reported_per_document(self):
+        old = stream(service("web", "  tls: on\n"), service("api"))
+        new = stream(service("api"), service("web"))
+        self.assertEqual(self.compare(old, new), [("removed", "Service/web:spec.tls")])
+
+    def test_removed_document_collapses_to_its_key(self):
+        old = stream(service("web"), service("api"))
+        self.assertEqual(self.compare(old, stream(service("web"))), [("removed", "Service/api")])
+        expanded = self.compare(old, stream(service("web")), collapse_subtrees=False)
+        self.assertIn(("removed", "Service/api:spec.port"), expanded)
+
+    def test_documents_without_identity_fall_back_to_positions(self):
+        old = stream("a: 1\n", "b: 1\n")
+        new = stream("a: 1\n", "c: 1\n")
+        self.assertEqual(self.compare(old, new), [("added", "#1:c"), ("removed", "#1:b")])
+
+    def test_duplicate_keys_are_suffixed_with_their_position(self):
+        old = stream(service("web"), service("web", "  tls: on\n"))
+        new = stream(service("web"), service("web"))
+        self.assertEqual(self.compare(old, new), [("removed", "Service/web#1:spec.tls")])
+
+    def test_single_document_files_are_addressed_without_a_prefix(self):
+        self.assertEqual(self.compare(service("web", "  tls: on\n"), service("other")), [("removed", "spec.tls")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the ParameterTrie set operations and Merkle digests that every
+comparison, cache entry and snapshot is built on.
+"""
+
+import random
+import unittest
+
+from oadp_crd_comparison import DocumentKey, ParameterTrie
+
+def build_trie(*paths, line: int = 0) -> ParameterTrie:
+    """Build a sealed trie in which every given path (a tuple of segments) is a parameter."""
+    root = ParameterTrie()
+    for path in paths:
+        node = root
+        for segment in path:
+            node = node.children.setdefault(segment, ParameterTrie(line=line))
+        node.is_param = True
+    return seal(root)
+
+def seal(node: ParameterTrie) -> ParameterTrie:
+    for child in node.children.values():
+        seal(child)
+    return node.seal()
+
+def param_paths(tree: ParameterTrie) -> set:
+    return {path for path, _ in tree.iter_params()}
+
+def random_paths(rng: random.Random, count: int) -> set:
+    """Paths drawn from a small key space, so random tries overlap heavily."""
+    keys = ["spec", "status", "name", "ports", 0, 1, ("name", "manager")]
+    paths = set()
+    for _ in range(count):
+        length = rng.randint(1, 4)
+        paths.add(tuple(rng.choice(keys) for _ in range(length)))
+    return paths
+
+class ParameterTrieTests(unittest.TestCase):
+
+    def test_difference_keeps_only_parameters_missing_from_other(self):
+        old = build_trie(("spec", "a"), ("spec", "b"), ("status",))
+        new = build_trie(("spec", "a"), ("spec", "c"))
+        self.assertEqual(param_paths(old.difference(new)), {("spec", "b"), ("status",)})
+        self.assertEqual(param_paths(new.difference(old)), {("spec", "c")})
+
+    def test_difference_of_parent_keeps_nested_parameters(self):
+        # A key that is a parameter in both versions is not reported, only its new children
+        old = build_trie(("spec",))
+        new = build_trie(("spec",), ("spec", "a"))
+        self.assertEqual(param_paths(new.difference(old)), {("spec", "a")})
+        self.assertEqual(param_paths(old.difference(new)), set())
+
+    def test_union_contains_parameters_of_both(self):
+        left = build_trie(("spec", "a"), (("name", "manager"), "image"))
+        right = build_trie(("spec", "b"), (("name", "manager"), "image"))
+        self.assertEqual(param_paths(left.union(right)),
+                         {("spec", "a"), ("spec", "b"), (("name", "manager"), "image")})
+
+    def test_union_with_empty_trie_returns_the_other_trie(self):
+        tree = build_trie(("spec", "a"))
+        empty = ParameterTrie().seal()
+        self.assertIs(tree.union(empty), tree)
+        self.assertIs(empty.union(tree), tree)
+
+    def test_digest_covers_shape_but_not_positions(self):
+        first = build_trie(("spec", "a"), ("spec", 0, "b"), line=3)
+        moved = build_trie(("spec", "a"), ("spec", 0, "b"), line=40)
+        other = build_trie(("spec", "a"), ("spec", 1, "b"))
+        self.assertEqual(first.digest, moved.digest)
+        self.assertNotEqual(first.digest, other.digest)
+
+    def test_digest_distinguishes_parameters_from_intermediate_nodes(self):
+        self.assertNotEqual(build_trie(("spec",), ("spec", "a")).digest, build_trie(("spec", "a")).digest)
+
+    def test_equal_digests_short_circuit_difference(self):
+        old = build_trie(("spec", "a"), ("spec", "b"))
+        new = build_trie(("spec", "a"), ("spec", "b"))
+        self.assertTrue(old.difference(new).is_empty())
+
+    def test_difference_shares_missing_subtrees(self):
+        old = build_trie(("spec", "a"), ("status", "b"))
+        new = build_trie(("spec", "a"))
+        self.assertIs(old.difference(new).children["status"], old.children["status"])
+
+    def test_set_operations_match_python_sets(self):
+        rng = random.Random(20240601)
+        for _ in range(200):
+            left_paths, right_paths = random_paths(rng, 12), random_paths(rng, 12)
+            left, right = build_trie(*left_paths), build_trie(*right_paths)
+            self.assertEqual(param_paths(left.difference(right)), left_paths - right_paths)
+            self.assertEqual(param_paths(left.union(right)), left_paths | right_paths)
+
+    def test_json_round_trip_keeps_digest_and_segment_types(self):
+        tree = build_trie((DocumentKey("Service/web"), "spec", "ports", ("name", "http"), "port"),
+                          (DocumentKey("Service/web"), "spec", "ports", 0))
+        restored = ParameterTrie.from_json(tree.to_json())
+        self.assertEqual(restored.digest, tree.digest)
+        self.assertEqual(param_paths(restored), param_paths(tree))
+        document = next(iter(restored.children))
+        self.assertIsInstance(document, DocumentKey)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for --include/--exclude path filters and .crdignore files.
+"""
+
+import json
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from oadp_crd_comparison import CRDComparator, DocumentKey, PathFilter
+
+from bundle import write_bundle
+from test_parameter_trie import build_trie, param_paths
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+OLD = """\
+kind: CustomResourceDefinition
+metadata:
+  name: dpa
+  annotations:
+    example.com/owner: velero
+spec:
+  description: old text
+  versions:
+  - name: v1
+    schema:
+      description: old text
+      restic: x
+  big:
+    a: 1
+    b: 1
+"""
+
+NEW = """\
+kind: CustomResourceDefinition
+metadata:
+  name: dpa
+spec:
+  description: new text
+  versions:
+  - name: v1
+    schema:
+      description: new text
+"""
+
+class PathFilterTests(unittest.TestCase):
+
+    def test_select_keeps_included_paths_and_drops_excluded_ones(self):
+        tree = build_trie(("spec",), ("spec", "a"), ("spec", "a", "description"), ("spec", "b"), ("status",))
+        self.assertEqual(param_paths(PathFilter(["spec.*"]).select(tree)),
+                         {("spec", "a"), ("spec", "a", "description"), ("spec", "b")})
+        self.assertEqual(param_paths(PathFilter(exclude=["**.description", "status"]).select(tree)),
+                         {("spec",), ("spec", "a"), ("spec", "b")})
+        self.assertEqual(param_paths(PathFilter(["spec.**"], ["spec.b"]).select(tree)),
+                         {("spec",), ("spec", "a"), ("spec", "a", "description")})
+
+    def test_list_items_match_positions_and_identities(self):
+        tree = build_trie(("containers", 0, "image"), ("containers", ("name", "manager"), "image"))
+        self.assertEqual(param_paths(PathFilter(["containers[*].image"]).select(tree)),
+                         {("containers", 0, "image"), ("containers", ("name", "manager"), "image")})
+        self.assertEqual(param_paths(PathFilter(["containers[name=manager].**"]).select(tree)),
+                         {("containers", ("name", "manager"), "image")})
+
+    def test_dotted_keys_and_documents(self):
+        tree = build_trie((DocumentKey("Service/web"), "metadata", "annotations", "example.com/owner"),
+                          (DocumentKey("Service/web"), "spec"))
+        self.assertEqual(param_paths(PathFilter(exclude=["metadata.annotations.example.*"]).select(tree)),
+                         {(DocumentKey("Service/web"), "spec")})
+
+    def test_read_ignore_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / PathFilter.IGNORE_FILE_NAME
+            path.write_text("# Generated docs\n**.description\n\nstatus.**  # runtime state\n")
+            self.assertEqual(PathFilter.read_ignore_file(path), ["**.description", "status.**"])
+
+class FilteredComparisonTests(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = write_bundle(tmp.name, {"1.4": {"dpa.yaml": OLD}, "1.5": {"dpa.yaml": NEW}})
+
+    def changes(self, path_filter, **kwargs):
+        comparator = CRDComparator(str(self.root), jobs=1, path_filter=path_filter, **kwargs)
+        return comparator, [(c.change_type, c.full_path) for c in comparator.compare_versions("dpa.yaml")]
+
+    def test_excluded_subtrees_are_pruned_while_building_trees(self):
+        comparator, changes = self.changes(PathFilter(exclude=["spec.big", "metadata.annotations"]))
+        self.assertEqual(changes, [("removed", "spec.versions[name=v1].schema.restic")])
+        paths = {segments[:2] for segments, _ in comparator._file_parameters("1.4", "dpa.yaml").iter_params()}
+        self.assertNotIn(("spec", "big"), paths)
+        self.assertNotIn(("metadata", "annotations"), paths)
+
+    def test_include_narrows_the_report(self):
+        _, changes = self.changes(PathFilter(["spec.big.*"]), collapse_subtrees=False)
+        self.assertEqual(changes, [("removed", "spec.big.a"), ("removed", "spec.big.b")])
+
+    def test_cached_trees_are_not_reused_across_filters(self):
+        _, unfiltered = self.changes(None, cache_dir=str(self.root / ".cache"))
+        _, filtered = self.changes(PathFilter(exclude=["spec.big"]), cache_dir=str(self.root / ".cache"))
+        self.assertIn(("removed", "spec.big"), unfiltered)
+        self.assertNotIn(("removed", "spec.big"), filtered)
+
+    def test_crdignore_next_to_the_versions_is_applied(self):
+        (self.root / PathFilter.IGNORE_FILE_NAME).write_text("spec.big\nmetadata.annotations\n")
+        completed = subprocess.run(
+            [sys.executable, "oadp_crd_comparison.py", str(self.root), "--format", "json", "--no-cache",
+             "--non-interactive"],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        )
+        paths = [change["full_path"] for change in json.loads(completed.stdout)["changes"]]
+        self.assertEqual(paths, ["spec.versions[name=v1].schema.restic"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for the query service that keeps parsed versions resident in memory.
+"""
+
+import tempfile
+import unittest
+from unittest import mock
+
+from crd_query_server import CRDQueryService, QueryError
+from oadp_crd_comparison import CRDComparator
+
+from bundle import crd, write_bundle
+
+class QueryServiceTests(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = write_bundle(tmp.name, {
+            "1.3": {"dpa.yaml": crd("dpa", {"restic": "x", "velero": "y", "nodeAgent": "z"})},
+            "1.4": {"dpa.yaml": crd("dpa", {"restic": "x", "velero": "y"}), "backup.yaml": crd("backup", {"ttl": "1h"})},
+            "1.5": {"dpa.yaml": crd("dpa", {"velero": "y"}), "backup.yaml": crd("backup", {"ttl": "1h"})},
+        })
+
+    def service(self, **kwargs) -> CRDQueryService:
+        service = CRDQueryService(CRDComparator(str(self.root), use_cache=False, **kwargs))
+        service.load()
+        return service
+
+    def test_load_diffs_resident_trees_without_worker_processes(self):
+        # Workers could not reuse the resident trees; they would only be pickled into each one
+        with mock.patch("oadp_crd_comparison.ProcessPoolExecutor", side_effect=AssertionError("pool started")):
+            service = self.service(jobs=4)
+        self.assertEqual(service.comparator.result.removed_count, 4)
+        self.assertIn(("1.5", "dpa.yaml"), service.comparator._trees)
+
+    def test_versions_and_summary(self):
+        service = self.service(jobs=1, pairs=["1.4:1.5"])
+        versions = service.handle("/versions", {})
+        self.assertEqual((versions["versions"], versions["pairs"]), (["1.4", "1.5"], [["1.4", "1.5"]]))
+        self.assertEqual(versions["files"], {"1.4": 2, "1.5": 2})
+        self.assertEqual(service.handle("/summary/", {})["removed"], 1)
+        self.assertEqual([f["filename"] for f in service.handle("/files", {})["files"]], ["backup.yaml", "dpa.yaml"])
+
+    def test_diff_between_any_loaded_versions(self):
+        service = self.service(jobs=1, pairs=["1.4:1.5"])
+        # 1.3 is outside the requested pair, so it is not loaded
+        with self.assertRaises(QueryError) as raised:
+            service.handle("/diff", {"from": "1.3", "to": "1.5"})
+        self.assertEqual(raised.exception.status, 404)
+
+        service = self.service(jobs=1)
+        diff = service.handle("/diff", {"from": "1.5", "to": "1.3"})
+        self.assertEqual(sorted((c["change_type"], c["full_path"]) for c in diff["changes"]),
+                         [("added", "spec.nodeAgent"), ("added", "spec.restic")])
+        diff = service.handle("/diff", {"from": "1.3", "to": "1.5", "path": "spec.rest*", "type": "removed"})
+        self.assertEqual([c["full_path"] for c in diff["changes"]], ["spec.restic"])
+        self.assertEqual(service.handle("/diff", {"from": "1.4", "to": "1.5", "file": "backup.yaml"})["changes"], [])
+
+    def test_lookup_reports_presence_per_version(self):
+        service = self.service(jobs=1)
+        lookup = service.handle("/lookup", {"path": "spec.restic"})
+        self.assertEqual(lookup["present"], {"1.3": True, "1.4": True, "1.5": False})
+        self.assertEqual(lookup["matches"]["1.4"], [{"file": "dpa.yaml", "path": "spec.restic", "line": 6,
+                                                     "column": 3, "parameters": 1}])
+        lookup = service.handle("/lookup", {"path": "spec.*", "version": "1.5", "file": "backup.yaml"})
+        self.assertEqual([m["path"] for m in lookup["matches"]["1.5"]], ["spec.ttl"])
+
+    def test_file_summary(self):
+        service = self.service(jobs=1)
+        summary = service.handle("/files/dpa.yaml", {"changes": "1"})
+        self.assertEqual(summary["versions"], ["1.3", "1.4", "1.5"])
+        self.assertEqual(summary["removed"], 4)
+        self.assertEqual(len(summary["changes"]), 4)
+        backup = service.handle("/files/backup.yaml", {})
+        self.assertEqual([(e["event_type"], e["version_to"]) for e in backup["file_events"]],
+                         [("added", "1.4"), ("added", "1.5")])
+        self.assertNotIn("changes", backup)
+
+    def test_bad_queries_are_errors(self):
+        service = self.service(jobs=1)
+        for path, params, status in (("/nowhere", {}, 404), ("/files/missing.yaml", {}, 404),
+                                     ("/diff", {"to": "1.5"}, 400), ("/diff", {"from": "1.4", "to": "9.9"}, 404),
+                                     ("/diff", {"from": "1.4", "to": "1.5", "type": "moved"}, 400),
+                                     ("/lookup", {}, 400)):
+            with self.subTest(path=path, params=params):
+                with self.assertRaises(QueryError) as raised:
+                    service.handle(path, params)
+                self.assertEqual(raised.exception.status, status)
+
+    def test_reload_changed_re_diffs_edited_files(self):
+        service = self.service(jobs=1)
+        self.assertEqual(service.reload_changed(), [])
+        (self.root / "1.5" / "dpa.yaml").write_text(crd("dpa", {"restic": "x", "velero": "y"}))
+        self.assertEqual(service.reload_changed(), [("dpa.yaml", "changed")])
+        self.assertEqual(service.handle("/lookup", {"path": "spec.restic"})["present"]["1.5"], True)
+        self.assertEqual(service.handle("/summary", {})["removed"], 2)
+        self.assertEqual(service.handle("/versions", {})["reloads"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
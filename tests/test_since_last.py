@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for --since-last: reusing the previous run's snapshot and reporting only new and
+resolved changes.
+"""
+
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from oadp_crd_comparison import CRDComparator, RunSnapshot
+
+from bundle import crd, write_bundle
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+class SinceLastTests(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = write_bundle(tmp.name, {
+            "1.4": {"dpa.yaml": crd("dpa", {"restic": "x", "velero": "y"}), "other.yaml": crd("other", {"a": "x"})},
+            "1.5": {"dpa.yaml": crd("dpa", {"velero": "y"}), "other.yaml": crd("other", {"a": "x"})},
+        })
+        self.snapshot_path = Path(tmp.name) / RunSnapshot.DEFAULT_FILE_NAME
+
+    def run_since(self, **kwargs):
+        comparator = CRDComparator(str(self.root), use_cache=False, jobs=1, **kwargs)
+        return comparator, comparator.compare_since(self.snapshot_path)
+
+    def test_first_run_reports_every_change_as_new(self):
+        _, delta = self.run_since()
+        self.assertIsNone(delta.previous_run)
+        self.assertEqual([c.full_path for c in delta.new], ["spec.restic"])
+        self.assertTrue(self.snapshot_path.is_file())
+
+    def test_unchanged_inputs_are_not_re_diffed(self):
+        self.run_since()
+        comparator, delta = self.run_since()
+        self.assertIsNotNone(delta.previous_run)
+        self.assertEqual((delta.new, delta.resolved, delta.files_rediffed), ([], [], []))
+        self.assertEqual(delta.files_skipped, 2)
+        # The full result is still available for the report
+        self.assertEqual(comparator.result.removed_count, 1)
+
+    def test_edits_report_new_and_resolved_changes(self):
+        self.run_since()
+        (self.root / "1.5" / "dpa.yaml").write_text(crd("dpa", {"restic": "x"}))
+        _, delta = self.run_since()
+        self.assertEqual(delta.files_rediffed, ["dpa.yaml"])
+        self.assertEqual([c.full_path for c in delta.new], ["spec.velero"])
+        self.assertEqual([c.full_path for c in delta.resolved], ["spec.restic"])
+
+    def test_changed_settings_start_a_fresh_baseline(self):
+        self.run_since()
+        for settings in ({"collapse_subtrees": False}, {"kinds": {"CustomResourceDefinition"}}, {"pairs": ["1.5:1.4"]}):
+            with self.subTest(settings=settings):
+                _, delta = self.run_since(**settings)
+                self.assertIsNone(delta.previous_run)
+
+    def test_profiled_run_prints_the_profile(self):
+        self.run_since()
+        completed = subprocess.run(
+            [sys.executable, "oadp_crd_comparison.py", str(self.root), "--since-last", "--profile",
+             "--snapshot-file", str(self.snapshot_path), "--no-cache"],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True,
+        )
+        self.assertIn("Nothing changed since the last run", completed.stdout)
+        self.assertIn("Profile by phase", completed.stderr)
+        # Unchanged files are skipped, so nothing is diffed
+        self.assertNotRegex(completed.stderr, r"(?m)^diff ")
+
+if __name__ == "__main__":
+    unittest.main()
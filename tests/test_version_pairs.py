@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for version pair selection, delta composition across consecutive versions,
+and which files each requested pair compares.
+"""
+
+import random
+import tempfile
+import unittest
+
+from oadp_crd_comparison import CRDComparator, compose_deltas, default_pairs, diff_trees, parse_pairs
+
+from bundle import crd, write_bundle
+from test_parameter_trie import build_trie, param_paths, random_paths
+
+class PairSelectionTests(unittest.TestCase):
+
+    def test_default_pairs_are_consecutive_plus_first_to_last(self):
+        self.assertEqual(default_pairs(["1.3", "1.4", "1.5"]), [("1.3", "1.4"), ("1.4", "1.5"), ("1.3", "1.5")])
+        self.assertEqual(default_pairs(["1.3", "1.4"]), [("1.3", "1.4")])
+
+    def test_parse_pairs_expands_selectors_without_duplicates(self):
+        versions = ["1.3", "1.4", "1.5"]
+        self.assertEqual(parse_pairs(["consecutive", "1.3:1.4", "1.5:1.3"], versions),
+                         [("1.3", "1.4"), ("1.4", "1.5"), ("1.5", "1.3")])
+        self.assertEqual(len(parse_pairs(["all"], versions)), 3)
+
+    def test_parse_pairs_rejects_unknown_versions_and_malformed_pairs(self):
+        for spec in ("1.3:1.9", "1.3", "1.3:1.3"):
+            with self.assertRaises(ValueError):
+                parse_pairs([spec], ["1.3", "1.4"])
+
+class ComposeDeltasTests(unittest.TestCase):
+
+    def test_single_delta_is_returned_unchanged(self):
+        added, removed = diff_trees(build_trie(("a",)), build_trie(("b",)))
+        self.assertEqual(compose_deltas([(added, removed)]), (added, removed))
+
+    def test_removal_then_re_addition_cancels_out(self):
+        v1 = build_trie(("spec", "a"), ("spec", "b"))
+        v2 = build_trie(("spec", "a"))
+        v3 = build_trie(("spec", "a"), ("spec", "b"))
+        added, removed = compose_deltas([diff_trees(v1, v2), diff_trees(v2, v3)])
+        self.assertEqual(param_paths(added), set())
+        self.assertEqual(param_paths(removed), set())
+
+    def test_addition_then_removal_cancels_out(self):
+        v1 = build_trie(("spec", "a"))
+        v2 = build_trie(("spec", "a"), ("spec", "new"))
+        v3 = build_trie(("spec", "a"))
+        added, removed = compose_deltas([diff_trees(v1, v2), diff_trees(v2, v3)])
+        self.assertEqual(param_paths(added), set())
+        self.assertEqual(param_paths(removed), set())
+
+    def test_composed_deltas_match_the_direct_diff(self):
+        rng = random.Random(1905)
+        for _ in range(100):
+            versions = [build_trie(*random_paths(rng, 10)) for _ in range(rng.randint(2, 5))]
+            steps = [diff_trees(old, new) for old, new in zip(versions, versions[1:])]
+            added, removed = compose_deltas(steps)
+            direct_added, direct_removed = diff_trees(versions[0], versions[-1])
+            self.assertEqual(param_paths(added), param_paths(direct_added))
+            self.assertEqual(param_paths(removed), param_paths(direct_removed))
+
+class PairFilesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        base = crd("base", {"a": "x"})
+        write_bundle(self.tmp.name, {
+            "1.3": {"base.yaml": base},
+            "1.4": {"base.yaml": base},
+            "1.5": {"base.yaml": base, "late.yaml": crd("late", {"a": "x", "b": "y"})},
+            "1.6": {"base.yaml": base, "late.yaml": crd("late", {"a": "x"})},
+        })
+
+    def test_file_added_in_a_later_release_is_diffed_in_later_pairs(self):
+        comparator = CRDComparator(self.tmp.name, use_cache=False, jobs=1)
+        self.assertIn("late.yaml", comparator.common_files)
+        removed = [(c.version_from, c.version_to, c.full_path) for c in comparator.compare_versions("late.yaml")]
+        self.assertEqual(removed, [("1.5", "1.6", "spec.b")])
+
+    def test_downgrade_pair_swaps_additions_and_removals(self):
+        comparator = CRDComparator(self.tmp.name, use_cache=False, jobs=1, pairs=["1.6:1.5"])
+        changes = comparator.compare_versions("late.yaml")
+        self.assertEqual([(c.change_type, c.full_path) for c in changes], [("added", "spec.b")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for watch mode: polling the version sources and re-diffing only changed files.
+"""
+
+import io
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from oadp_crd_comparison import CRDComparator
+
+from bundle import crd, write_bundle
+
+class WatchTests(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = write_bundle(tmp.name, {
+            "1.4": {"dpa.yaml": crd("dpa", {"restic": "x", "velero": "y"}), "other.yaml": crd("other", {"a": "x"})},
+            "1.5": {"dpa.yaml": crd("dpa", {"restic": "x", "velero": "y"}), "other.yaml": crd("other", {"a": "x"})},
+        })
+        self.comparator = CRDComparator(str(self.root), use_cache=False, jobs=1)
+        self.comparator.keep_trees = True
+
+    def snapshots(self):
+        return {version: self.comparator.sources[version].snapshot() for version in self.comparator.active_versions}
+
+    def test_poll_reports_only_edited_files(self):
+        snapshots = self.snapshots()
+        self.assertEqual(self.comparator.poll_changes(snapshots), set())
+        (self.root / "1.5" / "dpa.yaml").write_text(crd("dpa", {"velero": "y"}))
+        self.assertEqual(self.comparator.poll_changes(snapshots), {("1.5", "dpa.yaml")})
+        self.assertEqual(self.comparator.poll_changes(snapshots), set())
+
+    def test_refresh_re_diffs_changed_files_and_tracks_added_and_removed_ones(self):
+        self.assertEqual(self.comparator.result.removed_count, 0)
+        snapshots = self.snapshots()
+
+        (self.root / "1.5" / "dpa.yaml").write_text(crd("dpa", {"velero": "y"}))
+        (self.root / "1.5" / "other.yaml").unlink()
+        updates = self.comparator.refresh(self.comparator.poll_changes(snapshots))
+        self.assertEqual(updates, [("other.yaml", "removed"), ("dpa.yaml", "changed")])
+        self.assertEqual([c.full_path for c in self.comparator.result.files[0].changes], ["spec.restic"])
+        self.assertEqual([f.filename for f in self.comparator.result.files], ["dpa.yaml"])
+
+        (self.root / "1.5" / "other.yaml").write_text(crd("other", {"a": "x"}))
+        updates = self.comparator.refresh(self.comparator.poll_changes(snapshots))
+        self.assertEqual(updates, [("other.yaml", "added")])
+
+    def test_watch_prints_an_update_for_each_change(self):
+        sink = io.StringIO()
+        sleeps = []
+
+        def sleep(interval):
+            # First poll: edit a file; second poll: stop watching
+            sleeps.append(interval)
+            if len(sleeps) == 1:
+                (self.root / "1.5" / "dpa.yaml").write_text(crd("dpa", {"velero": "y"}))
+            else:
+                raise KeyboardInterrupt
+
+        with mock.patch("oadp_crd_comparison.time.sleep", sleep), mock.patch("sys.stderr", io.StringIO()):
+            with self.assertRaises(KeyboardInterrupt):
+                self.comparator.watch(sink, report_format="ndjson", interval=0.5)
+
+        records = [json.loads(line) for line in sink.getvalue().splitlines()]
+        summaries = [r for r in records if r["record"] == "summary"]
+        self.assertEqual([s["removed"] for s in summaries], [0, 1])
+        self.assertIn({"record": "change", "full_path": "spec.restic"},
+                      [{"record": r["record"], "full_path": r.get("full_path")} for r in records])
+        self.assertEqual(sleeps, [0.5, 0.5])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,7 +19,7 @@ def main():
         print("✅ ~/OADP/CHECK_CRDS directory exists")
         
         # Check required files
-        required_files = ["oadp_crd_comparison.py", "setup_oadp_analysis.py", "README.md"]
+        required_files = ["oadp_crd_comparison.py", "manifest_sources.py", "setup_oadp_analysis.py", "README.md"]
         for file_name in required_files:
             file_path = check_crds_dir / file_name
             if file_path.exists():